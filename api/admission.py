@@ -0,0 +1,301 @@
+import math
+import threading
+import time
+from collections import Counter, namedtuple
+from contextlib import asynccontextmanager, contextmanager
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+
+from api.profiling import profile_phase
+
+Rejection = namedtuple("Rejection", ["reason", "retry_after"])
+
+RATE = "rate"
+CONCURRENCY = "concurrency"
+
+
+class AdmissionControl:
+    """
+    Per-tenant admission control: a token bucket limiting the request rate of
+    each tenant, and a cap on its requests in flight.
+
+    The state lives in the Django cache named by `backend` and only relies on
+    its atomic add/incr/decr, so a cache shared by all workers (e.g. Redis)
+    enforces the limits across them. The bucket is kept as the theoretical
+    arrival time (GCRA) of the tenant's next request: each request moves it
+    one interval of 1/rate seconds ahead, and is rejected if that puts it
+    more than `burst` intervals ahead of now.
+
+    The count of slots in flight expires `inflight_timeout` seconds after the
+    last request of the tenant, so a worker that dies mid-request leaks its
+    slot for at most that long once the tenant is idle. Requests still in
+    flight when it expires are not counted again, and their releases never
+    take the count below zero.
+    """
+
+    key_prefix = "gosync:admission:"
+    inflight_timeout = 300
+
+    def __init__(self, rate=50, burst=100, max_concurrent=16, backend="default"):
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.backend = backend
+        self.admitted = 0
+        self.rejected = Counter()
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        return caches[self.backend]
+
+    @property
+    def interval(self):
+        """Microseconds between two requests at the sustained rate."""
+        return math.ceil(1_000_000 / self.rate)
+
+    def get_key(self, tenant_id, name):
+        return f"{self.key_prefix}{tenant_id}:{name}"
+
+    def acquire(self, tenant_id):
+        """
+        Take a token and a slot in flight for a request of `tenant_id`.
+        Returns None when the request is admitted, otherwise a Rejection.
+        A request that was admitted must be released.
+        """
+        rejection = self._take_token(tenant_id)
+        if rejection is None:
+            rejection = self._take_slot(tenant_id)
+            if rejection is not None:
+                self._return_token(tenant_id)
+        self._count(tenant_id, rejection)
+        return rejection
+
+    def release(self, tenant_id):
+        if self.max_concurrent > 0:
+            key = self.get_key(tenant_id, "inflight")
+            try:
+                if self.cache.decr(key) < 0:
+                    # The count expired and restarted while the request ran.
+                    self.cache.incr(key)
+            except ValueError:
+                # The count expired while the request ran.
+                pass
+
+    async def aacquire(self, tenant_id):
+        rejection = await self._atake_token(tenant_id)
+        if rejection is None:
+            rejection = await self._atake_slot(tenant_id)
+            if rejection is not None:
+                await self._areturn_token(tenant_id)
+        self._count(tenant_id, rejection)
+        return rejection
+
+    async def arelease(self, tenant_id):
+        if self.max_concurrent > 0:
+            key = self.get_key(tenant_id, "inflight")
+            try:
+                if await self.cache.adecr(key) < 0:
+                    await self.cache.aincr(key)
+            except ValueError:
+                pass
+
+    @contextmanager
+    def admit(self, tenant_id):
+        """
+        Hold a token and a slot for the block, or yield the Rejection of the
+        request. Requests without a tenant are always admitted.
+        """
+        if tenant_id is None:
+            yield None
+            return
+        with profile_phase("admission"):
+            rejection = self.acquire(tenant_id)
+        try:
+            yield rejection
+        finally:
+            if rejection is None:
+                self.release(tenant_id)
+
+    @asynccontextmanager
+    async def aadmit(self, tenant_id):
+        if tenant_id is None:
+            yield None
+            return
+        with profile_phase("admission"):
+            rejection = await self.aacquire(tenant_id)
+        try:
+            yield rejection
+        finally:
+            if rejection is None:
+                await self.arelease(tenant_id)
+
+    def hold_until_closed(self, tenant_id, response):
+        """
+        Keep the slot of an admitted request until its streaming `response`
+        is closed, as the body of an export is produced after the view
+        returned. Other responses are returned as they are.
+        """
+        if not self._holds(tenant_id, response):
+            return response
+        try:
+            self.cache.incr(self.get_key(tenant_id, "inflight"))
+        except ValueError:
+            return response
+        return self._release_on_close(tenant_id, response)
+
+    async def ahold_until_closed(self, tenant_id, response):
+        if not self._holds(tenant_id, response):
+            return response
+        try:
+            await self.cache.aincr(self.get_key(tenant_id, "inflight"))
+        except ValueError:
+            return response
+        return self._release_on_close(tenant_id, response)
+
+    def clear(self):
+        self.cache.clear()
+        with self._lock:
+            self.admitted = 0
+            self.rejected.clear()
+
+    def stats(self):
+        """Admitted requests, and rejected requests by tenant and reason."""
+        with self._lock:
+            rejected = {}
+            for (tenant_id, reason), count in self.rejected.items():
+                rejected.setdefault(str(tenant_id), {RATE: 0, CONCURRENCY: 0})
+                rejected[str(tenant_id)][reason] = count
+            return {
+                "admitted": self.admitted,
+                "rejected": rejected,
+                "backend": self.backend,
+            }
+
+    def _count(self, tenant_id, rejection):
+        with self._lock:
+            if rejection is None:
+                self.admitted += 1
+            else:
+                self.rejected[tenant_id, rejection.reason] += 1
+
+    def _take_token(self, tenant_id):
+        if self.rate <= 0:
+            return None
+        key = self.get_key(tenant_id, "bucket")
+        now = time.time_ns() // 1000
+        self.cache.add(key, now, timeout=None)
+        arrival = self.cache.incr(key, self.interval)
+        if arrival < now + self.interval:
+            # The bucket was full: restart it from now. Requests racing here
+            # may each restart it, which admits at most one extra request each.
+            self.cache.set(key, now + self.interval, timeout=None)
+        rejection = self._check_arrival(now, arrival)
+        if rejection is not None:
+            # Rejected requests do not use up the tokens of later ones.
+            self.cache.decr(key, self.interval)
+        return rejection
+
+    async def _atake_token(self, tenant_id):
+        if self.rate <= 0:
+            return None
+        key = self.get_key(tenant_id, "bucket")
+        now = time.time_ns() // 1000
+        await self.cache.aadd(key, now, timeout=None)
+        arrival = await self.cache.aincr(key, self.interval)
+        if arrival < now + self.interval:
+            await self.cache.aset(key, now + self.interval, timeout=None)
+        rejection = self._check_arrival(now, arrival)
+        if rejection is not None:
+            await self.cache.adecr(key, self.interval)
+        return rejection
+
+    def _check_arrival(self, now, arrival):
+        excess = arrival - now - self.burst * self.interval
+        if excess <= 0:
+            return None
+        return Rejection(RATE, excess / 1_000_000)
+
+    def _return_token(self, tenant_id):
+        if self.rate > 0:
+            self.cache.decr(self.get_key(tenant_id, "bucket"), self.interval)
+
+    async def _areturn_token(self, tenant_id):
+        if self.rate > 0:
+            await self.cache.adecr(self.get_key(tenant_id, "bucket"), self.interval)
+
+    def _holds(self, tenant_id, response):
+        return tenant_id is not None and response.streaming and self.max_concurrent > 0
+
+    def _release_on_close(self, tenant_id, response):
+        # The handlers close every response once it is sent, also when the
+        # client went away, and the test clients once it is consumed.
+        response.streaming_content = ReleasingContent(
+            response.streaming_content, partial(self.release, tenant_id)
+        )
+        return response
+
+    def _take_slot(self, tenant_id):
+        if self.max_concurrent <= 0:
+            return None
+        key = self.get_key(tenant_id, "inflight")
+        # incr keeps the expiry of the key, so every request pushes it back.
+        if not self.cache.add(key, 0, timeout=self.inflight_timeout):
+            self.cache.touch(key, timeout=self.inflight_timeout)
+        if self.cache.incr(key) <= self.max_concurrent:
+            return None
+        self.cache.decr(key)
+        return Rejection(CONCURRENCY, 1)
+
+    async def _atake_slot(self, tenant_id):
+        if self.max_concurrent <= 0:
+            return None
+        key = self.get_key(tenant_id, "inflight")
+        if not await self.cache.aadd(key, 0, timeout=self.inflight_timeout):
+            await self.cache.atouch(key, timeout=self.inflight_timeout)
+        if await self.cache.aincr(key) <= self.max_concurrent:
+            return None
+        await self.cache.adecr(key)
+        return Rejection(CONCURRENCY, 1)
+
+
+class ReleasingContent:
+    """Streaming content calling `release` once, when the response closes."""
+
+    def __init__(self, content, release):
+        self.content = content
+        self.release = release
+
+    def __iter__(self):
+        return iter(self.content)
+
+    def __aiter__(self):
+        return aiter(self.content)
+
+    def close(self):
+        release, self.release = self.release, None
+        if release is not None:
+            release()
+
+
+def get_rejection_response(rejection):
+    """A 429 response telling the client when to retry."""
+    retry_after = max(1, math.ceil(rejection.retry_after))
+    if rejection.reason == RATE:
+        detail = f"Request was throttled. Expected available in {retry_after} seconds."
+    else:
+        detail = "Too many concurrent requests for this tenant."
+    return JsonResponse(
+        {"detail": detail}, status=429, headers={"Retry-After": str(retry_after)}
+    )
+
+
+admission_control = AdmissionControl(
+    rate=settings.ADMISSION["RATE"],
+    burst=settings.ADMISSION["BURST"],
+    max_concurrent=settings.ADMISSION["MAX_CONCURRENT"],
+    backend=settings.ADMISSION["BACKEND"],
+)
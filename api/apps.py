@@ -1,15 +1,39 @@
 from django.apps import AppConfig
 from django.db import connection
-from django.db.models.signals import post_migrate
+from django.db.models.signals import post_migrate, pre_migrate
+
+# Compare the native uuid column with a STABLE expression of the same type. Postgres
+# evaluates it once per scan and can use the tenant_id indexes, which a cast
+# on the column side (tenant_id::text = ...) would prevent.
+TENANT_PREDICATE = (
+    "tenant_id = NULLIF(current_setting('app.current_tenant_id', TRUE), '')::uuid"
+)
 
 
 class ApiConfig(AppConfig):
     name = "api"
 
     def ready(self):
+        from . import checks, signals  # noqa: F401
+        from .pooling import configure_pools
+
+        configure_pools()
+        pre_migrate.connect(create_extensions, sender=self)
         post_migrate.connect(setup_rls_policies, sender=self)
 
 
+def create_extensions(sender, using="default", **kwargs):
+    """
+    Create the extensions the search indexes need. Migrations create them too;
+    this covers databases built from the models, such as test databases.
+    """
+    from django.db import connections
+
+    with connections[using].cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS btree_gin")
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+
 def setup_rls_policies(sender, **kwargs):
     """Automatically create RLS policies for all TenantModel tables"""
     from django.apps import apps
@@ -60,7 +84,7 @@ def setup_rls_policies(sender, **kwargs):
                         CREATE POLICY tenant_isolation_select ON {table_name}
                             FOR SELECT
                             TO PUBLIC
-                            USING (tenant_id::text = NULLIF(current_setting('app.current_tenant_id', TRUE), ''))
+                            USING ({TENANT_PREDICATE})
                     """)
 
                     # INSERT: Allow if tenant_id matches context OR if no context set (for tests)
@@ -69,7 +93,7 @@ def setup_rls_policies(sender, **kwargs):
                             FOR INSERT
                             TO PUBLIC
                             WITH CHECK (
-                                tenant_id::text = NULLIF(current_setting('app.current_tenant_id', TRUE), '')
+                                {TENANT_PREDICATE}
                                 OR current_setting('app.current_tenant_id', TRUE) = ''
                             )
                     """)
@@ -79,8 +103,8 @@ def setup_rls_policies(sender, **kwargs):
                         CREATE POLICY tenant_isolation_update ON {table_name}
                             FOR UPDATE
                             TO PUBLIC
-                            USING (tenant_id::text = NULLIF(current_setting('app.current_tenant_id', TRUE), ''))
-                            WITH CHECK (tenant_id::text = NULLIF(current_setting('app.current_tenant_id', TRUE), ''))
+                            USING ({TENANT_PREDICATE})
+                            WITH CHECK ({TENANT_PREDICATE})
                     """)
 
                     # DELETE: Can only delete rows in your tenant
@@ -88,7 +112,7 @@ def setup_rls_policies(sender, **kwargs):
                         CREATE POLICY tenant_isolation_delete ON {table_name}
                             FOR DELETE
                             TO PUBLIC
-                            USING (tenant_id::text = NULLIF(current_setting('app.current_tenant_id', TRUE), ''))
+                            USING ({TENANT_PREDICATE})
                     """)
 
                     print(f"✓ RLS policies created for {table_name}")
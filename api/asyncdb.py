@@ -0,0 +1,247 @@
+import asyncio
+import time
+import weakref
+from collections import namedtuple
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from django.core.exceptions import EmptyResultSet, ImproperlyConfigured
+from django.db import connections
+from psycopg.rows import dict_row
+
+from api.pooling import areset_tenant_context
+from api.profiling import profile_phase, record_query
+from api.routers import get_request_alias
+from api.tenancy import tenant_context_sql
+
+# Querysets are compiled by the ORM, but executed on psycopg's AsyncConnection:
+# Django's async ORM methods still run each query in a worker thread, which
+# is what the async views avoid. Rows are read as values() dicts rather than
+# model instances, and relations are nested into them by `aprefetch()`. The
+# connections come from an async pool, so the database must be configured
+# with one (DB_POOL_MAX_SIZE).
+
+_async_connection = ContextVar("async_connection", default=None)
+
+# Async pools are bound to the event loop that opened them. Django runs async
+# views under WSGI on a short-lived loop per request, so the pools open their
+# connections on demand rather than keeping min_size ones, and the connections
+# are closed when the loop shuts down.
+_async_pools = weakref.WeakKeyDictionary()
+_async_pool_connections = weakref.WeakKeyDictionary()
+_async_pool_closers = weakref.WeakKeyDictionary()
+
+ASYNC_POOL_OPTIONS = ("max_size", "timeout", "max_idle", "max_lifetime")
+
+STREAM_CURSOR_NAME = "gosync_stream"
+
+# Columns to read from a model, and the plans of its relations by name.
+ValuesPlan = namedtuple("ValuesPlan", ["columns", "relations"])
+
+
+def get_async_connection():
+    """Async connection of the transaction opened by `async_atomic()`."""
+    return _async_connection.get()
+
+
+def get_connect_kwargs(alias):
+    wrapper = connections[alias]
+    kwargs = wrapper.get_connection_params()
+    # Django's cursor classes are synchronous, psycopg picks async ones.
+    kwargs.pop("cursor_factory", None)
+    kwargs["autocommit"] = True
+    kwargs["options"] = (
+        f"{kwargs.get('options', '')} -c TimeZone={wrapper.timezone_name}".strip()
+    )
+    return kwargs
+
+
+async def get_async_pool(alias):
+    """
+    Async pool of `alias` for the running event loop, sized like the alias's
+    sync pool. Raises ImproperlyConfigured when the alias has no pool, rather
+    than opening a connection for every request.
+    """
+    pool_options = connections.settings[alias]["OPTIONS"].get("pool")
+    if not pool_options:
+        raise ImproperlyConfigured(
+            f"The async views need a connection pool, which the {alias!r} "
+            "database does not configure; set DB_POOL_MAX_SIZE."
+        )
+    from psycopg_pool import AsyncConnectionPool
+
+    if pool_options is True:
+        pool_options = {}
+    loop = asyncio.get_running_loop()
+    if loop not in _async_pool_closers:
+        _async_pool_connections[loop] = weakref.WeakSet()
+        _async_pool_closers[loop] = loop.create_task(close_connections_on_exit())
+    pools = _async_pools.setdefault(loop, {})
+    pool = pools.get(alias)
+    if pool is None:
+        pool = pools[alias] = AsyncConnectionPool(
+            kwargs=get_connect_kwargs(alias),
+            open=False,
+            configure=track_connection,
+            check=AsyncConnectionPool.check_connection,
+            min_size=0,
+            **{
+                name: value
+                for name, value in pool_options.items()
+                if name in ASYNC_POOL_OPTIONS
+            },
+        )
+    await pool.open()
+    return pool
+
+
+async def track_connection(connection):
+    _async_pool_connections[asyncio.get_running_loop()].add(connection)
+
+
+async def close_async_pools():
+    """Close the async pools of the running event loop."""
+    pools = _async_pools.pop(asyncio.get_running_loop(), {})
+    for pool in pools.values():
+        await pool.close()
+
+
+async def close_connections_on_exit():
+    """
+    Wait for the running event loop to shut down, then close the connections
+    of its pools. The tasks of the pools are cancelled along with this one,
+    which would stop closing the pools themselves halfway.
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        _async_pools.pop(loop, None)
+        for connection in list(_async_pool_connections.pop(loop, ())):
+            await connection.close()
+
+
+@asynccontextmanager
+async def async_connection(using=None):
+    pool = await get_async_pool(using or get_request_alias())
+    async with pool.connection() as connection:
+        yield connection
+        # Not a reset hook of the pool: those run in tasks of the pool, which
+        # the shutdown of a short-lived event loop would interrupt.
+        await areset_tenant_context(connection)
+
+
+@asynccontextmanager
+async def async_atomic(using=None):
+    """
+    Run the block inside a transaction on an async connection of the database
+    the request is routed to. Queries of the block run in that transaction.
+    """
+    async with async_connection(using) as connection:
+        async with connection.transaction():
+            token = _async_connection.set(connection)
+            try:
+                yield connection
+            finally:
+                _async_connection.reset(token)
+
+
+async def aexecute(sql, params, cursor=None):
+    """
+    Execute a statement in the current async transaction, or on `cursor`,
+    recording it in the profile of the request.
+    """
+    start = time.perf_counter()
+    try:
+        if cursor is None:
+            return await get_async_connection().execute(sql, params)
+        return await cursor.execute(sql, params)
+    finally:
+        record_query(sql, time.perf_counter() - start)
+
+
+async def aset_tenant(tenant_id):
+    """Set the tenant context of the transaction opened by `async_atomic()`."""
+    with profile_phase("tenant"):
+        await aexecute(*tenant_context_sql(tenant_id))
+
+
+@asynccontextmanager
+async def async_tenant_context(tenant_id, using=None):
+    """Async counterpart of `api.tenancy.tenant_context()`."""
+    async with async_atomic(using) as connection:
+        await aset_tenant(tenant_id)
+        yield connection
+
+
+def compile_queryset(queryset):
+    return queryset.query.get_compiler(using=queryset.db).as_sql()
+
+
+async def afetch_rows(queryset):
+    """Evaluate a values() queryset in the current async transaction."""
+    try:
+        sql, params = compile_queryset(queryset)
+    except EmptyResultSet:
+        return []
+    async with get_async_connection().cursor(row_factory=dict_row) as cursor:
+        await aexecute(sql, params, cursor)
+        return await cursor.fetchall()
+
+
+async def aexists(queryset):
+    return bool(await afetch_rows(queryset.values("pk")[:1]))
+
+
+async def afetch(queryset, plan):
+    """
+    Evaluate `queryset` in the current async transaction as dicts of the
+    columns of a ValuesPlan, with the rows of its relations nested under
+    their names. Views render them with the serializer the plan is made of.
+    """
+    rows = await afetch_rows(queryset.values(*plan.columns))
+    await aprefetch(rows, queryset.model, plan.relations)
+    return rows
+
+
+async def aiterator(queryset, plan, chunk_size):
+    """
+    Iterate over the rows of `afetch()` through a server-side cursor,
+    fetching their relations one chunk at a time like `QuerySet.iterator()`.
+    """
+    try:
+        sql, params = compile_queryset(queryset.values(*plan.columns))
+    except EmptyResultSet:
+        return
+    connection = get_async_connection()
+    async with connection.cursor(
+        name=STREAM_CURSOR_NAME, row_factory=dict_row
+    ) as cursor:
+        await aexecute(sql, params, cursor)
+        while rows := await cursor.fetchmany(chunk_size):
+            await aprefetch(rows, queryset.model, plan.relations)
+            for row in rows:
+                yield row
+
+
+async def aprefetch(rows, model, relations):
+    """
+    Async `prefetch_related()` of reverse foreign keys on rows of `model`:
+    each row gets the list of its related rows under the relation's name.
+    """
+    pk = model._meta.pk.attname
+    for name, plan in relations.items():
+        relation = model._meta.get_field(name)
+        parents = {row[pk]: row for row in rows}
+        for row in rows:
+            row[name] = []
+        if not parents:
+            continue
+        children = await afetch(
+            relation.related_model._default_manager.filter(
+                **{f"{relation.field.name}__in": list(parents)}
+            ),
+            plan,
+        )
+        for child in children:
+            parents[child[relation.field.attname]][name].append(child)
@@ -0,0 +1,173 @@
+import uuid
+
+from django.conf import settings
+from django.db.models import F
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from api.asyncdb import afetch_rows, aset_tenant
+from api.principals import Principal, PrincipalUser, principal_cache
+from api.tenancy import set_tenant, tenant_context_annotations
+
+AUTH_VERSION_CLAIM = "auth_version"
+
+
+def add_tenant_claims(token, user):
+    """Embed the user's tenant, role and auth version in `token`."""
+    token["tenant_id"] = str(user.tenant_id) if user.tenant_id else None
+    token["role"] = user.role
+    token[AUTH_VERSION_CLAIM] = user.auth_version
+
+
+def get_claims_principal(validated_token):
+    """
+    Return the Principal carried by a token issued with tenant claims.
+
+    Access tokens are trusted until they expire: the principal is always
+    active, and deactivating the user or changing its tenant or role only
+    takes effect when the token is refreshed, which the bumped auth_version
+    then refuses. ACCESS_TOKEN_LIFETIME bounds how long that takes.
+    """
+    if not settings.TENANT_TOKEN_CLAIMS or AUTH_VERSION_CLAIM not in validated_token:
+        return None
+    tenant_id = validated_token.get("tenant_id")
+    return Principal(
+        uuid.UUID(tenant_id) if tenant_id else None,
+        validated_token.get("role"),
+        True,
+    )
+
+
+class TenantJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that validates the token and loads the user only once.
+
+    The tenant middleware authenticates before the view runs and the result is
+    kept on the underlying Django request, so when DRF authenticates the same
+    request it reuses that result instead of decoding the token again.
+    """
+
+    cache_attribute = "_jwt_authentication"
+
+    def authenticate(self, request):
+        django_request = getattr(request, "_request", request)
+        if hasattr(django_request, self.cache_attribute):
+            return getattr(django_request, self.cache_attribute)
+
+        user_auth_tuple = super().authenticate(request)
+        setattr(django_request, self.cache_attribute, user_auth_tuple)
+        return user_auth_tuple
+
+    def get_user(self, validated_token):
+        """
+        Load the user together with its tenant, setting the tenant context of
+        the current transaction in the same statement.
+
+        Users whose token carries tenant claims, or who are found in the
+        principal cache, are not loaded at all: only the tenant context is set
+        and a lazy PrincipalUser is returned.
+        """
+        user_id = self.get_user_id(validated_token)
+
+        # Revocation checks need the password hash, so they bypass the token
+        # claims and the cache.
+        if not api_settings.CHECK_REVOKE_TOKEN:
+            principal = get_claims_principal(validated_token) or principal_cache.get(
+                user_id
+            )
+            if principal is not None:
+                self.check_active(principal.is_active)
+                set_tenant(principal.tenant_id)
+                return PrincipalUser(user_id, principal)
+
+        try:
+            user = (
+                self.user_model.objects.select_related("tenant")
+                .annotate(**tenant_context_annotations(F("tenant_id")))
+                .get(**{api_settings.USER_ID_FIELD: user_id})
+            )
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(
+                _("User not found"), code="user_not_found"
+            ) from e
+
+        principal_cache.set(
+            user_id, Principal(user.tenant_id, user.role, user.is_active)
+        )
+
+        self.check_active(user.is_active)
+        self.check_revoked(validated_token, user.password)
+        return user
+
+    async def aauthenticate(self, request):
+        """
+        Async counterpart of authenticate() for the async tenant middleware.
+        It must run inside `api.asyncdb.async_atomic()`, whose transaction
+        gets the tenant context of the user. A PrincipalUser is returned.
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = self.get_user_id(validated_token)
+
+        if not api_settings.CHECK_REVOKE_TOKEN:
+            principal = get_claims_principal(
+                validated_token
+            ) or await principal_cache.aget(user_id)
+            if principal is not None:
+                self.check_active(principal.is_active)
+                await aset_tenant(principal.tenant_id)
+                return PrincipalUser(user_id, principal)
+
+        annotations = tenant_context_annotations(F("tenant_id"))
+        rows = await afetch_rows(
+            self.user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id})
+            .annotate(**annotations)
+            .values("tenant_id", "role", "is_active", "password", *annotations)
+        )
+        if not rows:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found")
+
+        tenant_id, role, is_active, password = (
+            rows[0][name] for name in ("tenant_id", "role", "is_active", "password")
+        )
+        principal = Principal(tenant_id, role, is_active)
+        await principal_cache.aset(user_id, principal)
+
+        self.check_active(is_active)
+        self.check_revoked(validated_token, password)
+        return PrincipalUser(user_id, principal)
+
+    def get_user_id(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(
+                _("Token contained no recognizable user identification")
+            ) from e
+        return self.user_model._meta.get_field(api_settings.USER_ID_FIELD).to_python(
+            user_id
+        )
+
+    def check_active(self, is_active):
+        if api_settings.CHECK_USER_IS_ACTIVE and not is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+    def check_revoked(self, validated_token, password):
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(
+                api_settings.REVOKE_TOKEN_CLAIM
+            ) != get_md5_hash_password(password):
+                raise AuthenticationFailed(
+                    _("The user's password has been changed."), code="password_changed"
+                )
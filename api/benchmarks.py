@@ -0,0 +1,262 @@
+import http.client
+import json
+import math
+import platform
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+
+import django
+
+from api.datasets import get_owner_username
+
+# Name: (method, path, whether the request needs a task). Paths are formatted
+# with the ids of the session running them.
+SCENARIOS = {
+    "token_obtain": ("POST", "/api/token/", False),
+    "token_refresh": ("POST", "/api/token/refresh/", False),
+    "project_list": ("GET", "/api/projects/", False),
+    "project_detail": ("GET", "/api/projects/{project_id}/", False),
+    "task_list": ("GET", "/api/tasks/", False),
+    "task_detail": ("GET", "/api/tasks/{task_id}/", True),
+    "task_comments": ("GET", "/api/tasks/{task_id}/comments/", True),
+    "comment_create": ("POST", "/api/tasks/{task_id}/comments/", True),
+}
+
+# Writes change the dataset, so they only run when asked for.
+DEFAULT_SCENARIOS = [name for name in SCENARIOS if name != "comment_create"]
+
+SERVER_TIMING_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+class Session:
+    """Tokens and ids of one benchmark user, the owner of a generated tenant."""
+
+    def __init__(self, username, password, access, refresh, project_id, task_id):
+        self.username = username
+        self.password = password
+        self.access = access
+        self.refresh = refresh
+        self.project_id = project_id
+        self.task_id = task_id
+
+    def get_request(self, scenario):
+        method, path, _ = SCENARIOS[scenario]
+        path = path.format(project_id=self.project_id, task_id=self.task_id)
+        headers = {"Authorization": f"Bearer {self.access}"}
+        body = None
+        if scenario == "token_obtain":
+            headers, body = {}, {"username": self.username, "password": self.password}
+        elif scenario == "token_refresh":
+            headers, body = {}, {"refresh": self.refresh}
+        elif scenario == "comment_create":
+            body = {"content": "Benchmark comment"}
+        return method, path, headers, body
+
+
+class Client:
+    """
+    HTTP client keeping one connection per thread alive between requests, so
+    the latencies measure the server rather than connection setup.
+    """
+
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        self.connection_class = (
+            http.client.HTTPSConnection
+            if parts.scheme == "https"
+            else http.client.HTTPConnection
+        )
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    def request(self, method, path, headers=None, body=None):
+        """Return the status, headers and body of a response."""
+        headers = {"Accept": "application/json", **(headers or {})}
+        if body is not None:
+            body = json.dumps(body)
+            headers["Content-Type"] = "application/json"
+        connection = self.get_connection()
+        try:
+            connection.request(method, self.prefix + path, body, headers)
+            response = connection.getresponse()
+            content = response.read()
+        except (OSError, http.client.HTTPException):
+            self._local.connection = None
+            connection.close()
+            raise
+        if response.will_close:
+            self._local.connection = None
+            connection.close()
+        return response.status, response.headers, content
+
+    def get_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self.connection_class(
+                self.netloc, timeout=self.timeout
+            )
+            with self._lock:
+                self._connections.append(connection)
+        return connection
+
+    def get_json(self, method, path, headers=None, body=None):
+        status, _, content = self.request(method, path, headers, body)
+        if status >= 400:
+            raise BenchmarkError(f"{method} {path} answered {status}: {content[:200]}")
+        return json.loads(content)
+
+    def close(self):
+        """Close the connections of every thread."""
+        with self._lock:
+            for connection in self._connections:
+                connection.close()
+            self._connections.clear()
+
+
+def open_sessions(client, users, prefix, password):
+    """Log in the owners of the first `users` tenants and find their data."""
+    sessions = []
+    for index in range(users):
+        username = get_owner_username(prefix, index)
+        tokens = client.get_json(
+            "POST", "/api/token/", body={"username": username, "password": password}
+        )
+        headers = {"Authorization": f"Bearer {tokens['access']}"}
+        projects = client.get_json("GET", "/api/projects/", headers)["results"]
+        tasks = client.get_json("GET", "/api/tasks/", headers)["results"]
+        if not projects:
+            raise BenchmarkError(f"{username} has no projects.")
+        sessions.append(
+            Session(
+                username,
+                password,
+                tokens["access"],
+                tokens["refresh"],
+                projects[0]["id"],
+                tasks[0]["id"] if tasks else None,
+            )
+        )
+    return sessions
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of sorted `values`."""
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+
+def summarize(scenario, concurrency, samples, elapsed):
+    """Statistics of the (latency, status, queries) samples of one run."""
+    latencies = sorted(latency * 1000 for latency, _, _ in samples)
+    queries = [count for _, _, count in samples if count is not None]
+    statuses = Counter(str(status) for _, status, _ in samples)
+    errors = sum(
+        count for status, count in statuses.items() if not status.startswith("2")
+    )
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "errors": errors,
+        "statuses": dict(sorted(statuses.items())),
+        "seconds": round(elapsed, 3),
+        "throughput": round(len(samples) / elapsed, 1) if elapsed else None,
+        "latency_ms": {
+            "mean": round(sum(latencies) / len(latencies), 2),
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "max": round(latencies[-1], 2),
+        },
+        # Read from the Server-Timing header, sent when the server profiles
+        # requests (PROFILING=true).
+        "queries_per_request": (
+            {"mean": round(sum(queries) / len(queries), 2), "max": max(queries)}
+            if queries
+            else None
+        ),
+    }
+
+
+def run_scenario(client, sessions, scenario, concurrency, requests):
+    """Send `requests` requests of `scenario` from `concurrency` threads."""
+    if SCENARIOS[scenario][2]:
+        sessions = [session for session in sessions if session.task_id is not None]
+        if not sessions:
+            raise BenchmarkError(f"{scenario} needs tasks, and no user has any.")
+
+    def send(number):
+        # Users take turns, so every tenant of the benchmark gets its share.
+        session = sessions[number % len(sessions)]
+        method, path, headers, body = session.get_request(scenario)
+        start = time.perf_counter()
+        try:
+            status, response_headers, _ = client.request(method, path, headers, body)
+        except (OSError, http.client.HTTPException):
+            return time.perf_counter() - start, "failed", None
+        latency = time.perf_counter() - start
+        match = SERVER_TIMING_QUERIES.search(response_headers.get("Server-Timing", ""))
+        return latency, status, int(match.group(1)) if match else None
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as executor:
+        samples = list(executor.map(send, range(requests)))
+    return summarize(scenario, concurrency, samples, time.perf_counter() - start)
+
+
+def run_benchmark(
+    url,
+    scenarios=DEFAULT_SCENARIOS,
+    concurrency=(1, 8),
+    requests=200,
+    users=5,
+    prefix="bench",
+    password="benchpass123",
+):
+    """
+    Benchmark a running server at `url` with the data of generate_dataset():
+    each scenario runs at each concurrency level, as the owners of the first
+    `users` tenants in turn. Returns the report as a dict, meant to be saved
+    as JSON and diffed between releases.
+    """
+    client = Client(url)
+    try:
+        sessions = open_sessions(client, users, prefix, password)
+        results = []
+        for level in concurrency:
+            for scenario in scenarios:
+                # One warm-up request per session, not measured.
+                run_scenario(client, sessions, scenario, 1, len(sessions))
+                results.append(
+                    run_scenario(client, sessions, scenario, level, requests)
+                )
+    finally:
+        client.close()
+    return {
+        "started_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "url": url,
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "platform": platform.platform(),
+        },
+        "parameters": {
+            "scenarios": list(scenarios),
+            "concurrency": list(concurrency),
+            "requests": requests,
+            "users": len(sessions),
+        },
+        "results": results,
+    }
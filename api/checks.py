@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PER_PROCESS_CACHES = {
+    "django.core.cache.backends.dummy.DummyCache",
+    "django.core.cache.backends.locmem.LocMemCache",
+}
+
+
+@register(Tags.caches)
+def check_read_your_writes_cache(app_configs, **kwargs):
+    """
+    With a read replica, a write on one worker must pin the reads of the
+    client on every other worker, so the pins need a shared cache.
+    """
+    if not settings.READ_REPLICA_ALIAS:
+        return []
+    cache = settings.CACHES.get(settings.READ_YOUR_WRITES_CACHE)
+    if cache is None:
+        return [
+            Error(
+                f"READ_YOUR_WRITES_CACHE names the cache "
+                f"{settings.READ_YOUR_WRITES_CACHE!r}, which is not in CACHES.",
+                id="api.E001",
+            )
+        ]
+    if cache["BACKEND"] in PER_PROCESS_CACHES:
+        return [
+            Error(
+                f"The read-your-writes cache {settings.READ_YOUR_WRITES_CACHE!r} "
+                "is not shared between workers, so clients may read stale data "
+                "from the replica after writing.",
+                hint="Name a shared cache (e.g. Redis) in READ_YOUR_WRITES_CACHE.",
+                id="api.E002",
+            )
+        ]
+    return []
@@ -0,0 +1,70 @@
+from django.db import connection
+
+from api.models import Project, Task, TaskComment, Tenant
+from api.tenancy import tenant_context
+from api.versioning import bump_data_versions
+
+# Both statements run under the tenant's RLS context, so they only count and
+# fix the rows of that tenant.
+RECOUNT_COMMENTS_SQL = f"""
+    UPDATE {Task._meta.db_table} t SET comment_count = c.actual
+    FROM (
+        SELECT t.id, count(tc.id) AS actual
+        FROM {Task._meta.db_table} t
+        LEFT JOIN {TaskComment._meta.db_table} tc ON tc.task_id = t.id
+        GROUP BY t.id
+    ) c
+    WHERE t.id = c.id AND t.comment_count <> c.actual
+    RETURNING t.project_id
+"""
+
+RECOUNT_TASKS_SQL = f"""
+    UPDATE {Project._meta.db_table} p SET task_count = c.actual
+    FROM (
+        SELECT p.id, count(t.id) AS actual
+        FROM {Project._meta.db_table} p
+        LEFT JOIN {Task._meta.db_table} t ON t.project_id = p.id
+        GROUP BY p.id
+    ) c
+    WHERE p.id = c.id AND p.task_count <> c.actual
+    RETURNING p.id
+"""
+
+
+def add_counts(model, field, counts):
+    """Add counts[pk] to `field` of each row, in one statement however many."""
+    column = model._meta.get_field(field).column
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""
+            UPDATE {model._meta.db_table} r SET {column} = r.{column} + c.n
+            FROM unnest(%s::bigint[], %s::integer[]) AS c(id, n)
+            WHERE r.id = c.id
+            """,
+            [list(counts), list(counts.values())],
+        )
+
+
+def reconcile_counters(tenant_id):
+    """
+    Recount the tasks of each project and the comments of each task of a
+    tenant, and fix the counters that drifted. Returns the numbers of
+    projects and tasks corrected.
+    """
+    with tenant_context(tenant_id), connection.cursor() as cursor:
+        # Every write locks the tenant row first to bump its data version, so
+        # holding that lock waits for writes in flight and holds off new ones
+        # until the counters are fixed.
+        list(
+            Tenant.objects.select_for_update(no_key=True)
+            .filter(pk=tenant_id)
+            .values_list("pk")
+        )
+        cursor.execute(RECOUNT_COMMENTS_SQL)
+        tasks = cursor.fetchall()
+        cursor.execute(RECOUNT_TASKS_SQL)
+        projects = cursor.fetchall()
+        project_ids = {row[0] for row in tasks + projects}
+        if project_ids:
+            bump_data_versions(tenant_id, sorted(project_ids))
+    return len(projects), len(tasks)
@@ -0,0 +1,154 @@
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+
+from api.models import Project, Task, TaskComment, Tenant, User
+from api.tenancy import tenant_context
+
+# Words of the generated task names and comments, so search has something to
+# match on.
+# fmt: off
+WORDS = [
+    "api", "backend", "billing", "bug", "cache", "client", "database", "deploy",
+    "design", "docs", "error", "export", "feature", "fix", "frontend", "import",
+    "index", "invoice", "latency", "login", "migration", "mobile", "monitoring",
+    "onboarding", "payment", "performance", "query", "refactor", "release",
+    "report", "review", "search", "security", "server", "signup", "sync", "test",
+    "timeout", "upgrade", "webhook",
+]
+# fmt: on
+
+RANDOM_WORD = "words.w[1 + floor(random() * cardinality(words.w))::int]"
+
+
+def random_words(count):
+    """SQL expression of `count` random words, drawn again for each row."""
+    return " || ' ' || ".join([RANDOM_WORD] * count)
+
+
+# Rows are generated by Postgres itself in set-based INSERT ... SELECT
+# statements, a batch of projects with their tasks and comments at a time.
+# COPY would still need a staging table, as it cannot target tables with
+# row security. Counters are set to their final values directly.
+PROJECTS_SQL = f"""
+    INSERT INTO {Project._meta.db_table} (tenant_id, name, data_version, task_count)
+    SELECT %(tenant_id)s, 'Project ' || n, 0, %(tasks)s
+    FROM generate_series(%(first)s, %(last)s) n
+    RETURNING id
+"""
+
+TASKS_SQL = f"""
+    INSERT INTO {Task._meta.db_table} (tenant_id, project_id, name, comment_count)
+    SELECT %(tenant_id)s, p.id, initcap({random_words(3)}), %(comments)s
+    FROM unnest(%(project_ids)s::bigint[]) p(id),
+        generate_series(1, %(tasks)s) n,
+        (SELECT %(words)s::text[] AS w) words
+    RETURNING id
+"""
+
+COMMENTS_SQL = f"""
+    INSERT INTO {TaskComment._meta.db_table}
+        (tenant_id, task_id, author_id, content, created_at)
+    SELECT %(tenant_id)s, t.id, %(author_id)s, {random_words(8)},
+        now() - random() * interval '365 days'
+    FROM unnest(%(task_ids)s::bigint[]) t(id),
+        generate_series(1, %(comments)s) n,
+        (SELECT %(words)s::text[] AS w) words
+"""
+
+
+class DatasetReport:
+    def __init__(self):
+        self.tenants = []
+        self.projects = 0
+        self.tasks = 0
+        self.comments = 0
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    @property
+    def rows_per_second(self):
+        rows = self.projects + self.tasks + self.comments
+        return rows / self.elapsed if self.elapsed else 0.0
+
+
+def get_tenant_sizes(tenants, projects, skew):
+    """
+    Number of projects of each tenant: `projects` on average, the tenant of
+    rank k weighted 1/k**skew (Zipf), so a few tenants hold most of the data.
+    A skew of 0 gives every tenant the same size. Each gets at least one.
+    """
+    weights = [1 / rank**skew for rank in range(1, tenants + 1)]
+    scale = tenants * projects / sum(weights)
+    return [max(1, round(weight * scale)) for weight in weights]
+
+
+def get_owner_username(prefix, index):
+    return f"{prefix}-owner-{index}"
+
+
+def generate_dataset(
+    tenants,
+    projects,
+    tasks,
+    comments,
+    skew=1.0,
+    prefix="bench",
+    password="benchpass123",
+    batch_size=500,
+    seed=None,
+):
+    """
+    Generate `tenants` tenants, each owned by a user named
+    get_owner_username(prefix, index) with `password`, whose project counts
+    follow get_tenant_sizes(). Every project gets `tasks` tasks and every task
+    `comments` comments. Each batch of `batch_size` projects is inserted in
+    its own transaction.
+    """
+    report = DatasetReport()
+    if seed is not None:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT setseed(%s)", [seed])
+    # Hashing is slow on purpose; every owner shares the same hash.
+    password = make_password(password)
+
+    for index, size in enumerate(get_tenant_sizes(tenants, projects, skew)):
+        owner = User(username=get_owner_username(prefix, index), password=password)
+        owner.save()
+        tenant = Tenant(name=f"{prefix.title()} tenant {index}")
+        tenant.save(owner=owner)
+        report.tenants.append(size)
+
+        for first in range(1, size + 1, batch_size):
+            last = min(size, first + batch_size - 1)
+            params = {
+                "tenant_id": tenant.id,
+                "author_id": owner.id,
+                "tasks": tasks,
+                "comments": comments,
+                "words": WORDS,
+                "first": first,
+                "last": last,
+            }
+            with tenant_context(tenant.id), connection.cursor() as cursor:
+                cursor.execute(PROJECTS_SQL, params)
+                params["project_ids"] = [row[0] for row in cursor.fetchall()]
+                cursor.execute(TASKS_SQL, params)
+                params["task_ids"] = [row[0] for row in cursor.fetchall()]
+                if comments:
+                    cursor.execute(COMMENTS_SQL, params)
+            report.projects += len(params["project_ids"])
+            report.tasks += len(params["task_ids"])
+            report.comments += len(params["task_ids"]) * comments
+
+    # Fresh statistics, so the planner sees the new data distribution.
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "ANALYZE "
+            + ", ".join(
+                model._meta.db_table for model in (Tenant, Project, Task, TaskComment)
+            )
+        )
+    report.elapsed = time.monotonic() - report.started
+    return report
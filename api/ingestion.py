@@ -0,0 +1,235 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api.counters import add_counts
+from api.models import Task, TaskComment, User
+from api.tenancy import tenant_context
+from api.versioning import bump_data_versions
+
+INGEST_CONTENT_TYPES = {
+    "application/x-ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+}
+
+STAGING_TABLE = "comment_ingest"
+
+# Rejects kept in a report; further ones are only counted.
+MAX_REPORTED_REJECTS = 1000
+
+
+class RowError(ValueError):
+    pass
+
+
+class IngestionReport:
+    def __init__(self):
+        self.received = 0
+        self.inserted = 0
+        self.rejected = 0
+        self.rejects = []
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def reject(self, line, error):
+        self.rejected += 1
+        if len(self.rejects) < MAX_REPORTED_REJECTS:
+            self.rejects.append({"line": line, "error": error})
+
+    @property
+    def rows_per_second(self):
+        return self.inserted / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        return {
+            "received": self.received,
+            "inserted": self.inserted,
+            "rejected": self.rejected,
+            "seconds": round(self.elapsed, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+            "rejects": self.rejects,
+        }
+
+
+def iter_ndjson(lines):
+    """Yield (line number, record or RowError) for NDJSON input."""
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, RowError(f"invalid JSON: {e}")
+            continue
+        if not isinstance(record, dict):
+            yield number, RowError("expected a JSON object")
+            continue
+        yield number, record
+
+
+def iter_csv(lines):
+    """Yield (line number, record) for CSV input with a header row."""
+    reader = csv.DictReader(lines)
+    for record in reader:
+        yield reader.line_num, {
+            name: value for name, value in record.items() if value not in ("", None)
+        }
+
+
+# Range of the bigint id columns of the staging table.
+MIN_ID, MAX_ID = -(2**63), 2**63 - 1
+
+
+def parse_id(value, name):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise RowError(f"{name} must be an integer")
+    if not MIN_ID <= value <= MAX_ID:
+        raise RowError(f"{name} is out of range")
+    return value
+
+
+def parse_comment(record):
+    """
+    Convert a record to a staging row, raising RowError when invalid. Values
+    are checked against the staging columns too, as one failing the COPY
+    would abort its whole batch.
+    """
+    if "task_id" not in record:
+        raise RowError("task_id is required")
+    task_id = parse_id(record["task_id"], "task_id")
+
+    content = record.get("content")
+    if not isinstance(content, str) or not content.strip():
+        raise RowError("content is required")
+    if "\x00" in content:
+        raise RowError("content must not contain NUL characters")
+
+    author_id = record.get("author_id")
+    if author_id is not None:
+        author_id = parse_id(author_id, "author_id")
+
+    created_at = record.get("created_at")
+    if created_at is not None:
+        try:
+            created_at = parse_datetime(str(created_at))
+        except ValueError:
+            created_at = None
+        if created_at is None:
+            raise RowError("created_at must be an ISO 8601 datetime")
+        if timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at)
+    return task_id, author_id, content, created_at
+
+
+def ingest_comments(lines, tenant_id, input_format="ndjson", batch_size=None):
+    """
+    Ingest task comments of `tenant_id` from NDJSON or CSV lines.
+
+    Records need a task_id and content, and may carry an author_id and a
+    created_at. Valid rows are COPYed, one batch per transaction, into a
+    temporary staging table and moved to the comment table with INSERT ...
+    SELECT, so the RLS policies of the tenant apply to every row. Rows
+    referencing tasks or authors outside the tenant are rejected.
+    """
+    report = IngestionReport()
+    records = iter_csv(lines) if input_format == "csv" else iter_ndjson(lines)
+    batch_size = batch_size or settings.INGEST_BATCH_SIZE
+
+    while batch := list(islice(records, batch_size)):
+        rows = []
+        for number, record in batch:
+            report.received += 1
+            try:
+                if isinstance(record, RowError):
+                    raise record
+                rows.append((number, *parse_comment(record)))
+            except RowError as e:
+                report.reject(number, str(e))
+        if rows:
+            ingest_batch(rows, tenant_id, report)
+
+    report.elapsed = time.monotonic() - report.started
+    return report
+
+
+def ingest_batch(rows, tenant_id, report):
+    params = {"tenant_id": str(tenant_id)}
+    joins = f"""
+        FROM {STAGING_TABLE} s
+        LEFT JOIN {Task._meta.db_table} t ON t.id = s.task_id
+        LEFT JOIN {User._meta.db_table} u
+            ON u.id = s.author_id AND u.tenant_id = %(tenant_id)s
+    """
+    with tenant_context(tenant_id), connection.cursor() as cursor:
+        # Temporary tables are private to the session and not subject to RLS;
+        # COPY cannot target a table with row security directly.
+        cursor.execute(
+            f"""
+            CREATE TEMPORARY TABLE {STAGING_TABLE} (
+                line integer,
+                task_id bigint,
+                author_id bigint,
+                content text,
+                created_at timestamptz
+            ) ON COMMIT DROP
+            """
+        )
+        with cursor.copy(
+            f"COPY {STAGING_TABLE} (line, task_id, author_id, content, created_at) "
+            "FROM STDIN"
+        ) as copy:
+            for row in rows:
+                copy.write_row(row)
+
+        # Tasks are read through RLS, so those of other tenants are unknown.
+        cursor.execute(
+            f"""
+            SELECT s.line, t.id IS NULL
+            {joins}
+            WHERE t.id IS NULL OR (s.author_id IS NOT NULL AND u.id IS NULL)
+            ORDER BY s.line
+            """,
+            params,
+        )
+        for line, unknown_task in cursor.fetchall():
+            report.reject(line, "unknown task" if unknown_task else "unknown author")
+
+        # Raw inserts send no signals, so the inserted comments are counted
+        # per task to maintain the counters and data versions below.
+        cursor.execute(
+            f"""
+            WITH inserted AS (
+                INSERT INTO {TaskComment._meta.db_table}
+                    (tenant_id, task_id, author_id, content, created_at)
+                SELECT %(tenant_id)s, s.task_id, s.author_id, s.content,
+                    COALESCE(s.created_at, now())
+                {joins}
+                WHERE t.id IS NOT NULL AND (s.author_id IS NULL OR u.id IS NOT NULL)
+                ORDER BY s.line
+                RETURNING task_id
+            )
+            SELECT i.task_id, t.project_id, count(*)
+            FROM inserted i JOIN {Task._meta.db_table} t ON t.id = i.task_id
+            GROUP BY i.task_id, t.project_id
+            """,
+            params,
+        )
+        counts = cursor.fetchall()
+        cursor.execute(f"DROP TABLE {STAGING_TABLE}")
+        if counts:
+            report.inserted += sum(count for _, _, count in counts)
+            bump_data_versions(tenant_id, sorted({row[1] for row in counts}))
+            add_counts(
+                Task,
+                "comment_count",
+                {task_id: count for task_id, _, count in counts},
+            )
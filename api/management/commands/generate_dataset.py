@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.datasets import generate_dataset, get_owner_username
+from api.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        "Generate a synthetic multi-tenant dataset: tenants of skewed sizes, "
+        "their projects, tasks and comments."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tenants", type=int, default=10)
+        parser.add_argument(
+            "--projects", type=int, default=20, help="Projects per tenant on average."
+        )
+        parser.add_argument("--tasks", type=int, default=20, help="Tasks per project.")
+        parser.add_argument(
+            "--comments", type=int, default=5, help="Comments per task."
+        )
+        parser.add_argument(
+            "--skew",
+            type=float,
+            default=1.0,
+            help="Zipf exponent of the tenant sizes; 0 makes them all equal.",
+        )
+        parser.add_argument(
+            "--prefix", default="bench", help="Prefix of the owners' usernames."
+        )
+        parser.add_argument("--password", default="benchpass123")
+        parser.add_argument(
+            "--batch-size", type=int, default=500, help="Projects per transaction."
+        )
+        parser.add_argument("--seed", type=float, help="Seed in [-1, 1].")
+
+    def handle(self, *args, **options):
+        if min(options["tenants"], options["projects"]) < 1:
+            raise CommandError("--tenants and --projects must be at least 1.")
+        if min(options["tasks"], options["comments"]) < 0:
+            raise CommandError("--tasks and --comments cannot be negative.")
+        if options["seed"] is not None and not -1 <= options["seed"] <= 1:
+            raise CommandError("--seed must be between -1 and 1.")
+        if User.objects.filter(
+            username=get_owner_username(options["prefix"], 0)
+        ).exists():
+            raise CommandError(
+                f"A dataset with the prefix {options['prefix']!r} already exists."
+            )
+
+        report = generate_dataset(
+            options["tenants"],
+            options["projects"],
+            options["tasks"],
+            options["comments"],
+            skew=options["skew"],
+            prefix=options["prefix"],
+            password=options["password"],
+            batch_size=options["batch_size"],
+            seed=options["seed"],
+        )
+        self.stdout.write(
+            f"Projects per tenant: largest {report.tenants[0]}, "
+            f"median {sorted(report.tenants)[len(report.tenants) // 2]}, "
+            f"smallest {report.tenants[-1]}"
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Generated {len(report.tenants)} tenants, {report.projects} "
+                f"projects, {report.tasks} tasks and {report.comments} comments "
+                f"in {report.elapsed:.2f}s, {report.rows_per_second:.0f} rows/s"
+            )
+        )
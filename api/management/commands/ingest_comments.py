@@ -0,0 +1,50 @@
+import sys
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.ingestion import ingest_comments
+from api.models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Ingest task comments of a tenant from an NDJSON or CSV file with COPY."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Input file, or - to read standard input.")
+        parser.add_argument("--tenant", required=True, help="Tenant id (UUID).")
+        parser.add_argument(
+            "--format",
+            choices=["ndjson", "csv"],
+            help="Input format. Defaults to the file extension, else NDJSON.",
+        )
+        parser.add_argument(
+            "--batch-size", type=int, help="Rows COPYed per transaction."
+        )
+
+    def handle(self, *args, path, tenant, format=None, batch_size=None, **options):
+        try:
+            tenant_id = Tenant.objects.get(id=uuid.UUID(tenant)).id
+        except (ValueError, Tenant.DoesNotExist):
+            raise CommandError(f"Unknown tenant {tenant!r}.")
+        input_format = format or ("csv" if path.endswith(".csv") else "ndjson")
+
+        if path == "-":
+            report = ingest_comments(sys.stdin, tenant_id, input_format, batch_size)
+        else:
+            with open(path, encoding="utf-8", newline="") as lines:
+                report = ingest_comments(lines, tenant_id, input_format, batch_size)
+
+        for reject in report.rejects:
+            self.stderr.write(f"line {reject['line']}: {reject['error']}")
+        if report.rejected > len(report.rejects):
+            self.stderr.write(
+                f"... and {report.rejected - len(report.rejects)} more rejects"
+            )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Inserted {report.inserted} of {report.received} comments "
+                f"({report.rejected} rejected) in {report.elapsed:.2f}s, "
+                f"{report.rows_per_second:.0f} rows/s"
+            )
+        )
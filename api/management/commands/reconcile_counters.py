@@ -0,0 +1,41 @@
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.counters import reconcile_counters
+from api.models import Tenant
+
+
+class Command(BaseCommand):
+    help = "Recount the task and comment counters of projects and tasks."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tenant", help="Tenant id (UUID). Defaults to every tenant."
+        )
+
+    def handle(self, *args, tenant=None, **options):
+        tenants = Tenant.objects.order_by("id")
+        if tenant is not None:
+            try:
+                tenants = tenants.filter(id=uuid.UUID(tenant))
+            except ValueError:
+                tenants = tenants.none()
+            if not tenants.exists():
+                raise CommandError(f"Unknown tenant {tenant!r}.")
+
+        total_projects = total_tasks = 0
+        for tenant_id in list(tenants.values_list("id", flat=True)):
+            projects, tasks = reconcile_counters(tenant_id)
+            if projects or tasks:
+                self.stdout.write(
+                    f"{tenant_id}: fixed {projects} projects and {tasks} tasks"
+                )
+            total_projects += projects
+            total_tasks += tasks
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Fixed the counters of {total_projects} projects "
+                f"and {total_tasks} tasks."
+            )
+        )
@@ -0,0 +1,85 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.benchmarks import (
+    DEFAULT_SCENARIOS,
+    SCENARIOS,
+    BenchmarkError,
+    run_benchmark,
+)
+
+
+def parse_levels(value):
+    try:
+        levels = [int(level) for level in value.split(",")]
+    except ValueError:
+        levels = []
+    if not levels or min(levels) < 1:
+        raise CommandError(f"Invalid concurrency levels {value!r}, e.g. 1,8,32.")
+    return levels
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the endpoints of a running server with the data of "
+        "generate_dataset, and write a JSON report of latency percentiles, "
+        "throughput and queries per request (sent by servers run with "
+        "PROFILING=true)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("url", help="Base URL of the server.")
+        parser.add_argument(
+            "--scenario",
+            action="append",
+            choices=list(SCENARIOS),
+            help="Scenario to run, repeatable. Defaults to all but comment_create.",
+        )
+        parser.add_argument(
+            "--concurrency",
+            default="1,8",
+            help="Comma-separated numbers of concurrent clients.",
+        )
+        parser.add_argument(
+            "--requests", type=int, default=200, help="Requests per run."
+        )
+        parser.add_argument(
+            "--users", type=int, default=5, help="Owners of tenants to log in as."
+        )
+        parser.add_argument("--prefix", default="bench")
+        parser.add_argument("--password", default="benchpass123")
+        parser.add_argument("--output", help="Report file. Defaults to stdout.")
+
+    def handle(self, *args, url, **options):
+        if options["requests"] < 1 or options["users"] < 1:
+            raise CommandError("--requests and --users must be at least 1.")
+        try:
+            report = run_benchmark(
+                url,
+                scenarios=options["scenario"] or DEFAULT_SCENARIOS,
+                concurrency=parse_levels(options["concurrency"]),
+                requests=options["requests"],
+                users=options["users"],
+                prefix=options["prefix"],
+                password=options["password"],
+            )
+        except (BenchmarkError, OSError) as e:
+            raise CommandError(f"Benchmark failed: {e}")
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                file.write(output + "\n")
+        else:
+            self.stdout.write(output)
+
+        for result in report["results"]:
+            self.stderr.write(
+                f"{result['scenario']:>15} x{result['concurrency']:<3} "
+                f"p50 {result['latency_ms']['p50']:>8.2f}ms "
+                f"p95 {result['latency_ms']['p95']:>8.2f}ms "
+                f"p99 {result['latency_ms']['p99']:>8.2f}ms "
+                f"{result['throughput']:>8.1f} req/s "
+                f"{result['errors']} errors"
+            )
@@ -0,0 +1,440 @@
+import bisect
+import glob
+import hmac
+import ipaddress
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse, HttpResponseForbidden
+from django.utils.decorators import sync_and_async_middleware
+
+from api.admission import CONCURRENCY, RATE, admission_control
+from api.pooling import pool_stats
+from api.principals import principal_cache
+from api.responsecache import response_cache
+from api.tenancy import tenant_context_exempt
+
+logger = logging.getLogger(__name__)
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+REQUEST_DURATION = "gosync_http_request_duration_seconds"
+REQUEST_QUERIES = "gosync_http_request_db_queries"
+TENANT_CONTEXT = "gosync_tenant_context_seconds"
+CACHE_REQUESTS = "gosync_cache_requests_total"
+CACHE_HIT_RATIO = "gosync_cache_hit_ratio"
+ADMISSION_REQUESTS = "gosync_admission_requests_total"
+POOL_CONNECTIONS = "gosync_db_pool_connections"
+POOL_WAITING = "gosync_db_pool_requests_waiting"
+TRANSACTIONS = "gosync_db_transactions"
+
+# Name: (type, help, histogram buckets), in the order they are exposed.
+METRICS = {
+    REQUEST_DURATION: (
+        HISTOGRAM,
+        "Time to respond to a request, by URL name, method and status.",
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+    ),
+    REQUEST_QUERIES: (
+        HISTOGRAM,
+        "Database queries run by a request, by URL name.",
+        (0, 1, 2, 5, 10, 20, 50, 100),
+    ),
+    TENANT_CONTEXT: (
+        HISTOGRAM,
+        "Time to authenticate a request and set its tenant context.",
+        (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+    ),
+    CACHE_REQUESTS: (COUNTER, "Lookups in the caches, by cache and result.", None),
+    CACHE_HIT_RATIO: (GAUGE, "Share of the lookups in the caches that hit.", None),
+    ADMISSION_REQUESTS: (
+        COUNTER,
+        "Requests admitted, or rejected by reason and tenant, by admission control.",
+        None,
+    ),
+    POOL_CONNECTIONS: (
+        GAUGE,
+        "Connections of the pools, by database alias and state.",
+        None,
+    ),
+    POOL_WAITING: (
+        GAUGE,
+        "Requests waiting for a connection of the pools, by database alias.",
+        None,
+    ),
+    TRANSACTIONS: (
+        GAUGE,
+        "Transactions open on the database, by database alias and state.",
+        None,
+    ),
+}
+
+HTTP_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Transactions of every client but the one running this query, whether
+# running a statement ("active") or waiting for the next one.
+TRANSACTIONS_SQL = """
+    SELECT coalesce(state, 'unknown'), count(*)
+    FROM pg_stat_activity
+    WHERE datname = current_database()
+        AND backend_type = 'client backend'
+        AND xact_start IS NOT NULL
+        AND pid <> pg_backend_pid()
+    GROUP BY 1
+"""
+
+
+def get_labels_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+class MetricsRegistry:
+    """
+    Counters and histograms of this process, exposed together with those of
+    the other worker processes sharing `directory`.
+
+    Each process writes a snapshot of its metrics to its own file in
+    `directory` every `flush_interval` seconds from a thread of its own, once
+    it served a request, and whenever it is scraped; the process that is
+    scraped sums the snapshots of all of them. The other workers are thus seen up to
+    `flush_interval` late. Counters of processes that exited keep counting,
+    but their gauges are dropped. Like the multiprocess mode of the Prometheus
+    client, the directory should be emptied when the server starts.
+
+    Without `directory`, only this process is exposed.
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._values = defaultdict(float)
+        # Count of observations in each bucket, then in +Inf, then their sum.
+        self._histograms = {}
+        self._flusher_pid = None
+        self._stop_flushing = threading.Event()
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        key = (name, get_labels_key(labels))
+        with self._lock:
+            self._values[key] += value
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = (name, get_labels_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [0] * (len(buckets) + 1) + [0.0]
+            histogram[bisect.bisect_left(buckets, value)] += 1
+            histogram[-1] += value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+            self._histograms.clear()
+
+    def snapshot(self):
+        """Metrics of this process, with the statistics of its caches and pools."""
+        with self._lock:
+            samples = [
+                [name, dict(labels), value]
+                for (name, labels), value in self._values.items()
+            ]
+            histograms = [
+                [name, dict(labels), list(histogram)]
+                for (name, labels), histogram in self._histograms.items()
+            ]
+        samples.extend(collect_process_stats())
+        return {"pid": os.getpid(), "samples": samples, "histograms": histograms}
+
+    def flush(self):
+        """Write the snapshot of this process to its file in `directory`."""
+        os.makedirs(self.directory, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(self.snapshot(), file)
+        # Readers see either the previous snapshot or this one, never half of it.
+        os.replace(path, os.path.join(self.directory, f"{os.getpid()}.json"))
+
+    def start_flushing(self):
+        """
+        Flush every `flush_interval` seconds from a daemon thread, started
+        once in each process, so requests never wait for the file.
+        """
+        if not self.directory or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            # A forked worker does not inherit the thread of its parent.
+            self._flusher_pid = os.getpid()
+            self._stop_flushing.clear()
+        threading.Thread(
+            target=self._flush_periodically, name="metrics-flush", daemon=True
+        ).start()
+
+    def stop_flushing(self):
+        self._stop_flushing.set()
+        self._flusher_pid = None
+
+    def _flush_periodically(self):
+        stop = self._stop_flushing
+        while not stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not write the metrics of this process")
+
+    def collect(self):
+        """Snapshots of this process and of the others sharing `directory`."""
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        snapshots = []
+        for path in glob.glob(os.path.join(self.directory, "*.json")):
+            try:
+                with open(path) as file:
+                    snapshots.append(json.load(file))
+            except OSError:
+                # Removed since it was listed.
+                continue
+        return snapshots
+
+    def render(self):
+        """Metrics of every process, in the Prometheus text format."""
+        values = defaultdict(float)
+        histograms = {}
+        for snapshot in self.collect():
+            alive = is_alive(snapshot["pid"])
+            for name, labels, value in snapshot["samples"]:
+                if name in METRICS and (alive or METRICS[name][0] != GAUGE):
+                    values[name, get_labels_key(labels)] += value
+            for name, labels, counts in snapshot["histograms"]:
+                if name not in METRICS:
+                    continue
+                merged = histograms.setdefault(
+                    (name, get_labels_key(labels)), [0] * len(counts)
+                )
+                for position, count in enumerate(counts):
+                    merged[position] += count
+
+        for name, labels, value in collect_database_stats():
+            values[name, get_labels_key(labels)] += value
+        add_hit_ratios(values)
+        return format_metrics(values, histograms)
+
+
+def is_alive(pid):
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Alive, but run by another user.
+        return True
+    return True
+
+
+def collect_process_stats():
+    """Samples of the caches, admission control and pools of this process."""
+    samples = []
+    for cache, stats in [
+        ("principal", principal_cache.stats()),
+        ("response", response_cache.stats()),
+    ]:
+        for result, count in (("hit", stats["hits"]), ("miss", stats["misses"])):
+            samples.append([CACHE_REQUESTS, {"cache": cache, "result": result}, count])
+
+    stats = admission_control.stats()
+    samples.append([ADMISSION_REQUESTS, {"result": "admitted"}, stats["admitted"]])
+    for tenant_id, reasons in stats["rejected"].items():
+        for reason in (RATE, CONCURRENCY):
+            labels = {"result": reason, "tenant": tenant_id}
+            samples.append([ADMISSION_REQUESTS, labels, reasons[reason]])
+
+    for alias, stats in pool_stats().items():
+        size, available = stats.get("pool_size", 0), stats.get("pool_available", 0)
+        samples.append([POOL_CONNECTIONS, {"alias": alias, "state": "idle"}, available])
+        samples.append(
+            [POOL_CONNECTIONS, {"alias": alias, "state": "busy"}, size - available]
+        )
+        samples.append(
+            [POOL_WAITING, {"alias": alias}, stats.get("requests_waiting", 0)]
+        )
+    return samples
+
+
+def collect_database_stats():
+    """Samples read from the databases, which all processes share."""
+    samples = []
+    for alias in connections:
+        with connections[alias].cursor() as cursor:
+            cursor.execute(TRANSACTIONS_SQL)
+            counts = {"active": 0, "idle in transaction": 0, **dict(cursor.fetchall())}
+        for state, count in counts.items():
+            samples.append([TRANSACTIONS, {"alias": alias, "state": state}, count])
+    return samples
+
+
+def add_hit_ratios(values):
+    lookups = defaultdict(lambda: {"hit": 0.0, "miss": 0.0})
+    for (name, labels), value in list(values.items()):
+        if name == CACHE_REQUESTS:
+            labels = dict(labels)
+            lookups[labels["cache"]][labels["result"]] += value
+    for cache, counts in lookups.items():
+        total = counts["hit"] + counts["miss"]
+        if total:
+            values[CACHE_HIT_RATIO, (("cache", cache),)] = counts["hit"] / total
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in labels) + "}"
+
+
+def escape(value):
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def format_metrics(values, histograms):
+    lines = []
+    for name, (kind, help_text, buckets) in METRICS.items():
+        if kind == HISTOGRAM:
+            samples = sorted(
+                (labels, counts)
+                for (metric, labels), counts in histograms.items()
+                if metric == name
+            )
+        else:
+            samples = sorted(
+                (labels, value)
+                for (metric, labels), value in values.items()
+                if metric == name
+            )
+        if not samples:
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            if kind != HISTOGRAM:
+                lines.append(f"{name}{format_labels(labels)} {float(value)!r}")
+                continue
+            *counts, total = value
+            cumulative = 0
+            for bound, count in zip([*buckets, "+Inf"], counts):
+                cumulative += count
+                bucket_labels = format_labels((*labels, ("le", str(bound))))
+                lines.append(f"{name}_bucket{bucket_labels} {float(cumulative)!r}")
+            lines.append(f"{name}_sum{format_labels(labels)} {float(total)!r}")
+            lines.append(f"{name}_count{format_labels(labels)} {float(cumulative)!r}")
+    return "\n".join(lines) + "\n"
+
+
+def observe_request(request, response, duration):
+    """Record a request in the metrics registry."""
+    match = getattr(request, "resolver_match", None)
+    view = getattr(match, "url_name", None) or "unmatched"
+    method = request.method if request.method in HTTP_METHODS else "other"
+    metrics_registry.observe(
+        REQUEST_DURATION,
+        duration,
+        view=view,
+        method=method,
+        status=str(response.status_code),
+    )
+    # Set by api.profiling.profiling_middleware.
+    profile = getattr(request, "profile", None)
+    if profile is not None:
+        metrics_registry.observe(REQUEST_QUERIES, profile.queries, view=view)
+        phases = [
+            profile.phases[name]
+            for name in ("auth", "tenant")
+            if name in profile.phases
+        ]
+        if phases:
+            metrics_registry.observe(TENANT_CONTEXT, sum(phases))
+    metrics_registry.start_flushing()
+
+
+@sync_and_async_middleware
+def metrics_middleware(get_response):
+    """
+    Record the latency of each request when settings.METRICS["ENABLED"] is
+    set. It goes first, so the latency covers the other middleware. Queries
+    and tenant context time come from the profile of the request, which the
+    profiling middleware also collects when only the metrics are enabled.
+    """
+    if not settings.METRICS["ENABLED"]:
+        raise MiddlewareNotUsed
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            start = time.perf_counter()
+            response = await get_response(request)
+            observe_request(request, response, time.perf_counter() - start)
+            return response
+
+    else:
+
+        def middleware(request):
+            start = time.perf_counter()
+            response = get_response(request)
+            observe_request(request, response, time.perf_counter() - start)
+            return response
+
+    return middleware
+
+
+def is_scraper(request):
+    """
+    Whether `request` comes from an address of METRICS["ALLOWED_IPS"] or
+    carries the bearer token of METRICS["TOKEN"].
+    """
+    token = settings.METRICS["TOKEN"]
+    if token and hmac.compare_digest(
+        request.headers.get("Authorization", "").encode(), f"Bearer {token}".encode()
+    ):
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get("REMOTE_ADDR", ""))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in settings.METRICS["ALLOWED_IPS"]
+    )
+
+
+@tenant_context_exempt
+def metrics_view(request):
+    """Metrics of every worker process, for Prometheus to scrape."""
+    if not settings.METRICS["ENABLED"]:
+        raise Http404
+    if not is_scraper(request):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics_registry.render(), content_type=CONTENT_TYPE)
+
+
+metrics_registry = MetricsRegistry(
+    directory=settings.METRICS["DIRECTORY"],
+    flush_interval=settings.METRICS["FLUSH_INTERVAL"],
+)
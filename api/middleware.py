@@ -1,53 +1,197 @@
-from django.db import connection, transaction
+import logging
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.db import connections, transaction
+from django.urls import Resolver404, resolve
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.request import Request
-from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from api.admission import admission_control, get_rejection_response
+from api.asyncdb import async_atomic, async_tenant_context
+from api.authentication import TenantJWTAuthentication
+from api.profiling import profile_phase
+from api.routers import (
+    SAFE_METHODS,
+    aget_read_alias,
+    apin_to_primary,
+    get_read_alias,
+    get_request_alias,
+    pin_to_primary,
+    request_routing,
+)
+from api.tenancy import requires_tenant_context, tenant_context, tenant_scope
+
+logger = logging.getLogger(__name__)
 
 
+@sync_and_async_middleware
 def set_tenant_context_middleware(get_response):
+    """
+    Run each request in a transaction carrying its tenant context.
+
+    Under ASGI, async views get their transaction on an async connection and
+    never leave the event loop. Every other view, and every view under WSGI,
+    runs in a regular Django transaction on the thread of the view.
+    """
+    if iscoroutinefunction(get_response):
+        return async_tenant_context_middleware(get_response)
+    return tenant_context_middleware(get_response)
+
+
+def resolve_view(request):
+    try:
+        return resolve(request.path_info).func
+    except Resolver404:
+        return None
+
+
+def tenant_context_middleware(get_response):
     # One-time configuration and initialization.
+    async_middleware = async_tenant_context_middleware(sync_to_async(get_response))
+
+    def get_tenant_response(request):
+        tenant_id = request.user.tenant_id if request.user is not None else None
+        if not tenant_id:
+            logger.debug("No tenant context set for %s", request.path)
+        # Each tenant's requests are admitted under its own rate and
+        # concurrency limits, so a noisy tenant cannot take all the workers.
+        # Streaming exports hold their slot until the body is sent.
+        with tenant_scope(tenant_id), admission_control.admit(tenant_id) as rejection:
+            if rejection is not None:
+                return get_rejection_response(rejection)
+            with profile_phase("view"):
+                response = get_response(request)
+            return admission_control.hold_until_closed(tenant_id, response)
+
+    def get_authenticated_response(request):
+        # 3. JWT requests run in a single transaction. The token is validated
+        # without a query, and one statement loads the user with its tenant and
+        # sets the tenant context of that transaction. The result is kept on the
+        # request, so DRF reuses it instead of authenticating a second time.
+        if "Authorization" in request.headers:
+            with transaction.atomic(using=get_request_alias()):
+                try:
+                    with profile_phase("auth"):
+                        user_auth_tuple = TenantJWTAuthentication().authenticate(
+                            Request(request)
+                        )
+                except AuthenticationFailed:
+                    # Let DRF reject the request with a proper 401 response.
+                    user_auth_tuple = None
+                if user_auth_tuple is not None:
+                    request.user, request.auth = user_auth_tuple
+                    return get_tenant_response(request)
+
+        # 4. Otherwise fall back to the session user, which is already loaded,
+        # and set the tenant context on its own.
+        user = getattr(request, "user", None)
+        if user is None or not user.is_authenticated:
+            request.user = None
+            return get_tenant_response(request)
+
+        if user.tenant_id:
+            with tenant_context(user.tenant_id):
+                return get_tenant_response(request)
+        return get_tenant_response(request)
 
     def middleware(request):
         # Code to be executed for each request before
-        tenant_id = None
-        user_id = None
 
-        # 1. Get user_id via JWT Token
+        # 1. Views that never touch tenant tables (token endpoints, registration,
+        # tenant info) skip the tenant transaction; DRF authenticates them alone.
+        view = resolve_view(request)
+        if view is None or not requires_tenant_context(view):
+            return get_response(request)
+
+        # Async views query on an async connection, also under WSGI.
+        if iscoroutinefunction(view):
+            return async_to_sync(async_middleware)(request)
+
+        # 2. Safe methods read from the replica, unless the client wrote shortly
+        # before and must see its own writes. They run as READ ONLY
+        # transactions whenever the request owns the transaction.
+        safe = request.method in SAFE_METHODS
+        using = get_read_alias(request)
+        read_only = safe and not connections[using].in_atomic_block
+
+        with request_routing(using, read_only):
+            response = get_authenticated_response(request)
+
+        if not safe and response.status_code < 400:
+            pin_to_primary(request)
+        return response
+
+    return middleware
+
+
+def async_tenant_context_middleware(get_response):
+    sync_middleware = None
+
+    async def get_tenant_response(request):
+        tenant_id = request.user.tenant_id if request.user is not None else None
+        if not tenant_id:
+            logger.debug("No tenant context set for %s", request.path)
+        with tenant_scope(tenant_id):
+            async with admission_control.aadmit(tenant_id) as rejection:
+                if rejection is not None:
+                    return get_rejection_response(rejection)
+                with profile_phase("view"):
+                    response = await get_response(request)
+                return await admission_control.ahold_until_closed(tenant_id, response)
+
+    async def get_authenticated_response(request):
+        # Same steps as the sync middleware, on an async connection. Failed
+        # authentications are kept for the view to report.
         if "Authorization" in request.headers:
-            user_auth_tuple = JWTAuthentication().authenticate(Request(request))
-            if user_auth_tuple is not None:
-                request.user, request.auth = user_auth_tuple
-                user_id = request.auth.payload.get("user_id") if request.auth else None
-
-        # 2. If user_id is not found in JWT, check if user is authenticated via session
-        if not user_id and request.user.is_authenticated:
-            user_id = request.user.id
-
-        # 3. If user_id is found, set tenant context
-        if user_id:
-            from api.models import User
-
-            try:
-                user = User.objects.get(id=user_id)
-                request.user = user
-                tenant_id = request.user.tenant.id
-            except User.DoesNotExist:
-                request.user = None
-        else:
+            async with async_atomic():
+                try:
+                    with profile_phase("auth"):
+                        user_auth_tuple = await TenantJWTAuthentication().aauthenticate(
+                            request
+                        )
+                except AuthenticationFailed as exc:
+                    request.authentication_error = exc
+                    user_auth_tuple = None
+                if user_auth_tuple is not None:
+                    request.user, request.auth = user_auth_tuple
+                    return await get_tenant_response(request)
+
+        user = await request.auser() if hasattr(request, "auser") else None
+        if user is None or not user.is_authenticated:
             request.user = None
+            return await get_tenant_response(request)
 
-        # 4. Set tenant context for the request
-        if tenant_id:
-            with transaction.atomic():
-                with connection.cursor() as cursor:
-                    cursor.execute(
-                        "SET LOCAL app.current_tenant_id = %s",
-                        [str(tenant_id)],
-                    )
-                    print("before")
-                    response = get_response(request)
-                return response
-        else:
-            print("No tenant context set")
-            return get_response(request)
+        if user.tenant_id:
+            async with async_tenant_context(user.tenant_id):
+                return await get_tenant_response(request)
+        return await get_tenant_response(request)
+
+    async def middleware(request):
+        nonlocal sync_middleware
+
+        view = resolve_view(request)
+        if view is None or not requires_tenant_context(view):
+            return await get_response(request)
+
+        # Sync views need their transaction on the thread they run in, so the
+        # sync middleware wraps them there, as Django does for sync middleware.
+        if not iscoroutinefunction(view):
+            if sync_middleware is None:
+                sync_middleware = tenant_context_middleware(
+                    async_to_sync(get_response)
+                )
+            return await sync_to_async(sync_middleware)(request)
+
+        # The transaction always belongs to the request here.
+        safe = request.method in SAFE_METHODS
+        using = await aget_read_alias(request)
+
+        with request_routing(using, safe):
+            response = await get_authenticated_response(request)
+
+        if not safe and response.status_code < 400:
+            await apin_to_primary(request)
+        return response
 
     return middleware
@@ -0,0 +1,30 @@
+# Generated by Django 6.1.2 on 2026-10-17 04:16
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction; building the
+    # indexes this way does not block writes to the tables.
+    atomic = False
+
+    dependencies = [
+        ('api', '0007_user_auth_version'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='task',
+            index=models.Index(fields=['tenant', 'project'], name='task_tenant_project_idx'),
+        ),
+        migrations.AlterField(
+            model_name='taskcomment',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True),
+        ),
+        AddIndexConcurrently(
+            model_name='taskcomment',
+            index=models.Index(fields=['tenant', 'task', 'created_at', 'id'], name='comment_task_timeline_idx'),
+        ),
+    ]
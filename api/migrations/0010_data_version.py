@@ -0,0 +1,23 @@
+# Generated by Django 6.1.2 on 2026-10-17 04:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_task_task_tenant_project_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='data_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='tenant',
+            name='data_version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
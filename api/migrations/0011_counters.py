@@ -0,0 +1,51 @@
+# Generated by Django 6.1.2 on 2026-10-17 05:09
+
+from django.db import migrations, models
+
+
+def backfill_counters(apps, schema_editor):
+    # Row level security hides every row without a tenant context, so the
+    # counters are computed tenant by tenant.
+    Tenant = apps.get_model("api", "Tenant")
+    with schema_editor.connection.cursor() as cursor:
+        for tenant_id in Tenant.objects.values_list("id", flat=True):
+            cursor.execute(
+                "SELECT set_config('app.current_tenant_id', %s, true)",
+                [str(tenant_id)],
+            )
+            cursor.execute(
+                """
+                UPDATE api_task t SET comment_count = (
+                    SELECT count(*) FROM api_taskcomment c WHERE c.task_id = t.id
+                )
+                """
+            )
+            cursor.execute(
+                """
+                UPDATE api_project p SET task_count = (
+                    SELECT count(*) FROM api_task t WHERE t.project_id = p.id
+                )
+                """
+            )
+        cursor.execute("SELECT set_config('app.current_tenant_id', '', true)")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_data_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='task_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 6.1.2 on 2026-10-17 05:18
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import BtreeGinExtension, TrigramExtension
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_counters'),
+    ]
+
+    operations = [
+        BtreeGinExtension(),
+        TrigramExtension(),
+        migrations.AddField(
+            model_name='task',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('name', config='english'), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddField(
+            model_name='taskcomment',
+            name='search_vector',
+            field=models.GeneratedField(db_persist=True, expression=django.contrib.postgres.search.SearchVector('content', config='english'), output_field=django.contrib.postgres.search.SearchVectorField()),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tenant', 'search_vector'], name='task_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=django.contrib.postgres.indexes.GinIndex(models.F('tenant'), django.contrib.postgres.indexes.OpClass(models.F('name'), name='gin_trgm_ops'), name='task_name_trgm_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskcomment',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['tenant', 'search_vector'], name='comment_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='taskcomment',
+            index=django.contrib.postgres.indexes.GinIndex(models.F('tenant'), django.contrib.postgres.indexes.OpClass(models.F('content'), name='gin_trgm_ops'), name='comment_content_trgm_idx'),
+        ),
+    ]
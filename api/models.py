@@ -1,16 +1,53 @@
 import uuid
 
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from django.db.models import DEFERRED
+from django.db.models import F
 
 from api.exceptions import AuthorizationError, ValidationError
+from api.tenancy import get_current_tenant_id
 
 
-class Tenant(models.Model):
+class FUpdatedFieldsMixin:
+    """
+    Leaves `f_updated_fields` out of saves of existing rows. They are only
+    changed by F() updates (see api.versioning and api.signals), which do not
+    refresh loaded instances, so saving one would write back stale values.
+    """
+
+    f_updated_fields = ()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not kwargs.get("force_insert"):
+            update_fields = kwargs.get("update_fields")
+            if update_fields is None:
+                deferred = self.get_deferred_fields()
+                update_fields = [
+                    field.name
+                    for field in self._meta.concrete_fields
+                    if not field.primary_key
+                    and not field.generated
+                    and field.attname not in deferred
+                ]
+            kwargs["update_fields"] = [
+                name for name in update_fields if name not in self.f_updated_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class Tenant(FUpdatedFieldsMixin, models.Model):
     id = models.UUIDField(
         primary_key=True, editable=False, unique=True, default=uuid.uuid4
     )
     name = models.CharField(max_length=255)
+    # Bumped by every write to the projects, tasks and comments of the tenant;
+    # read endpoints derive their ETags from it.
+    data_version = models.PositiveBigIntegerField(default=0)
+
+    f_updated_fields = ("data_version",)
 
     def save(self, *args, **kwargs):
         owner = kwargs.pop("owner", None)
@@ -28,16 +65,42 @@ class Tenant(models.Model):
         return self.name
 
 
+class TenantManager(models.Manager):
+    """
+    Adds an explicit `tenant_id = X` predicate for the tenant of the current
+    request, so the planner can combine it with the composite tenant indexes.
+    RLS still applies on top of it.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        # Search vectors are only read by search queries.
+        if any(field.name == "search_vector" for field in self.model._meta.fields):
+            queryset = queryset.defer("search_vector")
+        tenant_id = get_current_tenant_id()
+        if tenant_id is not None:
+            queryset = queryset.filter(tenant_id=tenant_id)
+        return queryset
+
+
 class TenantPolicyDependent(models.Model):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
 
+    objects = TenantManager()
+
     class Meta:
         abstract = True
 
 
-class Project(TenantPolicyDependent):
+class Project(FUpdatedFieldsMixin, TenantPolicyDependent):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
     name = models.CharField(max_length=255)
+    # Bumped by every write to the project, its tasks and their comments.
+    data_version = models.PositiveBigIntegerField(default=0)
+    # Maintained by api.signals; `manage.py reconcile_counters` fixes drift.
+    task_count = models.PositiveIntegerField(default=0)
+
+    f_updated_fields = ("data_version", "task_count")
 
     class Meta:
         unique_together = ("tenant", "name")
@@ -46,10 +109,32 @@ class Project(TenantPolicyDependent):
         return self.name
 
 
-class Task(TenantPolicyDependent):
+class Task(FUpdatedFieldsMixin, TenantPolicyDependent):
     tenant = models.ForeignKey(Tenant, on_delete=models.CASCADE)
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="tasks")
     name = models.CharField(max_length=255)
+    # Maintained by api.signals; `manage.py reconcile_counters` fixes drift.
+    comment_count = models.PositiveIntegerField(default=0)
+    search_vector = models.GeneratedField(
+        expression=SearchVector("name", config="english"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    f_updated_fields = ("comment_count",)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["tenant", "project"], name="task_tenant_project_idx"),
+            # Tenant-leading GIN indexes (btree_gin) for full-text and trigram
+            # search, so matches of other tenants are never visited.
+            GinIndex(fields=["tenant", "search_vector"], name="task_search_idx"),
+            GinIndex(
+                F("tenant"),
+                OpClass(F("name"), name="gin_trgm_ops"),
+                name="task_name_trgm_idx",
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -60,7 +145,27 @@ class TaskComment(TenantPolicyDependent):
     task = models.ForeignKey(Task, on_delete=models.CASCADE, related_name="comments")
     author = models.ForeignKey("User", on_delete=models.SET_NULL, null=True)
     content = models.TextField()
-    created_at = models.DateTimeField(auto_now=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    search_vector = models.GeneratedField(
+        expression=SearchVector("content", config="english"),
+        output_field=SearchVectorField(),
+        db_persist=True,
+    )
+
+    class Meta:
+        indexes = [
+            # Task timelines, ordered by (created_at, id) in either direction.
+            models.Index(
+                fields=["tenant", "task", "created_at", "id"],
+                name="comment_task_timeline_idx",
+            ),
+            GinIndex(fields=["tenant", "search_vector"], name="comment_search_idx"),
+            GinIndex(
+                F("tenant"),
+                OpClass(F("content"), name="gin_trgm_ops"),
+                name="comment_content_trgm_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author} on {self.task}"
@@ -85,6 +190,27 @@ class User(AbstractUser):
         blank=True,
         related_name="created_users",
     )
+    # Embedded in access tokens; bumped whenever tokens carrying the old
+    # tenant/role claims must stop being refreshed.
+    auth_version = models.PositiveIntegerField(default=0)
+
+    # Saving a change to these bumps auth_version.
+    auth_fields = ("tenant_id", "is_active")
+
+    @classmethod
+    def from_db(cls, db, field_names, values, *, fetch_mode=None):
+        user = super().from_db(db, field_names, values, fetch_mode=fetch_mode)
+        loaded = dict(zip(field_names, values))
+        user._loaded_auth = {
+            name: loaded[name]
+            for name in cls.auth_fields
+            if loaded.get(name, DEFERRED) is not DEFERRED
+        }
+        return user
+
+    def has_auth_changes(self):
+        loaded = getattr(self, "_loaded_auth", {})
+        return any(getattr(self, name) != value for name, value in loaded.items())
 
     def change_role(self, new_role: str, changed_by=None):
         if changed_by is None:
@@ -103,6 +229,7 @@ class User(AbstractUser):
         elif changed_by.role != "owner":
             raise AuthorizationError("You are not authorized to update users.")
         self.role = new_role
+        self.auth_version += 1
         super().save()
 
     def clean(self):
@@ -143,7 +270,15 @@ class User(AbstractUser):
 
         if self.created_by:
             self.tenant = self.created_by.tenant
+
+        # Deactivated users and users joining or leaving a tenant can no
+        # longer refresh the tokens issued before.
+        if not self._state.adding and self.has_auth_changes():
+            self.auth_version += 1
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "auth_version"}
         super().save(*args, **kwargs)
+        self._loaded_auth = {name: getattr(self, name) for name in self.auth_fields}
 
     def __str__(self):
         return self.username
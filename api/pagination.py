@@ -0,0 +1,146 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.fields import get_attribute
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_value(value):
+    # Keep full microsecond precision, unlike DjangoJSONEncoder, so timestamps
+    # in a cursor compare exactly against the column they came from.
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque-cursor pagination over a unique ordering.
+
+    The cursor stores the ordering values of the last row of the page, and the
+    next page is fetched with a keyset predicate instead of an OFFSET, so deep
+    pages cost the same as the first one.
+    """
+
+    cursor_query_param = "cursor"
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    invalid_cursor_message = "Invalid cursor"
+
+    def __init__(self, ordering=("id",)):
+        self.ordering = tuple(ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        return self.set_page(list(self.get_page_queryset(queryset, request)))
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Queryset of the requested page plus one row, which tells whether there
+        is a next page. Evaluate it and pass the rows to set_page().
+        """
+        position = self.get_position(request, queryset.model)
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_keyset_filter(position))
+        return queryset[: self.page_size + 1]
+
+    def get_position(self, request, model=None):
+        """
+        Read the page size and return the ordering values the requested page
+        starts after, or None for the first page. With a `model`, the values
+        are validated and converted by its ordering fields.
+        """
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        return self.decode_cursor(request, model)
+
+    def set_page(self, results):
+        self.has_next = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response(self.get_paginated_data(data))
+
+    def get_paginated_data(self, data):
+        return {"next": self.get_next_link(), "results": data}
+
+    def get_page_size(self, request):
+        page_size = settings.PAGE_SIZE
+        try:
+            requested = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return page_size
+        if requested > 0:
+            page_size = min(requested, self.max_page_size)
+        return page_size
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        # Rows of the async views are dicts rather than model instances.
+        position = [get_attribute(last, [field.lstrip("-")]) for field in self.ordering]
+        url = self.request.build_absolute_uri()
+        return replace_query_param(
+            url, self.cursor_query_param, self.encode_cursor(position)
+        )
+
+    def get_keyset_filter(self, position):
+        """
+        Build `(a, b, ...) > (x, y, ...)` for the ordering, honouring per-field
+        direction. The leading field is also bounded on its own so the planner
+        can turn the predicate into an index range scan.
+        """
+        fields = [
+            (field.lstrip("-"), "lt" if field.startswith("-") else "gt")
+            for field in self.ordering
+        ]
+        keyset = Q()
+        for index, (name, lookup) in enumerate(fields):
+            condition = Q(**{f"{name}__{lookup}": position[index]})
+            for (previous, _), value in zip(fields[:index], position):
+                condition &= Q(**{previous: value})
+            keyset |= condition
+
+        leading, lookup = fields[0]
+        return Q(**{f"{leading}__{lookup}e": position[0]}) & keyset
+
+    def encode_cursor(self, position):
+        payload = json.dumps(position, default=encode_value, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, request, model=None):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            padding = "=" * (-len(encoded) % 4)
+            position = json.loads(base64.urlsafe_b64decode(encoded + padding))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        if model is not None:
+            position = self.to_python(position, model)
+        return position
+
+    def to_python(self, position, model):
+        fields = [model._meta.get_field(name.lstrip("-")) for name in self.ordering]
+        try:
+            position = [
+                field.to_python(value) for field, value in zip(fields, position)
+            ]
+        except (ValidationError, TypeError):
+            raise NotFound(self.invalid_cursor_message)
+        # None would not compare to anything in the keyset predicate.
+        if None in position:
+            raise NotFound(self.invalid_cursor_message)
+        return position
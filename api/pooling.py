@@ -0,0 +1,38 @@
+from django.db import connections
+
+from api.tenancy import TENANT_SETTING
+
+
+def reset_tenant_context(connection):
+    """
+    `reset` hook of the psycopg pool, run on every connection returned to it.
+
+    The tenant context is only ever set transaction-local, so it is gone by
+    the time a connection is returned. Resetting it again makes sure a
+    session-level value, should one ever be set, cannot reach the next request.
+    """
+    connection.execute(f"RESET {TENANT_SETTING}")
+
+
+async def areset_tenant_context(connection):
+    """Async counterpart, run on connections returned to api.asyncdb's pools."""
+    await connection.execute(f"RESET {TENANT_SETTING}")
+
+
+def configure_pools():
+    """Install the tenant reset hook on every pooled database alias."""
+    for alias in connections:
+        options = connections.settings[alias].setdefault("OPTIONS", {})
+        if options.get("pool") is True:
+            options["pool"] = {}
+        if isinstance(options.get("pool"), dict):
+            options["pool"].setdefault("reset", reset_tenant_context)
+
+
+def pool_stats():
+    """Statistics of the connection pool of each pooled alias in this process."""
+    return {
+        alias: connections[alias].pool.get_stats()
+        for alias in connections
+        if connections[alias].pool is not None
+    }
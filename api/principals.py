@@ -0,0 +1,163 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import SimpleLazyObject
+
+Principal = namedtuple("Principal", ["tenant_id", "role", "is_active"])
+
+
+class PrincipalCache:
+    """
+    Bounded LRU cache of user id -> Principal with a time to live.
+
+    Entries live in process memory. When `backend` names a Django cache alias,
+    that cache is used as a second, shared level so workers can reuse each
+    other's lookups. Invalidation removes the entry from both levels; other
+    processes drop their local copy at the latest when its TTL expires.
+    """
+
+    key_prefix = "gosync:principal:"
+
+    def __init__(self, max_size=10000, ttl=60, backend=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_size > 0 and self.ttl > 0
+
+    @property
+    def shared(self):
+        return caches[self.backend] if self.backend else None
+
+    def get(self, user_id):
+        if not self.enabled:
+            return None
+        principal = self._get_local(user_id)
+        if principal is None:
+            value = None
+            if self.shared is not None:
+                value = self.shared.get(f"{self.key_prefix}{user_id}")
+            principal = self._load_shared(user_id, value)
+        return principal
+
+    async def aget(self, user_id):
+        if not self.enabled:
+            return None
+        principal = self._get_local(user_id)
+        if principal is None:
+            value = None
+            if self.shared is not None:
+                value = await self.shared.aget(f"{self.key_prefix}{user_id}")
+            principal = self._load_shared(user_id, value)
+        return principal
+
+    def set(self, user_id, principal):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._store(user_id, principal)
+        if self.shared is not None:
+            self.shared.set(
+                f"{self.key_prefix}{user_id}", tuple(principal), timeout=self.ttl
+            )
+
+    async def aset(self, user_id, principal):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._store(user_id, principal)
+        if self.shared is not None:
+            await self.shared.aset(
+                f"{self.key_prefix}{user_id}", tuple(principal), timeout=self.ttl
+            )
+
+    def delete(self, *user_ids):
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+        if self.shared is not None:
+            self.shared.delete_many([f"{self.key_prefix}{pk}" for pk in user_ids])
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+    def _get_local(self, user_id):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry[0]
+            self._entries.pop(user_id, None)
+        return None
+
+    def _load_shared(self, user_id, value):
+        principal = Principal(*value) if value is not None else None
+        with self._lock:
+            if principal is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._store(user_id, principal)
+        return principal
+
+    def _store(self, user_id, principal):
+        self._entries[user_id] = (principal, time.monotonic() + self.ttl)
+        self._entries.move_to_end(user_id)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+
+class PrincipalUser(SimpleLazyObject):
+    """
+    Stand-in for a user resolved from the principal cache.
+
+    The cached fields are answered without a query; any other attribute loads
+    the user (with its tenant) on first access, e.g. when a view writes.
+    """
+
+    def __init__(self, user_id, principal):
+        from api.models import User
+
+        super().__init__(
+            lambda: User.objects.select_related("tenant").get(pk=user_id)
+        )
+        self.__dict__.update(
+            id=user_id,
+            pk=user_id,
+            tenant_id=principal.tenant_id,
+            role=principal.role,
+            is_active=principal.is_active,
+            is_authenticated=True,
+            is_anonymous=False,
+        )
+
+    def __bool__(self):
+        return True
+
+
+principal_cache = PrincipalCache(
+    max_size=settings.PRINCIPAL_CACHE["MAX_SIZE"],
+    ttl=settings.PRINCIPAL_CACHE["TTL"],
+    backend=settings.PRINCIPAL_CACHE["BACKEND"],
+)
@@ -0,0 +1,199 @@
+import heapq
+import json
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.decorators import sync_and_async_middleware
+
+logger = logging.getLogger(__name__)
+
+_current_profile = ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    """
+    Timings of one request: the time spent in each phase, and the number,
+    total time and slowest of the database queries it ran.
+    """
+
+    def __init__(self, slowest_queries=3):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.phases = {}
+        self.queries = 0
+        self.db_time = 0.0
+        self.slowest_queries = slowest_queries
+        self._slowest = []
+
+    @property
+    def total(self):
+        return (self.finished or time.perf_counter()) - self.started
+
+    @property
+    def slowest(self):
+        return sorted(self._slowest, reverse=True)
+
+    def add_phase(self, name, duration):
+        self.phases[name] = self.phases.get(name, 0.0) + duration
+
+    def add_query(self, sql, duration):
+        self.queries += 1
+        self.db_time += duration
+        if len(self._slowest) < self.slowest_queries:
+            heapq.heappush(self._slowest, (duration, sql))
+        elif self._slowest and duration > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, (duration, sql))
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def get_server_timing(self):
+        """Value of the Server-Timing header, in milliseconds."""
+        metrics = [
+            f"{name};dur={duration * 1000:.1f}"
+            for name, duration in self.phases.items()
+        ]
+        metrics.append(
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"'
+        )
+        metrics.append(f"total;dur={self.total * 1000:.1f}")
+        return ", ".join(metrics)
+
+    def as_dict(self):
+        return {
+            "total_ms": round(self.total * 1000, 2),
+            "db_ms": round(self.db_time * 1000, 2),
+            "queries": self.queries,
+            "phases_ms": {
+                name: round(duration * 1000, 2)
+                for name, duration in self.phases.items()
+            },
+            "slowest_queries": [
+                {"ms": round(duration * 1000, 2), "sql": sql[:500]}
+                for duration, sql in self.slowest
+            ],
+        }
+
+
+def get_current_profile():
+    """Profile of the current request, or None when profiling is off."""
+    return _current_profile.get()
+
+
+@contextmanager
+def profile_phase(name):
+    """Add the time spent in the block to the phase `name` of the request."""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_phase(name, time.perf_counter() - start)
+
+
+def record_query(sql, duration):
+    """Record a query run outside of Django's connections, e.g. async ones."""
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.add_query(sql, duration)
+
+
+def record_profiled_query(execute, sql, params, many, context):
+    """Execute wrapper recording queries in the profile of the request."""
+    profile = _current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        profile.add_query(sql, time.perf_counter() - start)
+
+
+def install_query_recorder(connection, **kwargs):
+    """
+    Add record_profiled_query() to the wrappers of `connection`. Connections
+    are per thread, and sync views run in other threads than the event loop
+    under ASGI, so each connection gets it when it connects.
+    """
+    if record_profiled_query not in connection.execute_wrappers:
+        # First, so that execute_wrapper() blocks still pop their own wrapper.
+        connection.execute_wrappers.insert(0, record_profiled_query)
+
+
+@sync_and_async_middleware
+def profiling_middleware(get_response):
+    """
+    Profile each request when settings.PROFILING["ENABLED"] is set.
+
+    It goes right before the tenant middleware, so its phases (authentication,
+    tenant context, admission and the view) and every query run for the
+    request are timed. The timings are sent back in a Server-Timing header and
+    logged as one JSON line by the "api.profiling" logger.
+
+    With only settings.METRICS["ENABLED"], requests are still profiled for
+    the metrics, which read the profile from `request.profile`.
+    """
+    if not settings.PROFILING["ENABLED"] and not settings.METRICS["ENABLED"]:
+        raise MiddlewareNotUsed
+    connection_created.connect(install_query_recorder)
+
+    if iscoroutinefunction(get_response):
+
+        async def middleware(request):
+            profile = request.profile = RequestProfile(
+                settings.PROFILING["SLOWEST_QUERIES"]
+            )
+            token = _current_profile.set(profile)
+            try:
+                response = await get_response(request)
+            finally:
+                _current_profile.reset(token)
+            return finish_profile(profile, request, response)
+
+    else:
+
+        def middleware(request):
+            profile = request.profile = RequestProfile(
+                settings.PROFILING["SLOWEST_QUERIES"]
+            )
+            token = _current_profile.set(profile)
+            for connection in connections.all(initialized_only=True):
+                install_query_recorder(connection)
+            try:
+                response = get_response(request)
+            finally:
+                _current_profile.reset(token)
+            return finish_profile(profile, request, response)
+
+    return middleware
+
+
+def finish_profile(profile, request, response):
+    profile.finish()
+    if not settings.PROFILING["ENABLED"]:
+        return response
+    response["Server-Timing"] = profile.get_server_timing()
+    tenant_id = getattr(getattr(request, "user", None), "tenant_id", None)
+    logger.info(
+        json.dumps(
+            {
+                "method": request.method,
+                "path": request.path,
+                "status": response.status_code,
+                "tenant_id": str(tenant_id) if tenant_id else None,
+                **profile.as_dict(),
+            }
+        )
+    )
+    return response
@@ -0,0 +1,77 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class ResponseCache:
+    """
+    Cache of serialized response data in a Django cache.
+
+    Keys are built from the tenant, the project (or "list") and the ETag of
+    the request, which carries the data version of that project or tenant.
+    Signals bump those versions on every write to a project, its tasks or
+    their comments, so a write only moves the keys of its own project and
+    of the tenant's list. Entries under older versions are never read again
+    and are left to the eviction of the backend.
+    """
+
+    key_prefix = "gosync:response:"
+
+    def __init__(self, backend="default", timeout=300):
+        self.backend = backend
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return bool(self.backend) and self.timeout > 0
+
+    @property
+    def cache(self):
+        return caches[self.backend]
+
+    def get_key(self, tenant_id, project_id, etag):
+        scope = project_id if project_id is not None else "list"
+        version = etag.strip('"')
+        return f"{self.key_prefix}{tenant_id}:{scope}:{version}"
+
+    def get(self, tenant_id, project_id, etag):
+        if not self.enabled or not etag:
+            return None
+        data = self.cache.get(self.get_key(tenant_id, project_id, etag))
+        with self._lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def set(self, tenant_id, project_id, etag, data):
+        if not self.enabled or not etag:
+            return
+        self.cache.set(
+            self.get_key(tenant_id, project_id, etag), data, timeout=self.timeout
+        )
+
+    def clear(self):
+        if self.enabled:
+            self.cache.clear()
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "backend": self.backend,
+            }
+
+
+response_cache = ResponseCache(
+    backend=settings.RESPONSE_CACHE["BACKEND"],
+    timeout=settings.RESPONSE_CACHE["TIMEOUT"],
+)
@@ -0,0 +1,103 @@
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_request_routing = ContextVar("request_routing", default=(None, False))
+
+
+def get_request_alias():
+    """Database alias the current request reads from."""
+    return _request_routing.get()[0] or DEFAULT_DB_ALIAS
+
+
+def is_read_only():
+    """Whether the current request runs in a READ ONLY transaction."""
+    return _request_routing.get()[1]
+
+
+@contextmanager
+def request_routing(alias, read_only=False):
+    token = _request_routing.set((alias, read_only))
+    try:
+        yield
+    finally:
+        _request_routing.reset(token)
+
+
+class TenantReplicaRouter:
+    """
+    Send reads to the alias the tenant middleware picked for the request (the
+    read replica for safe methods) and every write to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        return _request_routing.get()[0]
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def get_pin_cache():
+    """Cache holding the pins, shared by all workers."""
+    return caches[settings.READ_YOUR_WRITES_CACHE]
+
+
+def get_pin_key(request):
+    credentials = request.headers.get("Authorization") or request.COOKIES.get(
+        settings.SESSION_COOKIE_NAME
+    )
+    if not credentials:
+        return None
+    return f"gosync:pin:{hashlib.sha256(credentials.encode()).hexdigest()}"
+
+
+def pin_to_primary(request):
+    """Read from the primary for a short while after a client wrote to it."""
+    key = get_pin_key(request)
+    if key and settings.READ_YOUR_WRITES_WINDOW > 0:
+        get_pin_cache().set(key, True, timeout=settings.READ_YOUR_WRITES_WINDOW)
+
+
+async def apin_to_primary(request):
+    key = get_pin_key(request)
+    if key and settings.READ_YOUR_WRITES_WINDOW > 0:
+        await get_pin_cache().aset(key, True, timeout=settings.READ_YOUR_WRITES_WINDOW)
+
+
+def is_pinned_to_primary(request):
+    key = get_pin_key(request)
+    return key is not None and get_pin_cache().get(key, False)
+
+
+async def ais_pinned_to_primary(request):
+    key = get_pin_key(request)
+    return key is not None and await get_pin_cache().aget(key, False)
+
+
+def may_read_from_replica(request):
+    return request.method in SAFE_METHODS and bool(settings.READ_REPLICA_ALIAS)
+
+
+def get_read_alias(request):
+    """Alias a request should read from: the replica for safe, unpinned ones."""
+    if may_read_from_replica(request) and not is_pinned_to_primary(request):
+        return settings.READ_REPLICA_ALIAS
+    return DEFAULT_DB_ALIAS
+
+
+async def aget_read_alias(request):
+    if may_read_from_replica(request) and not await ais_pinned_to_primary(request):
+        return settings.READ_REPLICA_ALIAS
+    return DEFAULT_DB_ALIAS
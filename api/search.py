@@ -0,0 +1,123 @@
+import re
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connections
+
+from api.models import Task, TaskComment
+from api.routers import get_request_alias
+
+SearchResult = namedtuple("SearchResult", ["kind", "id", "task_id", "text", "rank"])
+
+# Results come best first; ties are broken by kind and id so the ordering is
+# unique and can be paginated with a keyset.
+SEARCH_ORDERING = ("-rank", "-kind", "-id")
+
+SEARCH_CONFIG = "english"
+
+SEARCH_SQL = """
+    WITH {matches}
+    SELECT kind, id, task_id, text, rank FROM (
+        {candidates}
+    ) results
+    {keyset}
+    ORDER BY rank DESC, kind DESC, id DESC
+    LIMIT %(limit)s
+"""
+
+KEYSET_SQL = "WHERE (rank, kind, id) < (%(after_rank)s, %(after_kind)s, %(after_id)s)"
+
+# Full-text matches on every term as a prefix, or trigram word similarity
+# with the whole query for typos. Under RLS only the explicit tenant predicate
+# is an index condition: the search operators are not LEAKPROOF, so Postgres
+# filters the rows of the tenant with them rather than evaluating them ahead
+# of the policies. A MATERIALIZED CTE is planned for all of its rows, rather
+# than scanned in the hope of meeting the candidate limit early, and is still
+# only read as far as that limit.
+MATCHES_SQL = """
+    {kind}_matches AS MATERIALIZED (
+        SELECT id, {task_id} AS task_id, {column} AS text, search_vector
+        FROM {table}
+        WHERE tenant_id = %(tenant_id)s
+            AND (
+                search_vector @@ to_tsquery('{config}', %(tsquery)s)
+                OR %(q)s <%% {column}
+            )
+    )
+"""
+
+# Ranked by the sum of both scores, the full-text one normalized by document
+# length. Only the first candidates are ranked, which bounds the cost of
+# common terms: these are the first matches found, not the best ranked ones,
+# so a term matching more rows than the limit may miss better results. That
+# recall is traded for a cost that does not grow with the tenant.
+CANDIDATES_SQL = """
+    (
+        SELECT '{kind}' AS kind, id, task_id, text,
+            (
+                ts_rank(search_vector, to_tsquery('{config}', %(tsquery)s), 1)
+                + word_similarity(%(q)s, text)
+            )::float8 AS rank
+        FROM (SELECT * FROM {kind}_matches LIMIT %(candidates)s) candidates
+    )
+"""
+
+SEARCHED = [
+    ("task", Task, "id", "name"),
+    ("comment", TaskComment, "task_id", "content"),
+]
+
+
+def build_tsquery(q):
+    """A tsquery matching every word of `q` as a prefix, e.g. "dat:* & mig:*"."""
+    return " & ".join(f"{word}:*" for word in re.findall(r"[^\W_]+", q))
+
+
+def is_valid_position(position):
+    """Whether a decoded cursor holds a (rank, kind, id) position."""
+    rank, kind, id = position
+    return (
+        isinstance(rank, (int, float))
+        and kind in {kind for kind, *_ in SEARCHED}
+        and isinstance(id, int)
+    )
+
+
+def search(q, tenant_id, position=None, limit=50):
+    """
+    Search the names of the tasks and the content of the comments of a tenant.
+
+    Runs on the connection of the request, inside its tenant context, so the
+    RLS policies apply on top of the explicit tenant predicate. `position`
+    is the (rank, kind, id) of the last result of the previous page.
+    """
+    tables = [
+        {
+            "kind": kind,
+            "task_id": task_id,
+            "column": column,
+            "config": SEARCH_CONFIG,
+            "table": model._meta.db_table,
+        }
+        for kind, model, task_id, column in SEARCHED
+    ]
+    matches = ", ".join(MATCHES_SQL.format(**names) for names in tables)
+    candidates = " UNION ALL ".join(CANDIDATES_SQL.format(**names) for names in tables)
+    params = {
+        "q": q,
+        "tsquery": build_tsquery(q),
+        "tenant_id": tenant_id,
+        "candidates": settings.SEARCH_MAX_CANDIDATES,
+        "limit": limit,
+    }
+    keyset = ""
+    if position is not None:
+        keyset = KEYSET_SQL
+        params.update(zip(["after_rank", "after_kind", "after_id"], position))
+
+    with connections[get_request_alias()].cursor() as cursor:
+        cursor.execute(
+            SEARCH_SQL.format(matches=matches, candidates=candidates, keyset=keyset),
+            params,
+        )
+        return [SearchResult(*row) for row in cursor.fetchall()]
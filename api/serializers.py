@@ -1,6 +1,22 @@
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils.translation import gettext_lazy as _
 from rest_framework import serializers
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import (
+    TokenObtainPairSerializer,
+    TokenRefreshSerializer,
+)
+from rest_framework_simplejwt.settings import api_settings
 
+from api.asyncdb import ValuesPlan
+from api.authentication import AUTH_VERSION_CLAIM, add_tenant_claims
+from api.counters import add_counts
 from api.models import Project, Task, TaskComment, User
+from api.profiling import profile_phase
+from api.versioning import bump_data_versions
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -14,7 +30,111 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
-class TaskCommentSerializer(serializers.ModelSerializer):
+def parse_field_paths(value):
+    """Parse a comma separated `?fields=` or `?expand=` value into a set."""
+    paths = {path.strip() for path in (value or "").split(",") if path.strip()}
+    return paths or None
+
+
+def get_subpaths(paths, name):
+    if paths is None:
+        return None
+    prefix = f"{name}."
+    return {path[len(prefix) :] for path in paths if path.startswith(prefix)} or None
+
+
+class SparseFieldsMixin:
+    """
+    Sparse fieldsets and opt-in expansion of nested serializers.
+
+    `fields` names the fields to render and `expand` the nested serializers to
+    embed; dotted paths ("tasks.name", "tasks.comments") reach into nested
+    ones. A nested serializer is embedded only when a path of either starts
+    with its name. Without both, every field and nested serializer is rendered.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None or expand is not None:
+            self.restrict_fields(fields, expand or set())
+
+    def restrict_fields(self, fields, expand):
+        roots = {path.split(".")[0] for path in (fields or set()) | expand}
+        unknown = sorted(roots - set(self.fields))
+        if unknown:
+            raise serializers.ValidationError(
+                {"fields": [f"Unknown field: {name}." for name in unknown]}
+            )
+
+        for name, field in list(self.fields.items()):
+            nested = getattr(field, "child", field)
+            if not isinstance(nested, SparseFieldsMixin):
+                if fields is not None and name not in fields:
+                    del self.fields[name]
+            elif name in roots:
+                self.fields[name] = type(nested)(
+                    many=nested is not field,
+                    read_only=True,
+                    fields=get_subpaths(fields, name),
+                    expand=get_subpaths(expand, name) or set(),
+                )
+            else:
+                del self.fields[name]
+
+    def to_representation(self, instance):
+        # Top-level objects, alone or in a list, time their nested ones too.
+        parent = self.parent
+        if parent is None or (
+            parent.parent is None and getattr(parent, "child", None) is self
+        ):
+            with profile_phase("serialize"):
+                return super().to_representation(instance)
+        return super().to_representation(instance)
+
+    def get_sparse_queryset(self, queryset, columns=()):
+        """
+        Load only the columns rendered by this serializer, plus `columns`, and
+        prefetch only the nested serializers it embeds, recursively.
+        """
+        columns = set(columns)
+        lookups = []
+        for field in self.fields.values():
+            nested = getattr(field, "child", field)
+            if isinstance(nested, SparseFieldsMixin):
+                relation = queryset.model._meta.get_field(field.source)
+                related = relation.related_model._default_manager.all()
+                # The foreign key is needed to attach the rows to their parent.
+                related = nested.get_sparse_queryset(related, [relation.field.attname])
+                lookups.append(Prefetch(field.source, queryset=related))
+            else:
+                columns.add(field.source)
+        return queryset.only(*columns).prefetch_related(*lookups)
+
+    def get_values_plan(self, model, columns=()):
+        """
+        get_sparse_queryset() for the async views, which read plain values:
+        the columns of `model` rendered by this serializer, plus `columns` and
+        the primary key, and the plans of the nested serializers it embeds.
+        """
+        columns = {model._meta.pk.attname, *columns}
+        relations = {}
+        for field in self.fields.values():
+            nested = getattr(field, "child", field)
+            if isinstance(nested, SparseFieldsMixin):
+                relation = model._meta.get_field(field.source)
+                relations[field.source] = nested.get_values_plan(
+                    relation.related_model, [relation.field.attname]
+                )
+            else:
+                columns.add(field.source)
+        return ValuesPlan(sorted(columns), relations)
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset
+
+
+class TaskCommentSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = TaskComment
         fields = ["id", "content", "author_id", "task_id", "created_at"]
@@ -24,25 +144,124 @@ class TaskCommentSerializer(serializers.ModelSerializer):
         return comment
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskListSerializer(serializers.ListSerializer):
+    """
+    Bulk task creation: the projects of all tasks are checked with a single
+    query, and the tasks are inserted with bulk_create() in batches.
+    """
+
+    def validate(self, attrs):
+        project_ids = {item["project_id"] for item in attrs}
+        found = set(
+            Project.objects.filter(id__in=project_ids).values_list("id", flat=True)
+        )
+        missing = sorted(project_ids - found)
+        if missing:
+            raise serializers.ValidationError(
+                {"project_id": [f"Project {pk} does not exist." for pk in missing]}
+            )
+        return attrs
+
+    def create(self, validated_data):
+        tasks = Task.objects.bulk_create(
+            [Task(**item) for item in validated_data],
+            batch_size=settings.BULK_CREATE_BATCH_SIZE,
+        )
+        # bulk_create() sends no signals, so maintain the data versions and
+        # task counters of the projects here.
+        counts = Counter(task.project_id for task in tasks)
+        bump_data_versions(tasks[0].tenant_id, sorted(counts))
+        add_counts(Project, "task_count", counts)
+        return tasks
+
+
+class TaskSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     comments = TaskCommentSerializer(many=True, read_only=True)
+    project_id = serializers.IntegerField()
 
     class Meta:
         model = Task
-        fields = ["id", "name", "project_id", "comments"]
+        fields = ["id", "name", "project_id", "comment_count", "comments"]
+        read_only_fields = ["comment_count"]
+        list_serializer_class = TaskListSerializer
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.prefetch_related("comments")
+
+    def validate(self, attrs):
+        # Bulk creation checks the projects of all tasks at once, in
+        # TaskListSerializer.validate().
+        if isinstance(self.parent, TaskListSerializer):
+            return attrs
+        project_id = attrs.pop("project_id")
+        attrs["project"] = Project.objects.filter(id=project_id).first()
+        if attrs["project"] is None:
+            raise serializers.ValidationError(
+                {"project_id": [f"Project {project_id} does not exist."]}
+            )
+        return attrs
 
     def create(self, validated_data):
         task = Task.objects.create(**validated_data)
         return task
 
 
-class ProjectSerializer(serializers.ModelSerializer):
+class ProjectSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     tasks = TaskSerializer(many=True, read_only=True)
 
     class Meta:
         model = Project
-        fields = ["id", "name", "tenant_id", "tasks"]
+        fields = ["id", "name", "tenant_id", "task_count", "tasks"]
+        read_only_fields = ["task_count"]
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.prefetch_related("tasks__comments")
 
     def create(self, validated_data):
         project = Project.objects.create(**validated_data)
         return project
+
+
+class TenantTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Issue token pairs carrying tenant claims when TENANT_TOKEN_CLAIMS is on."""
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        if settings.TENANT_TOKEN_CLAIMS:
+            add_tenant_claims(token, user)
+        return token
+
+
+class TenantTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Refuse refresh tokens issued before the user's auth version was bumped, and
+    embed the current tenant claims in the new access token.
+    """
+
+    default_error_messages = {
+        **TokenRefreshSerializer.default_error_messages,
+        "stale_token": _("Token is no longer valid, please log in again."),
+    }
+
+    def validate(self, attrs):
+        if not settings.TENANT_TOKEN_CLAIMS:
+            return super().validate(attrs)
+
+        refresh = self.token_class(attrs["refresh"])
+        user = User.objects.filter(
+            **{api_settings.USER_ID_FIELD: refresh.get(api_settings.USER_ID_CLAIM)}
+        ).first()
+        if user is not None and refresh.get(
+            AUTH_VERSION_CLAIM, user.auth_version
+        ) != user.auth_version:
+            raise AuthenticationFailed(self.error_messages["stale_token"], "stale_token")
+
+        data = super().validate(attrs)
+        if user is not None:
+            access = refresh.access_token
+            add_tenant_claims(access, user)
+            data["access"] = str(access)
+        return data
@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models import F, QuerySet
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.models import Project, Task, TaskComment, Tenant, User
+from api.principals import principal_cache
+from api.versioning import bump_data_versions
+
+
+def invalidate_principals(*user_ids):
+    # Drop the entries right away and again once the transaction commits, so a
+    # concurrent request cannot cache the old row in between.
+    principal_cache.delete(*user_ids)
+    transaction.on_commit(lambda: principal_cache.delete(*user_ids))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_principal(sender, instance, **kwargs):
+    invalidate_principals(instance.pk)
+
+
+@receiver(post_save, sender=Tenant)
+def invalidate_tenant_principals(sender, instance, **kwargs):
+    user_ids = list(User.objects.filter(tenant=instance).values_list("id", flat=True))
+    if user_ids:
+        invalidate_principals(*user_ids)
+
+
+def cascaded_from(origin, *models):
+    """Whether a post_delete comes from the deletion of one of `models`."""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return model in models
+
+
+@receiver(post_save, sender=Project)
+def project_saved(sender, instance, **kwargs):
+    bump_data_versions(instance.tenant_id, [instance.pk])
+
+
+@receiver(post_delete, sender=Project)
+def project_deleted(sender, instance, origin=None, **kwargs):
+    if not cascaded_from(origin, Tenant):
+        bump_data_versions(instance.tenant_id)
+
+
+@receiver(post_save, sender=Task)
+def task_saved(sender, instance, created, **kwargs):
+    changes = {"task_count": F("task_count") + 1} if created else {}
+    bump_data_versions(instance.tenant_id, [instance.project_id], **changes)
+
+
+@receiver(post_delete, sender=Task)
+def task_deleted(sender, instance, origin=None, **kwargs):
+    # The counters of deleted parents do not matter, and their own signal
+    # bumps the data versions once for the whole cascade.
+    if cascaded_from(origin, Project, Tenant):
+        return
+    bump_data_versions(
+        instance.tenant_id,
+        [instance.project_id],
+        task_count=Greatest(F("task_count") - 1, 0),
+    )
+
+
+def comment_projects(comment):
+    return Project.objects.filter(tasks=comment.task_id).values("pk")
+
+
+@receiver(post_save, sender=TaskComment)
+def comment_saved(sender, instance, created, **kwargs):
+    bump_data_versions(instance.tenant_id, comment_projects(instance))
+    if created:
+        Task.objects.filter(pk=instance.task_id).update(
+            comment_count=F("comment_count") + 1
+        )
+
+
+@receiver(post_delete, sender=TaskComment)
+def comment_deleted(sender, instance, origin=None, **kwargs):
+    if cascaded_from(origin, Task, Project, Tenant):
+        return
+    bump_data_versions(instance.tenant_id, comment_projects(instance))
+    Task.objects.filter(pk=instance.task_id).update(
+        comment_count=Greatest(F("comment_count") - 1, 0)
+    )
@@ -0,0 +1,110 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connections, transaction
+from django.db.models import Func, TextField, Value
+from django.db.models.functions import Cast, Coalesce
+
+from api.profiling import profile_phase
+from api.routers import get_request_alias, is_read_only
+
+TENANT_SETTING = "app.current_tenant_id"
+
+_current_tenant_id = ContextVar("current_tenant_id", default=None)
+
+
+def get_current_tenant_id():
+    """Tenant the current request is scoped to, or None outside of one."""
+    return _current_tenant_id.get()
+
+
+@contextmanager
+def tenant_scope(tenant_id):
+    """
+    Scope tenant-owned querysets created in the block to `tenant_id`.
+
+    This only adds explicit tenant predicates for the planner; isolation itself
+    is still enforced by the RLS tenant context.
+    """
+    token = _current_tenant_id.set(tenant_id)
+    try:
+        yield
+    finally:
+        _current_tenant_id.reset(token)
+
+
+class SetConfig(Func):
+    function = "set_config"
+    output_field = TextField()
+
+
+def tenant_context_annotations(tenant_id):
+    """
+    Annotations that set the tenant context of the current transaction, and
+    make it READ ONLY when the request is routed as such.
+
+    Selecting them lets a query that is needed anyway, such as the user lookup,
+    also set the context instead of spending separate round trips on it.
+    """
+    annotations = {
+        "tenant_context": SetConfig(
+            Value(TENANT_SETTING),
+            Coalesce(Cast(tenant_id, TextField()), Value("")),
+            Value(True),
+        )
+    }
+    if is_read_only():
+        annotations["read_only"] = SetConfig(
+            Value("transaction_read_only"), Value("on"), Value(True)
+        )
+    return annotations
+
+
+@contextmanager
+def tenant_context(tenant_id, using=None):
+    """
+    Run the block inside a transaction whose RLS tenant context is `tenant_id`.
+
+    The setting is transaction-local, so it is discarded on commit or rollback.
+    A `tenant_id` of None runs the block without any tenant context. The
+    transaction is opened on the database the request is routed to.
+    """
+    using = using or get_request_alias()
+    with transaction.atomic(using=using):
+        set_tenant(tenant_id, using=using)
+        yield
+
+
+def set_tenant(tenant_id, using=None):
+    """
+    Set the tenant context of the transaction already open on the connection.
+    Outside of a transaction the setting would not outlive the statement, so
+    nothing is sent.
+    """
+    connection = connections[using or get_request_alias()]
+    if not connection.in_atomic_block:
+        return
+    with profile_phase("tenant"), connection.cursor() as cursor:
+        cursor.execute(*tenant_context_sql(tenant_id))
+
+
+def tenant_context_sql(tenant_id):
+    """Statement and parameters setting the tenant context of a transaction."""
+    sql = "SELECT set_config(%s, %s, true)"
+    if is_read_only():
+        sql += ", set_config('transaction_read_only', 'on', true)"
+    return sql, [TENANT_SETTING, "" if tenant_id is None else str(tenant_id)]
+
+
+def tenant_context_exempt(view):
+    """
+    Mark a view (function or class) that never reads or writes tenant-owned
+    rows. The tenant middleware runs it without opening a tenant transaction.
+    """
+    view.requires_tenant_context = False
+    return view
+
+
+def requires_tenant_context(view):
+    view_class = getattr(view, "view_class", None)
+    return getattr(view_class or view, "requires_tenant_context", True)
@@ -1,7 +1,47 @@
 import pytest
+from django.db import connection, connections
 from mixer.backend.django import mixer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
 
+from api.admission import admission_control
 from api.models import Tenant, User
+from api.principals import principal_cache
+from api.responsecache import response_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_principal_cache():
+    principal_cache.clear()
+    yield
+    principal_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_response_cache():
+    response_cache.clear()
+    yield
+    response_cache.clear()
+
+
+@pytest.fixture(autouse=True)
+def clear_admission_control():
+    admission_control.clear()
+    yield
+    admission_control.clear()
+
+
+@pytest.fixture
+def async_pool(monkeypatch):
+    """
+    Configure the connection pool the async views take connections from. The
+    connection of the test keeps its settings, so it stays out of the pool.
+    """
+    settings_dict = connections.settings["default"]
+    options = {**settings_dict["OPTIONS"], "pool": {"max_size": 4}}
+    monkeypatch.setitem(
+        connections.settings, "default", {**settings_dict, "OPTIONS": options}
+    )
 
 
 @pytest.fixture
@@ -74,3 +114,20 @@ def default_tenant(tenant_and_owner):
 @pytest.fixture
 def default_task(default_user):
     return mixer.blend("api.Task", title="Default Task", created_by=default_user)
+
+
+@pytest.fixture
+def tenant_context(default_tenant):
+    """Set the RLS tenant context for the rest of the test transaction."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SET LOCAL app.current_tenant_id = %s", [str(default_tenant.id)]
+        )
+    return default_tenant
+
+
+@pytest.fixture
+def owner_client(owner_user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(owner_user)}")
+    return client
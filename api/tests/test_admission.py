@@ -0,0 +1,233 @@
+from types import SimpleNamespace
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.cache.backends import base as cache_base
+from django.core.cache.backends import locmem
+from django.test import AsyncClient
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import admission
+from api.admission import (
+    CONCURRENCY,
+    RATE,
+    AdmissionControl,
+    Rejection,
+    admission_control,
+)
+from api.models import Tenant
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = SimpleNamespace(now=1_700_000_000 * 10**9)
+    monkeypatch.setattr(admission, "time", SimpleNamespace(time_ns=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture
+def control():
+    control = AdmissionControl(rate=10, burst=3, max_concurrent=2, backend="admission")
+    yield control
+    control.clear()
+
+
+@pytest.fixture
+def limited(monkeypatch):
+    monkeypatch.setattr(admission_control, "rate", 1)
+    monkeypatch.setattr(admission_control, "burst", 2)
+    return admission_control
+
+
+@pytest.fixture
+def other_client(another_user):
+    tenant = Tenant(name="Other")
+    tenant.save(owner=another_user)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(another_user)}")
+    return client
+
+
+class TestTokenBucket:
+    def test_bursts_then_admits_at_the_rate(self, control, clock):
+        for _ in range(3):
+            assert control.acquire("a") is None
+            control.release("a")
+
+        assert control.acquire("a") == Rejection(RATE, 0.1)
+        clock.now += 100_000_000
+        assert control.acquire("a") is None
+        control.release("a")
+        assert control.acquire("a").reason == RATE
+
+    def test_rejected_requests_do_not_push_back_the_bucket(self, control, clock):
+        for _ in range(3):
+            control.acquire("a")
+            control.release("a")
+        for _ in range(10):
+            assert control.acquire("a").retry_after == 0.1
+
+        clock.now += 100_000_000
+        assert control.acquire("a") is None
+
+    def test_idle_bucket_refills_up_to_the_burst(self, control, clock):
+        control.acquire("a")
+        control.release("a")
+        clock.now += 3600 * 10**9
+
+        for _ in range(3):
+            assert control.acquire("a") is None
+            control.release("a")
+        assert control.acquire("a").reason == RATE
+
+    def test_tenants_have_their_own_buckets(self, control, clock):
+        for _ in range(3):
+            control.acquire("a")
+            control.release("a")
+
+        assert control.acquire("a").reason == RATE
+        assert control.acquire("b") is None
+        assert control.stats()["rejected"] == {"a": {RATE: 1, CONCURRENCY: 0}}
+        assert control.stats()["admitted"] == 4
+
+
+class TestConcurrencyCap:
+    def test_slots_are_held_until_released(self, control, clock):
+        control.rate = 0
+        with control.admit("a") as first, control.admit("a") as second:
+            assert first is second is None
+            with control.admit("a") as third:
+                assert third == Rejection(CONCURRENCY, 1)
+
+        with control.admit("a") as rejection:
+            assert rejection is None
+
+    def test_rejection_returns_the_token(self, control, clock):
+        control.max_concurrent = 1
+        with control.admit("a"):
+            for _ in range(5):
+                assert control.acquire("a").reason == CONCURRENCY
+        for _ in range(2):
+            assert control.acquire("a") is None
+            control.release("a")
+        assert control.acquire("a").reason == RATE
+
+    def test_release_survives_expired_slots(self, control):
+        assert control.acquire("a") is None
+        control.cache.delete(control.get_key("a", "inflight"))
+
+        control.release("a")
+
+    def test_requests_keep_the_slots_from_expiring(self, control, monkeypatch):
+        cache_clock = SimpleNamespace(time=lambda: 1_700_000_000.0)
+        monkeypatch.setattr(locmem, "time", cache_clock)
+        monkeypatch.setattr(cache_base, "time", cache_clock)
+        control.rate = 0
+        control.max_concurrent = 1
+        assert control.acquire("a") is None
+
+        for _ in range(3):
+            cache_clock.time = lambda now=cache_clock.time(): now + 200
+            assert control.acquire("a") == Rejection(CONCURRENCY, 1)
+
+    def test_releases_after_expiry_do_not_free_other_slots(self, control):
+        control.rate = 0
+        assert control.acquire("a") is None
+        assert control.acquire("a") is None
+        control.cache.delete(control.get_key("a", "inflight"))
+        assert control.acquire("a") is None
+
+        for _ in range(3):
+            control.release("a")
+
+        assert control.cache.get(control.get_key("a", "inflight")) == 0
+        assert control.acquire("a") is None
+        assert control.acquire("a") is None
+        assert control.acquire("a") == Rejection(CONCURRENCY, 1)
+
+
+class TestAdmissionMiddleware:
+    def test_requests_over_the_rate_get_429(self, owner_client, default_tenant, limited):
+        for _ in range(2):
+            assert owner_client.get("/api/projects/").status_code == 200
+
+        response = owner_client.get("/api/projects/")
+
+        assert response.status_code == 429
+        assert response["Retry-After"] == "1"
+        assert response.json() == {
+            "detail": "Request was throttled. Expected available in 1 seconds."
+        }
+        assert limited.stats()["rejected"] == {
+            str(default_tenant.id): {RATE: 1, CONCURRENCY: 0}
+        }
+
+    def test_other_tenants_are_admitted(self, owner_client, other_client, limited):
+        for _ in range(3):
+            owner_client.get("/api/projects/")
+
+        assert other_client.get("/api/projects/").status_code == 200
+
+    def test_requests_in_flight_count_against_the_cap(
+        self, owner_client, default_tenant, monkeypatch
+    ):
+        monkeypatch.setattr(admission_control, "max_concurrent", 1)
+
+        with admission_control.admit(default_tenant.id):
+            response = owner_client.get("/api/projects/")
+        assert response.status_code == 429
+        assert response["Retry-After"] == "1"
+
+        assert owner_client.get("/api/projects/").status_code == 200
+
+    def test_streams_hold_their_slot_until_closed(self, owner_client, monkeypatch):
+        monkeypatch.setattr(admission_control, "max_concurrent", 1)
+
+        response = owner_client.get("/api/tasks/?stream=ndjson")
+        assert response.status_code == 200
+        assert owner_client.get("/api/projects/").status_code == 429
+
+        b"".join(response.streaming_content)
+        assert owner_client.get("/api/projects/").status_code == 200
+
+    def test_views_without_tenant_context_are_not_limited(self, owner_user, limited):
+        for _ in range(3):
+            response = APIClient().post(
+                "/api/token/",
+                {"username": owner_user.username, "password": "ownerpass123"},
+            )
+            assert response.status_code == 200
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_views_are_limited(owner_user, default_tenant, limited, async_pool):
+    headers = {"Authorization": f"Bearer {AccessToken.for_user(owner_user)}"}
+    get = async_to_sync(AsyncClient().get)
+    statuses = [
+        get("/api/async/projects/", headers=headers).status_code for _ in range(3)
+    ]
+
+    assert statuses == [200, 200, 429]
+
+
+async def consume(response):
+    return b"".join([chunk async for chunk in response.streaming_content])
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_streams_hold_their_slot_until_closed(
+    owner_user, default_tenant, monkeypatch, async_pool
+):
+    monkeypatch.setattr(admission_control, "max_concurrent", 1)
+    headers = {"Authorization": f"Bearer {AccessToken.for_user(owner_user)}"}
+    get = async_to_sync(AsyncClient().get)
+
+    response = get("/api/async/tasks/?stream=ndjson", headers=headers)
+    assert response.status_code == 200
+    assert get("/api/async/projects/", headers=headers).status_code == 429
+
+    async_to_sync(consume)(response)
+    assert get("/api/async/projects/", headers=headers).status_code == 200
@@ -0,0 +1,285 @@
+import json
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, connections
+from django.test import AsyncClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.asyncdb import (
+    ValuesPlan,
+    afetch,
+    afetch_rows,
+    async_atomic,
+    async_tenant_context,
+    close_async_pools,
+    get_async_connection,
+    get_async_pool,
+)
+from api.models import Project, Task, TaskComment, Tenant, User
+from api.principals import principal_cache
+from api.routers import request_routing
+from api.serializers import ProjectSerializer
+from api.tenancy import tenant_context, tenant_context_sql
+
+# The async views query on their own connections, which cannot see the test
+# transaction, so every test here commits its data.
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture(autouse=True)
+def use_async_pool(async_pool):
+    pass
+
+
+class AuthenticatedAsyncClient(AsyncClient):
+    def __init__(self, user=None, token=None):
+        super().__init__()
+        self.token = token or (user and str(AccessToken.for_user(user)))
+
+    def generic(self, *args, headers=None, **kwargs):
+        if self.token:
+            headers = {"Authorization": f"Bearer {self.token}", **(headers or {})}
+        return super().generic(*args, headers=headers, **kwargs)
+
+
+def async_client(user):
+    return AuthenticatedAsyncClient(user)
+
+
+def async_get(client, path, **kwargs):
+    return async_to_sync(client.get)(path, **kwargs)
+
+
+async def read_streaming(response):
+    return b"".join([chunk async for chunk in response.streaming_content])
+
+
+@pytest.fixture
+def project_tree(default_tenant, owner_user):
+    with tenant_context(default_tenant.id):
+        project = Project.objects.create(tenant=default_tenant, name="Async")
+        for number in range(3):
+            task = Task.objects.create(
+                tenant=default_tenant, project=project, name=f"Task {number}"
+            )
+            TaskComment.objects.create(
+                tenant=default_tenant, task=task, author=owner_user, content="Hi"
+            )
+    return project
+
+
+@pytestmark
+class TestAsyncReadViews:
+    def test_project_list_matches_the_sync_view(
+        self, owner_user, owner_client, project_tree
+    ):
+        response = async_get(async_client(owner_user), "/api/async/projects/")
+
+        assert response.status_code == 200
+        assert response.json() == owner_client.get("/api/projects/").json()
+        assert len(response.json()["results"][0]["tasks"]) == 3
+
+    def test_detail_views_match_the_sync_views(
+        self, owner_user, owner_client, project_tree
+    ):
+        client = async_client(owner_user)
+        with tenant_context(project_tree.tenant_id):
+            task = project_tree.tasks.first()
+
+        for path in (
+            f"/api/projects/{project_tree.id}/",
+            f"/api/tasks/{task.id}/",
+            f"/api/tasks/{task.id}/comments/",
+            "/api/tasks/?page_size=2",
+        ):
+            response = async_get(client, path.replace("/api/", "/api/async/"))
+            expected = owner_client.get(path).json()
+            if "next" in expected and expected["next"]:
+                expected["next"] = expected["next"].replace("/api/", "/api/async/")
+            assert response.json() == expected
+
+    def test_sparse_fieldsets_match_the_sync_views(
+        self, owner_user, owner_client, project_tree
+    ):
+        client = async_client(owner_user)
+
+        for path in (
+            "/api/projects/?fields=id,name",
+            "/api/projects/?fields=name,tasks.name&expand=tasks.comments",
+            "/api/tasks/?expand=comments&fields=id",
+        ):
+            response = async_get(client, path.replace("/api/", "/api/async/"))
+            assert response.json() == owner_client.get(path).json()
+
+        response = async_get(client, "/api/async/projects/?fields=nope")
+        assert response.status_code == 400
+
+    def test_missing_objects_are_not_found(self, owner_user, default_tenant):
+        client = async_client(owner_user)
+
+        response = async_get(client, "/api/async/projects/999999/")
+        assert response.status_code == 404
+        assert response.json() == {"detail": "No Project matches the given query."}
+        assert async_get(client, "/api/async/tasks/999999/comments/").status_code == 404
+
+    def test_other_tenants_rows_are_invisible(self, project_tree):
+        owner = User.objects.create_user(username="asyncother", password="pass12345")
+        Tenant(name="Async Other").save(owner=owner)
+
+        response = async_get(async_client(owner), "/api/async/projects/")
+
+        assert response.json()["results"] == []
+        assert async_get(
+            async_client(owner), f"/api/async/projects/{project_tree.id}/"
+        ).status_code == 404
+
+    def test_authentication_is_required(self):
+        response = async_get(AsyncClient(), "/api/async/projects/")
+
+        assert response.status_code == 401
+        assert response["WWW-Authenticate"] == 'Bearer realm="api"'
+
+    def test_invalid_tokens_are_rejected(self):
+        client = AuthenticatedAsyncClient(token="not-a-token")
+
+        response = async_get(client, "/api/async/projects/")
+
+        assert response.status_code == 401
+        assert response.json()["code"] == "token_not_valid"
+
+    def test_writes_are_not_allowed(self, owner_user, default_tenant):
+        response = async_to_sync(async_client(owner_user).post)(
+            "/api/async/projects/", {"name": "Nope"}
+        )
+
+        assert response.status_code == 405
+
+    def test_cached_principal_is_reused(self, owner_user, project_tree):
+        client = async_client(owner_user)
+        async_get(client, "/api/async/projects/")
+
+        response = async_get(client, "/api/async/projects/")
+
+        assert response.status_code == 200
+        assert principal_cache.stats()["hits"] == 1
+
+    def test_async_views_also_work_under_wsgi(self, owner_client, project_tree):
+        response = owner_client.get("/api/async/projects/")
+
+        assert response.status_code == 200
+        assert response.json()["results"][0]["name"] == "Async"
+
+    def test_streams_match_the_sync_view(self, owner_user, owner_client, project_tree):
+        async def stream():
+            response = await async_client(owner_user).get(
+                "/api/async/tasks/?stream=ndjson"
+            )
+            return await read_streaming(response)
+
+        expected = b"".join(owner_client.get("/api/tasks/?stream=ndjson"))
+
+        assert async_to_sync(stream)() == expected
+        assert len(expected.splitlines()) == 3
+
+
+@pytestmark
+class TestAsyncQueries:
+    def fetch(self, tenant_id, fetch):
+        async def run():
+            async with async_tenant_context(tenant_id):
+                return await fetch()
+
+        return async_to_sync(run)()
+
+    def test_rows_match_the_orm(self, project_tree):
+        comments = TaskComment.objects.order_by("id").values(
+            "id", "task_id", "author_id", "content", "created_at"
+        )
+
+        rows = self.fetch(project_tree.tenant_id, lambda: afetch_rows(comments))
+
+        with tenant_context(project_tree.tenant_id):
+            assert rows == list(comments)
+
+    def test_trees_render_like_prefetched_instances(self, project_tree):
+        plan = ProjectSerializer().get_values_plan(Project)
+
+        rows = self.fetch(
+            project_tree.tenant_id, lambda: afetch(Project.objects.all(), plan)
+        )
+
+        with tenant_context(project_tree.tenant_id):
+            projects = Project.objects.prefetch_related("tasks__comments")
+            expected = ProjectSerializer(projects, many=True).data
+        assert ProjectSerializer(rows, many=True).data == expected
+
+
+@pytestmark
+class TestAsyncMiddleware:
+    def test_sync_views_keep_working_under_asgi(self, owner_user, default_tenant):
+        client = async_client(owner_user)
+
+        response = async_to_sync(client.post)(
+            "/api/projects/", {"name": "Via ASGI"}, content_type="application/json"
+        )
+        assert response.status_code == 201
+
+        response = async_get(client, "/api/projects/")
+        assert [project["name"] for project in response.json()["results"]] == [
+            "Via ASGI"
+        ]
+
+    def test_async_transactions_are_read_only(self, owner_user, project_tree):
+        async def read_only_setting():
+            with request_routing("default", read_only=True):
+                async with async_atomic():
+                    connection = get_async_connection()
+                    await connection.execute(*tenant_context_sql(None))
+                    cursor = await connection.execute("SHOW transaction_read_only")
+                    return (await cursor.fetchone())[0]
+
+        assert async_to_sync(read_only_setting)() == "on"
+
+    def test_a_pool_is_required(self, monkeypatch):
+        monkeypatch.delitem(connections.settings["default"]["OPTIONS"], "pool")
+
+        async def open_transaction():
+            async with async_atomic():
+                pass
+
+        with pytest.raises(ImproperlyConfigured, match="connection pool"):
+            async_to_sync(open_transaction)()
+
+    def test_pooled_connections_are_reused_without_context(
+        self, monkeypatch, default_tenant, project_tree
+    ):
+        pytest.importorskip("psycopg_pool")
+        monkeypatch.setitem(
+            connections.settings["default"]["OPTIONS"],
+            "pool",
+            {"min_size": 1, "max_size": 1},
+        )
+
+        plan = ValuesPlan(["id", "name"], {})
+
+        async def query_twice():
+            try:
+                async with async_tenant_context(default_tenant.id):
+                    projects = await afetch(Project.objects.all(), plan)
+                async with async_atomic() as conn:
+                    cursor = await conn.execute(
+                        "SELECT current_setting('app.current_tenant_id', true)"
+                    )
+                    leftover = (await cursor.fetchone())[0]
+                stats = (await get_async_pool("default")).get_stats()
+                return projects, leftover, stats
+            finally:
+                await close_async_pools()
+
+        projects, leftover, stats = async_to_sync(query_twice)()
+
+        assert [project["name"] for project in projects] == ["Async"]
+        assert not leftover
+        assert stats["connections_num"] == 1
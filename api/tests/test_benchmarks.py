@@ -0,0 +1,121 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from api.benchmarks import percentile, summarize
+from api.datasets import get_tenant_sizes
+from api.models import Project, Task, TaskComment, Tenant, User
+from api.tenancy import tenant_context
+
+
+def test_tenant_sizes_are_skewed():
+    sizes = get_tenant_sizes(10, 20, skew=1.0)
+
+    assert sizes == sorted(sizes, reverse=True)
+    assert sizes[0] > 3 * sizes[4]
+    assert sum(sizes) == pytest.approx(200, abs=10)
+    assert get_tenant_sizes(4, 5, skew=0) == [5, 5, 5, 5]
+    assert get_tenant_sizes(3, 1, skew=5)[-1] == 1
+
+
+def test_summary_percentiles():
+    samples = [(number / 1000, 200, 4) for number in range(1, 101)]
+    samples[-1] = (0.1, 500, 6)
+
+    summary = summarize("project_list", 8, samples, elapsed=2.0)
+
+    assert percentile([1, 2, 3], 50) == 2
+    assert summary["latency_ms"] == {
+        "mean": 50.5,
+        "p50": 50.0,
+        "p95": 95.0,
+        "p99": 99.0,
+        "max": 100.0,
+    }
+    assert summary["throughput"] == 50.0
+    assert summary["statuses"] == {"200": 99, "500": 1}
+    assert summary["errors"] == 1
+    assert summary["queries_per_request"] == {"mean": 4.02, "max": 6}
+
+
+@pytest.mark.django_db(transaction=True)
+class TestGenerateDataset:
+    def test_generates_tenants_of_skewed_sizes(self):
+        stdout = StringIO()
+
+        call_command(
+            "generate_dataset",
+            tenants=3,
+            projects=4,
+            tasks=2,
+            comments=3,
+            seed=0.5,
+            batch_size=2,
+            stdout=stdout,
+        )
+
+        assert "Generated 3 tenants" in stdout.getvalue()
+        sizes = []
+        for index, tenant in enumerate(Tenant.objects.order_by("name")):
+            owner = User.objects.get(username=f"bench-owner-{index}")
+            assert owner.tenant_id == tenant.id and owner.role == "owner"
+            assert owner.check_password("benchpass123")
+            with tenant_context(tenant.id):
+                projects = list(Project.objects.all())
+                sizes.append(len(projects))
+                assert {project.task_count for project in projects} == {2}
+                assert Task.objects.count() == 2 * len(projects)
+                assert set(Task.objects.values_list("comment_count", flat=True)) == {3}
+                assert TaskComment.objects.count() == 6 * len(projects)
+        assert sizes == get_tenant_sizes(3, 4, skew=1.0)
+
+    def test_refuses_existing_prefix(self):
+        call_command("generate_dataset", tenants=1, projects=1, tasks=0, comments=0)
+
+        with pytest.raises(CommandError):
+            call_command("generate_dataset", tenants=1, projects=1)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_benchmark_report(live_server, tmp_path):
+    call_command(
+        "generate_dataset",
+        tenants=2,
+        projects=2,
+        tasks=2,
+        comments=2,
+        stdout=StringIO(),
+    )
+    output = tmp_path / "report.json"
+
+    call_command(
+        "run_benchmark",
+        live_server.url,
+        scenario=["token_obtain", "project_list", "task_comments"],
+        concurrency="1,2",
+        requests=4,
+        users=2,
+        output=str(output),
+        stderr=StringIO(),
+    )
+
+    report = json.loads(output.read_text())
+    assert report["parameters"]["concurrency"] == [1, 2]
+    results = {(r["scenario"], r["concurrency"]): r for r in report["results"]}
+    assert set(results) == {
+        (scenario, level)
+        for scenario in ("token_obtain", "project_list", "task_comments")
+        for level in (1, 2)
+    }
+    for result in results.values():
+        assert result["requests"] == 4
+        assert result["errors"] == 0
+        assert result["latency_ms"]["p50"] <= result["latency_ms"]["p99"]
+        assert result["throughput"] > 0
+
+
+def test_benchmark_of_unreachable_server():
+    with pytest.raises(CommandError):
+        call_command("run_benchmark", "http://127.0.0.1:9", users=1)
@@ -0,0 +1,166 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.ingestion import ingest_comments
+from api.models import Project, Task, TaskComment
+
+pytestmark = pytest.mark.django_db
+
+
+def counts(project):
+    project = Project.objects.get(pk=project.pk)
+    return project.task_count, {
+        task.name: task.comment_count for task in project.tasks.order_by("id")
+    }
+
+
+@pytest.fixture
+def project(tenant_context):
+    return Project.objects.create(tenant=tenant_context, name="Counted")
+
+
+def add_task(project, name="Task", comments=0, author=None):
+    task = Task.objects.create(tenant=project.tenant, project=project, name=name)
+    for number in range(comments):
+        TaskComment.objects.create(
+            tenant=project.tenant, task=task, author=author, content=str(number)
+        )
+    return task
+
+
+@pytestmark
+class TestCounters:
+    def test_creates_and_deletes_are_counted(self, project, owner_user):
+        first = add_task(project, "First", comments=2, author=owner_user)
+        add_task(project, "Second", comments=1)
+        assert counts(project) == (2, {"First": 2, "Second": 1})
+
+        first.comments.first().delete()
+        assert counts(project) == (2, {"First": 1, "Second": 1})
+
+        first.delete()
+        assert counts(project) == (1, {"Second": 1})
+
+    def test_saving_loaded_instances_keeps_the_counters(self, project, owner_user):
+        task = add_task(project, "First", comments=2, author=owner_user)
+        add_task(project, "Second")
+
+        # Both instances were loaded before their counters were updated.
+        project.name = "Renamed"
+        project.save()
+        task.name = "Renamed"
+        task.save()
+
+        assert counts(project) == (2, {"Renamed": 2, "Second": 0})
+
+    def test_cascades_do_not_update_rows_being_deleted(self, project):
+        task = add_task(project, comments=20)
+
+        with CaptureQueriesContext(connection) as context:
+            task.delete()
+
+        updates = [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith("UPDATE")
+        ]
+        assert len(updates) == 2
+        assert counts(project) == (0, {})
+
+    def test_bulk_created_tasks_are_counted(self, owner_client, project):
+        other = Project.objects.create(tenant=project.tenant, name="Other")
+
+        response = owner_client.post(
+            "/api/tasks/",
+            [
+                {"name": "A", "project_id": project.id},
+                {"name": "B", "project_id": project.id},
+                {"name": "C", "project_id": other.id},
+            ],
+            format="json",
+        )
+
+        assert response.status_code == 201
+        assert counts(project)[0] == 2
+        assert counts(other)[0] == 1
+
+    def test_ingested_comments_are_counted(self, project):
+        first, second = add_task(project, "First"), add_task(project, "Second")
+        lines = [
+            json.dumps({"task_id": task.id, "content": "Imported"}) + "\n"
+            for task in (first, first, second)
+        ]
+
+        report = ingest_comments(lines, project.tenant_id)
+
+        assert report.inserted == 3
+        assert counts(project) == (2, {"First": 2, "Second": 1})
+
+
+@pytestmark
+class TestCounterFields:
+    def test_counters_are_read_without_counting(self, owner_client, project):
+        add_task(project, comments=3)
+
+        with CaptureQueriesContext(connection) as context:
+            response = owner_client.get("/api/projects/?fields=name,task_count")
+
+        assert response.json()["results"] == [{"name": "Counted", "task_count": 1}]
+        assert not any(
+            "COUNT(" in query["sql"].upper() or '"api_task"' in query["sql"]
+            for query in context.captured_queries
+        )
+
+    def test_counters_are_read_only(self, owner_client, project):
+        response = owner_client.post(
+            "/api/tasks/",
+            {"name": "Forged", "project_id": project.id, "comment_count": 99},
+            format="json",
+        )
+
+        assert response.status_code == 201
+        assert Task.objects.get(pk=response.data["id"]).comment_count == 0
+
+    def test_task_list_exposes_comment_counts(self, owner_client, project):
+        add_task(project, comments=2)
+
+        response = owner_client.get("/api/tasks/?fields=name,comment_count")
+
+        assert response.json()["results"] == [{"name": "Task", "comment_count": 2}]
+
+
+@pytestmark
+class TestReconcileCounters:
+    def test_drift_is_fixed(self, project):
+        task = add_task(project, comments=2)
+        untouched = Project.objects.create(tenant=project.tenant, name="Fine")
+        version = Project.objects.get(pk=project.pk).data_version
+        # update() sends no signals, like a crash between two statements would.
+        Project.objects.filter(pk=project.pk).update(task_count=7)
+        Task.objects.filter(pk=task.pk).update(comment_count=0)
+        stdout = StringIO()
+
+        call_command("reconcile_counters", tenant=str(project.tenant_id), stdout=stdout)
+
+        assert counts(project) == (1, {"Task": 2})
+        assert "Fixed the counters of 1 projects and 1 tasks." in stdout.getvalue()
+        assert Project.objects.get(pk=project.pk).data_version == version + 1
+        assert Project.objects.get(pk=untouched.pk).data_version == 1
+
+    def test_all_tenants_by_default(self, project):
+        Project.objects.filter(pk=project.pk).update(task_count=3)
+        stdout = StringIO()
+
+        call_command("reconcile_counters", stdout=stdout)
+
+        assert counts(project)[0] == 0
+        assert f"{project.tenant_id}: fixed 1 projects and 0 tasks" in stdout.getvalue()
+
+    def test_unknown_tenant(self):
+        with pytest.raises(CommandError):
+            call_command("reconcile_counters", tenant="not-a-uuid")
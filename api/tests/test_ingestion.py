@@ -0,0 +1,223 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.ingestion import ingest_comments
+from api.models import Project, Task, TaskComment, Tenant
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def task(tenant_context):
+    project = Project.objects.create(tenant=tenant_context, name="Legacy")
+    return Task.objects.create(tenant=tenant_context, project=project, name="Import")
+
+
+@pytest.fixture
+def foreign_task(another_user, tenant_context):
+    other = Tenant(name="Other")
+    other.save(owner=another_user)
+    with connection.cursor() as cursor:
+        cursor.execute("SET LOCAL app.current_tenant_id = %s", [str(other.id)])
+    project = Project.objects.create(tenant=other, name="Foreign")
+    foreign = Task.objects.create(tenant=other, project=project, name="Foreign")
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SET LOCAL app.current_tenant_id = %s", [str(tenant_context.id)]
+        )
+    return foreign
+
+
+def ndjson(*records):
+    return [json.dumps(record) + "\n" for record in records]
+
+
+@pytestmark
+class TestIngestComments:
+    def test_valid_rows_are_copied_in(self, task, owner_user):
+        lines = ndjson(
+            {"task_id": task.id, "content": "First", "author_id": owner_user.id},
+            {
+                "task_id": task.id,
+                "content": "Second",
+                "created_at": "2020-01-02T03:04:05Z",
+            },
+        )
+
+        report = ingest_comments(lines, task.tenant_id)
+
+        assert (report.received, report.inserted, report.rejected) == (2, 2, 0)
+        comments = TaskComment.objects.order_by("id")
+        assert [comment.content for comment in comments] == ["First", "Second"]
+        assert comments[0].author_id == owner_user.id
+        assert comments[1].created_at.year == 2020
+        assert report.as_dict()["rows_per_second"] > 0
+
+    def test_invalid_rows_are_reported_per_line(self, task, foreign_task, admin_user):
+        lines = [
+            "not json\n",
+            *ndjson({"content": "No task"}),
+            "\n",
+            *ndjson(
+                {"task_id": task.id, "content": ""},
+                {"task_id": task.id, "content": "Bad", "created_at": "yesterday"},
+                {"task_id": foreign_task.id, "content": "Other tenant"},
+                {"task_id": task.id, "content": "Stranger", "author_id": 999999},
+                {"task_id": task.id, "content": "Kept"},
+            ),
+        ]
+
+        report = ingest_comments(lines, task.tenant_id)
+
+        assert report.inserted == 1
+        assert report.rejects == [
+            {"line": 1, "error": report.rejects[0]["error"]},
+            {"line": 2, "error": "task_id is required"},
+            {"line": 4, "error": "content is required"},
+            {"line": 5, "error": "created_at must be an ISO 8601 datetime"},
+            {"line": 6, "error": "unknown task"},
+            {"line": 7, "error": "unknown author"},
+        ]
+        assert report.rejects[0]["error"].startswith("invalid JSON")
+        assert list(TaskComment.objects.values_list("content", flat=True)) == ["Kept"]
+
+    def test_values_out_of_column_range_are_rejected_per_row(self, task):
+        lines = ndjson(
+            {"task_id": 2**63, "content": "Huge task"},
+            {"task_id": task.id, "content": "Huge author", "author_id": -(2**64)},
+            {"task_id": task.id, "content": "Nul \x00 byte"},
+            {"task_id": task.id, "content": "Kept"},
+        )
+
+        report = ingest_comments(lines, task.tenant_id)
+
+        assert report.inserted == 1
+        assert report.rejects == [
+            {"line": 1, "error": "task_id is out of range"},
+            {"line": 2, "error": "author_id is out of range"},
+            {"line": 3, "error": "content must not contain NUL characters"},
+        ]
+        assert list(TaskComment.objects.values_list("content", flat=True)) == ["Kept"]
+
+    def test_csv_input(self, task):
+        lines = ["task_id,content,author_id\n", f'{task.id},"Hello, CSV",\n']
+
+        report = ingest_comments(lines, task.tenant_id, input_format="csv")
+
+        assert report.inserted == 1
+        assert TaskComment.objects.get().content == "Hello, CSV"
+
+    def test_rows_are_copied_in_batches(self, task):
+        lines = ndjson(*({"task_id": task.id, "content": str(n)} for n in range(5)))
+
+        with CaptureQueriesContext(connection) as context:
+            report = ingest_comments(lines, task.tenant_id, batch_size=2)
+
+        assert report.inserted == 5
+        inserts = [
+            query
+            for query in context.captured_queries
+            if "INSERT INTO api_taskcomment" in query["sql"]
+        ]
+        assert len(inserts) == 3
+
+    def test_rls_rejects_rows_of_another_tenant(self, task, another_user):
+        other = Tenant(name="Intruder")
+        other.save(owner=another_user)
+
+        report = ingest_comments(
+            ndjson({"task_id": task.id, "content": "Cross-tenant"}), other.id
+        )
+
+        assert report.inserted == 0
+        assert report.rejects == [{"line": 1, "error": "unknown task"}]
+
+
+@pytestmark
+class TestCommentIngestView:
+    def test_ndjson_upload(self, owner_client, task):
+        response = owner_client.generic(
+            "POST",
+            "/api/comments/ingest/",
+            "".join(ndjson({"task_id": task.id, "content": "Uploaded"}, {})),
+            content_type="application/x-ndjson",
+        )
+
+        assert response.status_code == 200
+        assert response.data["inserted"] == 1
+        assert response.data["rejects"] == [{"line": 2, "error": "task_id is required"}]
+
+    def test_csv_upload(self, owner_client, task):
+        response = owner_client.generic(
+            "POST",
+            "/api/comments/ingest/",
+            f"task_id,content\n{task.id},From CSV\n",
+            content_type="text/csv; charset=utf-8",
+        )
+
+        assert response.data["inserted"] == 1
+
+    def test_unsupported_content_type(self, owner_client, task):
+        response = owner_client.post(
+            "/api/comments/ingest/", data=[], format="json"
+        )
+
+        assert response.status_code == 415
+
+    def test_users_without_tenant_are_forbidden(self, default_user):
+        client = APIClient()
+        client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(default_user)}"
+        )
+
+        response = client.generic(
+            "POST",
+            "/api/comments/ingest/",
+            "".join(ndjson({"task_id": 1, "content": "Tenantless"})),
+            content_type="application/x-ndjson",
+        )
+
+        assert response.status_code == 403
+
+    def test_invalid_encoding_ingests_nothing(self, owner_client, task):
+        body = "".join(ndjson({"task_id": task.id, "content": "Fine"})).encode()
+        response = owner_client.generic(
+            "POST",
+            "/api/comments/ingest/",
+            body + b"\xff\xfe\n",
+            content_type="application/x-ndjson",
+        )
+
+        assert response.status_code == 400
+        assert TaskComment.objects.count() == 0
+
+
+@pytestmark
+class TestIngestCommentsCommand:
+    def test_ingests_a_file(self, tmp_path, task):
+        path = tmp_path / "comments.csv"
+        path.write_text(f"task_id,content\n{task.id},From file\n{task.id},\n")
+        stdout, stderr = StringIO(), StringIO()
+
+        call_command(
+            "ingest_comments",
+            str(path),
+            tenant=str(task.tenant_id),
+            stdout=stdout,
+            stderr=stderr,
+        )
+
+        assert "Inserted 1 of 2 comments (1 rejected)" in stdout.getvalue()
+        assert "line 3: content is required" in stderr.getvalue()
+        assert TaskComment.objects.get().content == "From file"
+
+    def test_unknown_tenant(self, tmp_path):
+        with pytest.raises(CommandError):
+            call_command("ingest_comments", "-", tenant="not-a-uuid")
@@ -0,0 +1,206 @@
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+
+import pytest
+from rest_framework.test import APIClient
+
+from api.admission import admission_control
+from api.metrics import (
+    ADMISSION_REQUESTS,
+    CACHE_REQUESTS,
+    POOL_CONNECTIONS,
+    REQUEST_DURATION,
+    REQUEST_QUERIES,
+    MetricsRegistry,
+    metrics_registry,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def metrics(settings):
+    settings.METRICS = {**settings.METRICS, "ENABLED": True}
+    metrics_registry.clear()
+    yield metrics_registry
+    metrics_registry.clear()
+
+
+def get_sample(text, name, **labels):
+    """Value of the sample `name` with exactly `labels`, or None."""
+    for line in text.splitlines():
+        match = re.fullmatch(r"(\w+)(?:\{(.*)\})? (\S+)", line)
+        if match and match.group(1) == name:
+            found = dict(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match.group(2) or ""))
+            if found == labels:
+                return float(match.group(3))
+    return None
+
+
+def count_in_child(directory):
+    registry = MetricsRegistry(directory=directory)
+    registry.inc(CACHE_REQUESTS, 2, cache="principal", result="hit")
+    registry.observe(REQUEST_QUERIES, 3, view="task_detail")
+    registry.flush()
+
+
+class TestMetricsRegistry:
+    def test_histograms(self):
+        registry = MetricsRegistry()
+        for duration in (0.003, 0.005, 0.2, 30):
+            registry.observe(REQUEST_DURATION, duration, view="search", status="200")
+
+        text = registry.render()
+
+        labels = {"view": "search", "status": "200"}
+        assert "# TYPE gosync_http_request_duration_seconds histogram" in text
+        bucket = f"{REQUEST_DURATION}_bucket"
+        assert get_sample(text, bucket, le="0.005", **labels) == 2
+        assert get_sample(text, bucket, le="0.1", **labels) == 2
+        assert get_sample(text, bucket, le="0.25", **labels) == 3
+        assert get_sample(text, bucket, le="+Inf", **labels) == 4
+        assert get_sample(text, f"{REQUEST_DURATION}_count", **labels) == 4
+        assert get_sample(text, f"{REQUEST_DURATION}_sum", **labels) == 30.208
+
+    def test_labels_are_escaped(self):
+        registry = MetricsRegistry()
+        registry.inc(CACHE_REQUESTS, cache='a"b\\c', result="hit")
+
+        assert 'cache="a\\"b\\\\c"' in registry.render()
+
+    def test_processes_are_summed(self, tmp_path):
+        registry = MetricsRegistry(directory=str(tmp_path))
+        registry.inc(CACHE_REQUESTS, 1, cache="principal", result="hit")
+        registry.observe(REQUEST_QUERIES, 3, view="task_detail")
+        child = multiprocessing.get_context("fork").Process(
+            target=count_in_child, args=(str(tmp_path),)
+        )
+        child.start()
+        child.join()
+
+        text = registry.render()
+
+        assert child.exitcode == 0
+        assert sorted(os.listdir(tmp_path)) == sorted(
+            [f"{os.getpid()}.json", f"{child.pid}.json"]
+        )
+        # The caches of both processes also count their own lookups.
+        hits = get_sample(text, CACHE_REQUESTS, cache="principal", result="hit")
+        assert hits >= 3
+        labels = {"view": "task_detail"}
+        assert get_sample(text, f"{REQUEST_QUERIES}_count", **labels) == 2
+        assert get_sample(text, f"{REQUEST_QUERIES}_sum", **labels) == 6
+
+    def test_gauges_of_exited_processes_are_dropped(self, tmp_path):
+        registry = MetricsRegistry(directory=str(tmp_path))
+        child = multiprocessing.get_context("fork").Process(
+            target=count_in_child, args=(str(tmp_path),)
+        )
+        child.start()
+        child.join()
+        registry.inc(POOL_CONNECTIONS, 5, alias="default", state="idle")
+        snapshot = registry.snapshot()
+        snapshot["pid"] = child.pid
+        (tmp_path / f"{child.pid}.json").write_text(json.dumps(snapshot))
+
+        registry.clear()
+        text = registry.render()
+
+        idle = get_sample(text, POOL_CONNECTIONS, alias="default", state="idle")
+        assert idle is None
+
+
+    def test_processes_flush_in_the_background(self, tmp_path):
+        registry = MetricsRegistry(directory=str(tmp_path), flush_interval=0.01)
+        registry.inc(CACHE_REQUESTS, 1, cache="principal", result="hit")
+        try:
+            registry.start_flushing()
+            registry.start_flushing()
+            path = tmp_path / f"{os.getpid()}.json"
+            for _ in range(500):
+                if path.exists():
+                    break
+                time.sleep(0.01)
+        finally:
+            registry.stop_flushing()
+
+        assert path.exists()
+        assert [thread.name for thread in threading.enumerate()].count(
+            "metrics-flush"
+        ) <= 1
+
+
+class TestMetricsEndpoint:
+    def test_requests_are_measured(self, metrics, owner_client, tenant_context):
+        owner_client.get("/api/projects/")
+        owner_client.get("/api/projects/")
+        owner_client.get("/api/projects/12345/")
+
+        response = APIClient().get("/metrics")
+
+        assert response.status_code == 200
+        assert response["Content-Type"].startswith("text/plain; version=0.0.4")
+        text = response.content.decode()
+        ok = {"view": "project_list_create", "method": "GET", "status": "200"}
+        assert get_sample(text, f"{REQUEST_DURATION}_count", **ok) == 2
+        assert (
+            get_sample(
+                text,
+                f"{REQUEST_DURATION}_count",
+                view="project_detail",
+                method="GET",
+                status="404",
+            )
+            == 1
+        )
+        queries = get_sample(
+            text, f"{REQUEST_QUERIES}_sum", view="project_list_create"
+        )
+        assert queries >= 2
+        assert get_sample(text, "gosync_tenant_context_seconds_count") == 3
+        # The second read of the list is served from the response cache.
+        assert get_sample(text, "gosync_cache_hit_ratio", cache="response") == 0.5
+        admitted = get_sample(
+            text, "gosync_admission_requests_total", result="admitted"
+        )
+        assert admitted == 3
+        assert "# TYPE gosync_db_transactions gauge" in text
+
+    def test_rejections_are_labelled_by_tenant(
+        self, metrics, owner_client, default_tenant, monkeypatch
+    ):
+        monkeypatch.setattr(admission_control, "rate", 1)
+        monkeypatch.setattr(admission_control, "burst", 1)
+        for _ in range(2):
+            owner_client.get("/api/projects/")
+
+        text = APIClient().get("/metrics").content.decode()
+
+        tenant = str(default_tenant.id)
+        assert get_sample(text, ADMISSION_REQUESTS, result="rate", tenant=tenant) == 1
+        assert (
+            get_sample(text, ADMISSION_REQUESTS, result="concurrency", tenant=tenant)
+            == 0
+        )
+
+    def test_only_allowed_clients_can_scrape(self, metrics, settings):
+        settings.METRICS = {
+            **settings.METRICS,
+            "ALLOWED_IPS": ["10.0.0.0/8"],
+            "TOKEN": "scrape-secret",
+        }
+        client = APIClient()
+
+        assert client.get("/metrics").status_code == 403
+        assert client.get("/metrics", REMOTE_ADDR="10.1.2.3").status_code == 200
+        response = client.get("/metrics", HTTP_AUTHORIZATION="Bearer wrong")
+        assert response.status_code == 403
+        response = client.get("/metrics", HTTP_AUTHORIZATION="Bearer scrape-secret")
+        assert response.status_code == 200
+
+    def test_not_found_when_disabled(self):
+        assert APIClient().get("/metrics").status_code == 404
@@ -0,0 +1,283 @@
+import time
+import uuid
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.authentication import add_tenant_claims
+from api.models import Project
+from api.principals import Principal, PrincipalCache, principal_cache
+from api.tenancy import requires_tenant_context, tenant_context_exempt
+
+pytestmark = pytest.mark.django_db
+
+
+def user_lookups(context):
+    return [
+        query["sql"]
+        for query in context.captured_queries
+        if 'FROM "api_user"' in query["sql"]
+    ]
+
+
+@pytestmark
+class TestSinglePassAuthentication:
+    def test_jwt_request_loads_the_user_once(self, owner_client, default_tenant):
+        with CaptureQueriesContext(connection) as context:
+            response = owner_client.get("/api/projects/")
+
+        assert response.status_code == 200
+        assert len(user_lookups(context)) == 1
+
+    def test_tenant_is_not_loaded_to_set_the_context(
+        self, owner_client, default_tenant
+    ):
+        with CaptureQueriesContext(connection) as context:
+            owner_client.get("/api/projects/")
+
+        # Only the data version is read, for the ETag of the response.
+        tenant_queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if 'FROM "api_tenant"' in query["sql"]
+        ]
+        assert len(tenant_queries) == 1
+        assert tenant_queries[0].startswith(
+            'SELECT "api_tenant"."data_version" AS "data_version" FROM "api_tenant"'
+        )
+
+    def test_invalid_token_is_rejected_by_drf(self, client):
+        response = client.get(
+            "/api/projects/", headers={"Authorization": "Bearer not-a-token"}
+        )
+
+        assert response.status_code == 401
+
+    def test_session_user_gets_tenant_context(self, client, owner_user, tenant_context):
+        client.force_login(owner_user)
+
+        response = client.get("/api/projects/")
+
+        assert response.status_code == 200
+        assert response.json()["results"] == []
+
+
+def statements(context):
+    return [
+        query["sql"]
+        for query in context.captured_queries
+        if not query["sql"].startswith(("SAVEPOINT", "RELEASE SAVEPOINT"))
+    ]
+
+
+@pytestmark
+class TestTenantBootstrap:
+    def test_user_tenant_and_context_are_loaded_in_one_statement(
+        self, owner_client, default_tenant
+    ):
+        with CaptureQueriesContext(connection) as context:
+            response = owner_client.get("/api/projects/")
+
+        assert response.status_code == 200
+        bootstrap, *view_queries = statements(context)
+        assert 'FROM "api_user"' in bootstrap
+        assert 'JOIN "api_tenant"' in bootstrap
+        assert "set_config" in bootstrap
+        version, projects = view_queries
+        assert 'SELECT "api_tenant"."data_version"' in version
+        assert 'FROM "api_project"' in projects
+
+    def test_writes_reuse_the_bootstrapped_tenant(self, owner_client, default_tenant):
+        with CaptureQueriesContext(connection) as context:
+            response = owner_client.post(
+                "/api/projects/", data={"name": "Bootstrapped"}, format="json"
+            )
+
+        assert response.status_code == 201
+        assert not any('FROM "api_tenant"' in sql for sql in statements(context))
+        assert len(user_lookups(context)) == 1
+
+
+@pytestmark
+class TestPrincipalCache:
+    def test_cached_principal_skips_the_user_lookup(self, owner_client, default_tenant):
+        owner_client.get("/api/projects/")
+
+        with CaptureQueriesContext(connection) as context:
+            response = owner_client.get("/api/projects/")
+
+        assert response.status_code == 200
+        assert user_lookups(context) == []
+        assert "set_config" in statements(context)[0]
+        assert principal_cache.stats()["hits"] == 1
+
+    def test_cached_principal_keeps_the_tenant_context(
+        self, owner_client, owner_user, tenant_context
+    ):
+        Project.objects.create(tenant=tenant_context, name="Visible")
+        owner_client.get("/api/projects/")
+
+        response = owner_client.get("/api/projects/")
+
+        assert [project["name"] for project in response.data["results"]] == [
+            "Visible"
+        ]
+
+    def test_cached_principal_loads_the_user_for_writes(
+        self, owner_client, owner_user, default_tenant
+    ):
+        owner_client.get("/api/projects/")
+
+        response = owner_client.post(
+            "/api/projects/", data={"name": "Lazy"}, format="json"
+        )
+
+        assert response.status_code == 201
+
+    def test_role_change_invalidates_the_principal(
+        self, owner_client, owner_user, admin_user, default_tenant
+    ):
+        admin_client = APIClient()
+        admin_client.credentials(
+            HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(admin_user)}"
+        )
+        admin_client.get("/api/projects/")
+        assert principal_cache.get(admin_user.pk).role == "admin"
+
+        admin_user.change_role("user", changed_by=owner_user)
+
+        assert principal_cache.get(admin_user.pk) is None
+
+    def test_tenant_save_invalidates_its_users(self, owner_user, default_tenant):
+        principal_cache.set(owner_user.pk, Principal(default_tenant.id, "owner", True))
+
+        default_tenant.name = "Renamed"
+        default_tenant.save(owner=owner_user)
+
+        assert principal_cache.get(owner_user.pk) is None
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = PrincipalCache(max_size=2, ttl=60)
+        for user_id in (1, 2):
+            cache.set(user_id, Principal(None, "user", True))
+        cache.get(1)
+
+        cache.set(3, Principal(None, "user", True))
+
+        assert cache.get(2) is None
+        assert cache.get(1) is not None
+        assert cache.stats()["size"] == 2
+
+    def test_entries_expire_after_ttl(self, monkeypatch):
+        cache = PrincipalCache(max_size=10, ttl=5)
+        cache.set(1, Principal(None, "user", True))
+
+        now = time.monotonic()
+        monkeypatch.setattr(time, "monotonic", lambda: now + 10)
+
+        assert cache.get(1) is None
+        assert cache.stats() == {"hits": 0, "misses": 1, "size": 0, "max_size": 10}
+
+    def test_shared_backend_is_used_across_processes(self):
+        tenant_id = uuid.uuid4()
+        worker = PrincipalCache(max_size=10, ttl=60, backend="default")
+        other_worker = PrincipalCache(max_size=10, ttl=60, backend="default")
+
+        worker.set(1, Principal(tenant_id, "admin", True))
+
+        assert other_worker.get(1) == Principal(tenant_id, "admin", True)
+        other_worker.delete(1)
+        assert PrincipalCache(max_size=10, ttl=60, backend="default").get(1) is None
+
+
+@pytestmark
+class TestTokenClaimsAuthentication:
+    def test_claims_token_never_reads_the_user_table(
+        self, settings, owner_user, tenant_context
+    ):
+        settings.TENANT_TOKEN_CLAIMS = True
+        Project.objects.create(tenant=tenant_context, name="Claimed")
+        token = AccessToken.for_user(owner_user)
+        add_tenant_claims(token, owner_user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        with CaptureQueriesContext(connection) as context:
+            response = client.get("/api/projects/")
+
+        assert [project["name"] for project in response.data["results"]] == [
+            "Claimed"
+        ]
+        assert user_lookups(context) == []
+        assert principal_cache.stats()["misses"] == 0
+
+    def test_claims_are_ignored_when_disabled(self, settings, owner_user, default_tenant):
+        settings.TENANT_TOKEN_CLAIMS = False
+        token = AccessToken.for_user(owner_user)
+        add_tenant_claims(token, owner_user)
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+        with CaptureQueriesContext(connection) as context:
+            client.get("/api/projects/")
+
+        assert len(user_lookups(context)) == 1
+
+
+@pytestmark
+class TestTenantContextExemptViews:
+    def transaction_statements(self, context):
+        return [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith("SAVEPOINT") or "set_config" in query["sql"]
+        ]
+
+    def test_token_endpoint_runs_without_tenant_transaction(self, client, owner_user):
+        with CaptureQueriesContext(connection) as context:
+            response = client.post(
+                "/api/token/",
+                {"username": owner_user.username, "password": "ownerpass123"},
+                content_type="application/json",
+            )
+
+        assert response.status_code == 200
+        assert self.transaction_statements(context) == []
+
+    def test_tenant_info_runs_without_tenant_transaction(
+        self, owner_client, default_tenant
+    ):
+        with CaptureQueriesContext(connection) as context:
+            response = owner_client.get("/api/tenant/")
+
+        assert response.data == {"tenant": default_tenant.name}
+        assert not any(
+            sql.startswith("SAVEPOINT") for sql in self.transaction_statements(context)
+        )
+        assert len(user_lookups(context)) == 1
+
+    def test_tenant_views_still_get_a_transaction(self, owner_client, default_tenant):
+        with CaptureQueriesContext(connection) as context:
+            owner_client.get("/api/projects/")
+
+        assert any(
+            sql.startswith("SAVEPOINT") for sql in self.transaction_statements(context)
+        )
+
+    def test_unknown_paths_skip_the_tenant_transaction(self, owner_client):
+        with CaptureQueriesContext(connection) as context:
+            response = owner_client.get("/api/does-not-exist/")
+
+        assert response.status_code == 404
+        assert context.captured_queries == []
+
+    def test_exempt_decorator_marks_function_views(self):
+        @tenant_context_exempt
+        def view(request):
+            pass
+
+        assert requires_tenant_context(view) is False
+        assert requires_tenant_context(lambda request: None) is True
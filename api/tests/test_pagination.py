@@ -0,0 +1,199 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Project, Task, TaskComment
+from api.pagination import KeysetPagination
+from api.tenancy import tenant_scope
+
+pytestmark = pytest.mark.django_db
+
+
+def collect_pages(client, path):
+    pages = []
+    while path:
+        response = client.get(path)
+        assert response.status_code == 200
+        pages.append([item["id"] for item in response.data["results"]])
+        path = response.data["next"]
+    return pages
+
+
+@pytestmark
+class TestKeysetPagination:
+    def test_tasks_are_paginated_by_id(self, owner_client, tenant_context):
+        project = Project.objects.create(tenant=tenant_context, name="Paged")
+        tasks = Task.objects.bulk_create(
+            Task(tenant=tenant_context, project=project, name=f"Task {index}")
+            for index in range(7)
+        )
+
+        pages = collect_pages(owner_client, "/api/tasks/?page_size=3")
+
+        assert [len(page) for page in pages] == [3, 3, 1]
+        assert sum(pages, []) == sorted(task.id for task in tasks)
+
+    def test_projects_use_default_page_size(self, owner_client, tenant_context, settings):
+        settings.PAGE_SIZE = 2
+        for index in range(3):
+            Project.objects.create(tenant=tenant_context, name=f"Project {index}")
+
+        pages = collect_pages(owner_client, "/api/projects/")
+
+        assert [len(page) for page in pages] == [2, 1]
+
+    def test_comments_are_paginated_by_created_at_and_id(
+        self, owner_client, owner_user, tenant_context
+    ):
+        project = Project.objects.create(tenant=tenant_context, name="Timeline")
+        task = Task.objects.create(tenant=tenant_context, project=project, name="Task")
+        comments = [
+            TaskComment.objects.create(
+                tenant=tenant_context, task=task, author=owner_user, content=str(index)
+            )
+            for index in range(5)
+        ]
+
+        pages = collect_pages(owner_client, f"/api/tasks/{task.id}/comments/?page_size=2")
+
+        assert [len(page) for page in pages] == [2, 2, 1]
+        assert sum(pages, []) == [comment.id for comment in comments]
+
+    def test_deep_pages_do_not_use_offset(self, owner_client, tenant_context):
+        project = Project.objects.create(tenant=tenant_context, name="Deep")
+        Task.objects.bulk_create(
+            Task(tenant=tenant_context, project=project, name=f"Task {index}")
+            for index in range(6)
+        )
+        response = owner_client.get("/api/tasks/?page_size=2")
+        next_page = owner_client.get(response.data["next"]).data["next"]
+
+        with CaptureQueriesContext(connection) as context:
+            owner_client.get(next_page)
+
+        task_queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if 'FROM "api_task"' in query["sql"]
+        ]
+        assert task_queries
+        assert all("OFFSET" not in sql for sql in task_queries)
+
+    def test_invalid_cursor_returns_not_found(self, owner_client, tenant_context):
+        response = owner_client.get("/api/tasks/?cursor=not-a-cursor")
+
+        assert response.status_code == 404
+        assert response.data["detail"] == "Invalid cursor"
+
+    @pytest.mark.parametrize(
+        "position",
+        [["abc"], [None], [[1]], [{"id": 1}]],
+    )
+    def test_malformed_cursor_values_return_not_found(
+        self, owner_client, tenant_context, position
+    ):
+        cursor = KeysetPagination().encode_cursor(position)
+
+        response = owner_client.get(f"/api/tasks/?cursor={cursor}")
+
+        assert response.status_code == 404
+        assert response.data["detail"] == "Invalid cursor"
+
+    def test_malformed_timestamp_cursor_returns_not_found(
+        self, owner_client, tenant_context
+    ):
+        project = Project.objects.create(tenant=tenant_context, name="Project")
+        task = Task.objects.create(tenant=tenant_context, project=project, name="Task")
+        cursor = KeysetPagination().encode_cursor(["yesterday", 1])
+
+        response = owner_client.get(
+            f"/api/tasks/{task.id}/comments/?ordering=-created_at&cursor={cursor}"
+        )
+
+        assert response.status_code == 404
+
+
+@pytestmark
+class TestCommentTimeline:
+    @pytest.fixture
+    def timeline(self, owner_user, tenant_context):
+        project = Project.objects.create(tenant=tenant_context, name="Timeline")
+        task = Task.objects.create(tenant=tenant_context, project=project, name="Task")
+        comments = TaskComment.objects.bulk_create(
+            TaskComment(
+                tenant=tenant_context, task=task, author=owner_user, content=str(index)
+            )
+            for index in range(5)
+        )
+        return task, comments
+
+    def test_latest_comments_come_first(self, owner_client, timeline):
+        task, comments = timeline
+
+        pages = collect_pages(
+            owner_client,
+            f"/api/tasks/{task.id}/comments/?ordering=-created_at&page_size=2",
+        )
+
+        assert [len(page) for page in pages] == [2, 2, 1]
+        assert sum(pages, []) == [comment.id for comment in reversed(comments)]
+
+    def test_unknown_ordering_is_rejected(self, owner_client, timeline):
+        task, _ = timeline
+
+        response = owner_client.get(f"/api/tasks/{task.id}/comments/?ordering=id")
+
+        assert response.status_code == 400
+
+    def test_created_at_does_not_change_on_save(self, timeline):
+        _, comments = timeline
+        comment = TaskComment.objects.get(pk=comments[0].pk)
+        created_at = comment.created_at
+
+        comment.content = "Edited"
+        comment.save()
+
+        comment.refresh_from_db()
+        assert comment.created_at == created_at
+
+    def test_latest_page_is_an_index_range_scan(self, owner_user, tenant_context):
+        project = Project.objects.create(tenant=tenant_context, name="Busy")
+        tasks = Task.objects.bulk_create(
+            Task(tenant=tenant_context, project=project, name=f"Task {index}")
+            for index in range(10)
+        )
+        TaskComment.objects.bulk_create(
+            (
+                TaskComment(
+                    tenant=tenant_context, task=task, author=owner_user, content="x"
+                )
+                for _ in range(1000)
+                for task in tasks
+            ),
+            batch_size=5000,
+        )
+        with connection.cursor() as cursor:
+            # Spread the timeline like comments written over weeks.
+            cursor.execute(
+                "UPDATE api_taskcomment "
+                "SET created_at = TIMESTAMPTZ '2020-01-01' + id * INTERVAL '1 minute'"
+            )
+            cursor.execute("ANALYZE api_taskcomment")
+
+        paginator = KeysetPagination(ordering=("-created_at", "-id"))
+        last = TaskComment.objects.filter(task=tasks[0]).order_by("-id")[49]
+        with tenant_scope(tenant_context.id):
+            comments = TaskComment.objects.filter(task=tasks[0]).order_by(
+                *paginator.ordering
+            )
+            first_page = comments[:51].explain()
+            next_page = (
+                comments.filter(
+                    paginator.get_keyset_filter([last.created_at, last.id])
+                )[:51].explain()
+            )
+
+        for plan in (first_page, next_page):
+            assert "Index Scan Backward using comment_task_timeline_idx" in plan
+            assert "Sort" not in plan
+            assert "Seq Scan" not in plan
@@ -0,0 +1,92 @@
+import uuid
+
+import pytest
+from django.db import connection
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.models import Tenant, User
+from api.pooling import configure_pools, pool_stats, reset_tenant_context
+from api.tenancy import TENANT_SETTING
+
+pytestmark = pytest.mark.django_db
+
+
+def current_tenant_setting(conn):
+    with conn.cursor() as cursor:
+        cursor.execute("SELECT current_setting(%s, true)", [TENANT_SETTING])
+        return cursor.fetchone()[0]
+
+
+@pytest.fixture
+def other_client():
+    owner = User.objects.create_user(username="otherowner", password="otherpass123")
+    Tenant(name="Other Tenant").save(owner=owner)
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(owner)}")
+    return client
+
+
+@pytest.mark.django_db(transaction=True)
+class TestTenantContextOnReusedConnections:
+    def test_context_does_not_outlive_the_request(self, owner_client, default_tenant):
+        owner_client.post("/api/projects/", data={"name": "Mine"}, format="json")
+        owner_client.get("/api/projects/")
+
+        assert not current_tenant_setting(connection)
+
+    def test_next_request_on_the_connection_sees_only_its_tenant(
+        self, owner_client, other_client, default_tenant
+    ):
+        owner_client.post("/api/projects/", data={"name": "Mine"}, format="json")
+        connection_id = id(connection.connection)
+
+        response = other_client.get("/api/projects/")
+
+        assert id(connection.connection) == connection_id
+        assert response.data["results"] == []
+
+
+@pytest.fixture
+def pooled_default(monkeypatch):
+    psycopg_pool = pytest.importorskip("psycopg_pool")
+    monkeypatch.setitem(connection.settings_dict, "CONN_MAX_AGE", 0)
+    options = connection.settings_dict["OPTIONS"]
+    options["pool"] = {"min_size": 1, "max_size": 1}
+    configure_pools()
+    yield psycopg_pool
+    connection.close_pool()
+    del options["pool"]
+
+
+@pytestmark
+class TestConnectionPool:
+    def test_reset_discards_a_session_level_tenant(self, pooled_default):
+        pool = pooled_default.ConnectionPool(
+            kwargs=connection.get_connection_params(),
+            min_size=1,
+            max_size=1,
+            reset=reset_tenant_context,
+        )
+        with pool:
+            with pool.connection() as conn:
+                conn.execute(
+                    "SELECT set_config(%s, %s, false)",
+                    [TENANT_SETTING, str(uuid.uuid4())],
+                )
+            with pool.connection() as conn:
+                assert not current_tenant_setting(conn)
+
+    def test_pools_get_the_reset_hook(self, pooled_default):
+        options = connection.settings_dict["OPTIONS"]
+
+        assert options["pool"]["reset"] is reset_tenant_context
+        assert connection.pool._reset is reset_tenant_context
+
+    def test_stats_are_reported_per_pooled_alias(self, pooled_default):
+        stats = pool_stats()
+
+        assert stats["default"]["pool_max"] == 1
+
+    def test_no_stats_without_pool(self):
+        assert pool_stats() == {}
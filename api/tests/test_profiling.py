@@ -0,0 +1,131 @@
+import json
+import re
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.models import Project, Task
+from api.profiling import RequestProfile
+from api.tenancy import tenant_context
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def profiling(settings):
+    settings.PROFILING = {"ENABLED": True, "SLOWEST_QUERIES": 2}
+
+
+@pytest.fixture
+def projects(tenant_context):
+    for name in ("First", "Second"):
+        project = Project.objects.create(tenant=tenant_context, name=name)
+        Task.objects.create(tenant=tenant_context, project=project, name=name)
+
+
+def parse_server_timing(header):
+    metrics = {}
+    for metric in header.split(", "):
+        name, *params = metric.split(";")
+        metrics[name] = dict(param.split("=", 1) for param in params)
+    return metrics
+
+
+def get_profile_logs(caplog):
+    return [
+        json.loads(record.getMessage())
+        for record in caplog.records
+        if record.name == "api.profiling"
+    ]
+
+
+class TestRequestProfile:
+    def test_keeps_the_slowest_queries(self):
+        profile = RequestProfile(slowest_queries=2)
+        for sql, duration in [("a", 0.2), ("b", 0.1), ("c", 0.5), ("d", 0.3)]:
+            profile.add_query(sql, duration)
+
+        assert profile.queries == 4
+        assert profile.db_time == pytest.approx(1.1)
+        assert profile.slowest == [(0.5, "c"), (0.3, "d")]
+
+    def test_phases_add_up(self):
+        profile = RequestProfile()
+        profile.add_phase("view", 0.01)
+        profile.add_phase("view", 0.02)
+        profile.finish()
+
+        metrics = parse_server_timing(profile.get_server_timing())
+
+        assert metrics["view"] == {"dur": "30.0"}
+        assert metrics["db"] == {"dur": "0.0", "desc": '"0 queries"'}
+        assert "total" in metrics
+
+
+class TestProfilingMiddleware:
+    def test_server_timing_header(self, profiling, owner_client, projects):
+        response = owner_client.get("/api/projects/")
+
+        assert response.status_code == 200
+        metrics = parse_server_timing(response["Server-Timing"])
+        assert {"auth", "admission", "view", "serialize", "db"} <= set(metrics)
+        assert re.fullmatch(r'"[1-9]\d* queries"', metrics["db"]["desc"])
+        assert float(metrics["view"]["dur"]) <= float(metrics["total"]["dur"])
+
+    def test_logs_one_line_per_request(
+        self, profiling, owner_client, default_tenant, projects, caplog
+    ):
+        caplog.set_level("INFO", logger="api.profiling")
+
+        response = owner_client.get("/api/projects/")
+
+        [log] = get_profile_logs(caplog)
+        assert log["method"] == "GET"
+        assert log["path"] == "/api/projects/"
+        assert log["status"] == 200
+        assert log["tenant_id"] == str(default_tenant.id)
+        assert f'"{log["queries"]} queries"' in response["Server-Timing"]
+        assert len(log["slowest_queries"]) == 2
+        assert log["slowest_queries"][0]["ms"] >= log["slowest_queries"][1]["ms"]
+        assert set(log["phases_ms"]) >= {"auth", "view", "serialize"}
+
+    def test_views_without_tenant_context(self, profiling, owner_user, caplog):
+        caplog.set_level("INFO", logger="api.profiling")
+
+        response = APIClient().post(
+            "/api/token/",
+            {"username": owner_user.username, "password": "ownerpass123"},
+        )
+
+        assert response.status_code == 200
+        assert "db;dur=" in response["Server-Timing"]
+        [log] = get_profile_logs(caplog)
+        assert log["tenant_id"] is None
+        assert log["queries"] >= 1
+
+    def test_disabled_by_default(self, owner_client, caplog):
+        caplog.set_level("INFO", logger="api.profiling")
+
+        response = owner_client.get("/api/projects/")
+
+        assert "Server-Timing" not in response
+        assert get_profile_logs(caplog) == []
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_views_record_their_queries(
+    profiling, owner_user, default_tenant, async_pool
+):
+    with tenant_context(default_tenant.id):
+        Project.objects.create(tenant=default_tenant, name="Async")
+    headers = {"Authorization": f"Bearer {AccessToken.for_user(owner_user)}"}
+
+    response = async_to_sync(AsyncClient().get)("/api/async/projects/", headers=headers)
+
+    assert response.status_code == 200
+    metrics = parse_server_timing(response["Server-Timing"])
+    assert {"auth", "admission", "view", "serialize"} <= set(metrics)
+    assert re.fullmatch(r'"[1-9]\d* queries"', metrics["db"]["desc"])
@@ -0,0 +1,126 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.models import Project, Task, TaskComment, Tenant, User
+from api.responsecache import response_cache
+
+pytestmark = pytest.mark.django_db
+
+
+def tree_queries(context):
+    return [
+        query["sql"]
+        for query in context.captured_queries
+        if '"api_task"' in query["sql"] or '"api_taskcomment"' in query["sql"]
+    ]
+
+
+@pytest.fixture
+def projects(tenant_context, owner_user):
+    created = []
+    for name in ("Cached", "Other"):
+        project = Project.objects.create(tenant=tenant_context, name=name)
+        task = Task.objects.create(tenant=tenant_context, project=project, name=name)
+        TaskComment.objects.create(
+            tenant=tenant_context, task=task, author=owner_user, content="Hi"
+        )
+        created.append(project)
+    return created
+
+
+@pytestmark
+class TestProjectResponseCache:
+    def test_repeated_reads_are_served_from_the_cache(self, owner_client, projects):
+        first = owner_client.get("/api/projects/")
+
+        with CaptureQueriesContext(connection) as context:
+            second = owner_client.get("/api/projects/")
+
+        assert second.json() == first.json()
+        assert tree_queries(context) == []
+        assert response_cache.stats()["hits"] == 1
+        assert response_cache.stats()["misses"] == 1
+
+    def test_writes_invalidate_only_their_project(
+        self, owner_client, owner_user, projects
+    ):
+        cached, other = projects
+        for project in projects:
+            owner_client.get(f"/api/projects/{project.id}/")
+
+        TaskComment.objects.create(
+            tenant=cached.tenant,
+            task=cached.tasks.get(),
+            author=owner_user,
+            content="Fresh",
+        )
+
+        response = owner_client.get(f"/api/projects/{cached.id}/")
+        comments = response.json()["tasks"][0]["comments"]
+        assert [comment["content"] for comment in comments] == ["Hi", "Fresh"]
+        assert response_cache.stats()["hits"] == 0
+
+        with CaptureQueriesContext(connection) as context:
+            owner_client.get(f"/api/projects/{other.id}/")
+        assert tree_queries(context) == []
+        assert response_cache.stats()["hits"] == 1
+
+    def test_saves_after_writes_never_get_an_old_body(self, owner_client, projects):
+        path = f"/api/projects/{projects[0].id}/"
+        owner_client.get(path)
+        project = Project.objects.get(pk=projects[0].pk)
+        for name in ("First write", "Second write"):
+            Task.objects.create(tenant=project.tenant, project=project, name=name)
+            owner_client.get(path)
+
+        # Loaded before the writes: saving it used to bring an old data
+        # version back, under which the cache held an old tree.
+        project.name = "Renamed"
+        project.save()
+
+        hits = response_cache.stats()["hits"]
+        response = owner_client.get(path)
+        assert response.json()["name"] == "Renamed"
+        assert len(response.json()["tasks"]) == 3
+        assert response_cache.stats()["hits"] == hits
+
+    def test_task_writes_invalidate_the_list(self, owner_client, projects):
+        owner_client.get("/api/projects/")
+
+        Task.objects.create(
+            tenant=projects[0].tenant, project=projects[0], name="Added"
+        )
+
+        response = owner_client.get("/api/projects/")
+        assert len(response.json()["results"][0]["tasks"]) == 2
+        assert response_cache.stats()["hits"] == 0
+
+    def test_tenants_do_not_share_entries(self, owner_client, projects):
+        owner = User.objects.create_user(username="cacheother", password="pass12345")
+        Tenant(name="Cache Other").save(owner=owner)
+        owner_client.get("/api/projects/")
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(owner)}")
+        response = client.get("/api/projects/")
+
+        assert response.json()["results"] == []
+
+    def test_streams_are_not_cached(self, owner_client, projects):
+        b"".join(owner_client.get("/api/projects/?stream=ndjson"))
+        b"".join(owner_client.get("/api/projects/?stream=ndjson"))
+
+        assert response_cache.stats() == {
+            "hits": 0,
+            "misses": 0,
+            "backend": "responses",
+        }
+
+    def test_missing_projects_are_not_cached(self, owner_client, default_tenant):
+        assert owner_client.get("/api/projects/999999/").status_code == 404
+        assert owner_client.get("/api/projects/999999/").status_code == 404
+
+        assert response_cache.stats()["hits"] == 0
@@ -0,0 +1,139 @@
+import pytest
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api.checks import check_read_your_writes_cache
+from api.middleware import set_tenant_context_middleware
+from api.models import Project
+from api.routers import (
+    TenantReplicaRouter,
+    get_pin_cache,
+    get_read_alias,
+    is_pinned_to_primary,
+    request_routing,
+)
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture(autouse=True)
+def clear_pins():
+    get_pin_cache().clear()
+    yield
+    get_pin_cache().clear()
+
+
+def show_read_only(request):
+    with connection.cursor() as cursor:
+        cursor.execute("SHOW transaction_read_only")
+        return HttpResponse(cursor.fetchone()[0])
+
+
+@pytest.mark.django_db(transaction=True)
+class TestReadOnlyTransactions:
+    def call(self, method, owner_user):
+        request = getattr(RequestFactory(), method)(
+            "/api/projects/",
+            headers={"Authorization": f"Bearer {AccessToken.for_user(owner_user)}"},
+        )
+        return set_tenant_context_middleware(show_read_only)(request).content
+
+    def test_safe_requests_run_read_only(self, owner_user):
+        assert self.call("get", owner_user) == b"on"
+
+    def test_unsafe_requests_run_read_write(self, owner_user):
+        assert self.call("post", owner_user) == b"off"
+
+    def test_cached_principals_also_run_read_only(self, owner_user):
+        self.call("get", owner_user)
+
+        assert self.call("get", owner_user) == b"on"
+
+    def test_reads_and_writes_work_through_the_api(self, owner_client, default_tenant):
+        response = owner_client.post(
+            "/api/projects/", data={"name": "Routed"}, format="json"
+        )
+        assert response.status_code == 201
+
+        response = owner_client.get("/api/projects/")
+        assert [project["name"] for project in response.data["results"]] == [
+            "Routed"
+        ]
+        assert Project.objects.count() == 0, "Context must not outlive the request"
+
+
+@pytestmark
+class TestReplicaRouting:
+    def test_safe_requests_read_from_the_replica(self, settings):
+        settings.READ_REPLICA_ALIAS = "replica"
+        factory = RequestFactory()
+
+        assert get_read_alias(factory.get("/api/tasks/")) == "replica"
+        assert get_read_alias(factory.post("/api/tasks/")) == "default"
+
+    def test_reads_use_the_primary_without_replica(self, settings):
+        settings.READ_REPLICA_ALIAS = None
+
+        assert get_read_alias(RequestFactory().get("/api/tasks/")) == "default"
+
+    def test_writes_pin_the_client_to_the_primary(
+        self, settings, owner_client, default_tenant
+    ):
+        settings.READ_REPLICA_ALIAS = "replica"
+        headers = {"Authorization": owner_client._credentials["HTTP_AUTHORIZATION"]}
+        request = RequestFactory().get("/api/projects/", headers=headers)
+        assert not is_pinned_to_primary(request)
+
+        owner_client.post("/api/projects/", data={"name": "Pinned"}, format="json")
+
+        assert is_pinned_to_primary(request)
+        assert get_read_alias(request) == "default"
+
+    def test_failed_writes_do_not_pin(self, owner_client, default_tenant):
+        owner_client.post("/api/projects/", data={}, format="json")
+        headers = {"Authorization": owner_client._credentials["HTTP_AUTHORIZATION"]}
+
+        assert not is_pinned_to_primary(RequestFactory().get("/", headers=headers))
+
+    def test_router_follows_the_request_routing(self):
+        router = TenantReplicaRouter()
+
+        assert router.db_for_read(Project) is None
+        with request_routing("replica", read_only=True):
+            assert router.db_for_read(Project) == "replica"
+            assert router.db_for_write(Project) == "default"
+        assert router.allow_migrate("replica", "api") is False
+        assert router.allow_relation(None, None) is True
+
+
+class TestReadYourWritesCheck:
+    def test_per_process_pins_are_refused_with_a_replica(self, settings):
+        settings.READ_REPLICA_ALIAS = "replica"
+
+        [error] = check_read_your_writes_cache(None)
+
+        assert error.id == "api.E002"
+
+    def test_unknown_cache_is_refused(self, settings):
+        settings.READ_REPLICA_ALIAS = "replica"
+        settings.READ_YOUR_WRITES_CACHE = "missing"
+
+        assert [error.id for error in check_read_your_writes_cache(None)] == [
+            "api.E001"
+        ]
+
+    def test_shared_pins_pass(self, settings):
+        settings.READ_REPLICA_ALIAS = "replica"
+        settings.CACHES = {
+            **settings.CACHES,
+            "pins": {"BACKEND": "django.core.cache.backends.redis.RedisCache"},
+        }
+
+        assert check_read_your_writes_cache(None) == []
+
+    def test_any_cache_without_a_replica(self, settings):
+        settings.READ_REPLICA_ALIAS = None
+
+        assert check_read_your_writes_cache(None) == []
@@ -0,0 +1,148 @@
+from uuid import uuid4
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.models import Project, Task, TaskComment, Tenant, User
+
+pytestmark = pytest.mark.django_db
+
+
+def search(client, q, **params):
+    response = client.get("/api/search/", {"q": q, **params})
+    assert response.status_code == 200, response.content
+    return response.json()
+
+
+def found(results):
+    return [(result["kind"], result["text"]) for result in results["results"]]
+
+
+@pytest.fixture
+def project(tenant_context):
+    return Project.objects.create(tenant=tenant_context, name="Searchable")
+
+
+@pytest.fixture
+def tasks(project, owner_user):
+    migration = Task.objects.create(
+        tenant=project.tenant, project=project, name="Database migration"
+    )
+    release = Task.objects.create(
+        tenant=project.tenant, project=project, name="Release notes"
+    )
+    TaskComment.objects.create(
+        tenant=project.tenant,
+        task=release,
+        author=owner_user,
+        content="Mention the database migration in the notes",
+    )
+    return migration, release
+
+
+@pytestmark
+class TestSearch:
+    def test_tasks_and_comments_are_ranked(self, owner_client, tasks):
+        migration, release = tasks
+
+        results = search(owner_client, "database migration")
+
+        assert found(results) == [
+            ("task", "Database migration"),
+            ("comment", "Mention the database migration in the notes"),
+        ]
+        first, second = results["results"]
+        assert first["rank"] > second["rank"]
+        assert first["task_id"] == migration.id
+        assert second["task_id"] == release.id
+
+    def test_prefixes_and_typos_match(self, owner_client, tasks):
+        assert ("task", "Release notes") in found(search(owner_client, "relea"))
+        assert ("task", "Database migration") in found(search(owner_client, "databse"))
+
+    def test_vectors_follow_writes(self, owner_client, tasks):
+        migration, _ = tasks
+        migration.name = "Schema upgrade"
+        migration.save()
+
+        assert found(search(owner_client, "upgrade")) == [("task", "Schema upgrade")]
+        assert ("task", "Database migration") not in found(
+            search(owner_client, "database")
+        )
+
+    def test_other_tenants_are_not_searched(self, owner_client, tasks, another_user):
+        other = Tenant(name="Other")
+        other.save(owner=another_user)
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL app.current_tenant_id = %s", [str(other.id)])
+        project = Project.objects.create(tenant=other, name="Foreign")
+        Task.objects.create(tenant=other, project=project, name="Database secrets")
+
+        assert ("task", "Database secrets") not in found(
+            search(owner_client, "database")
+        )
+
+    def test_results_are_paginated(self, owner_client, project):
+        for number in range(5):
+            Task.objects.create(
+                tenant=project.tenant, project=project, name=f"Backup job {number}"
+            )
+
+        page = search(owner_client, "backup", page_size=2)
+        results = page["results"]
+        while page["next"]:
+            page = owner_client.get(page["next"]).json()
+            results += page["results"]
+
+        assert sorted(result["text"] for result in results) == [
+            f"Backup job {number}" for number in range(5)
+        ]
+        keys = [(result["rank"], result["kind"], result["id"]) for result in results]
+        assert keys == sorted(keys, reverse=True)
+
+    def test_invalid_requests(self, owner_client, tasks):
+        assert owner_client.get("/api/search/").status_code == 400
+        assert owner_client.get("/api/search/", {"q": "x" * 201}).status_code == 400
+        response = owner_client.get("/api/search/", {"q": "notes", "cursor": "WyJhIl0"})
+        assert response.status_code == 404
+
+    def test_search_only_reads_the_rows_of_the_tenant(
+        self, owner_client, project, tasks
+    ):
+        chores = Task.objects.bulk_create(
+            Task(tenant=project.tenant, project=project, name=f"Chore {uuid4().hex}")
+            for _ in range(2000)
+        )
+        TaskComment.objects.bulk_create(
+            TaskComment(tenant=project.tenant, task=task, content=f"Done {uuid4().hex}")
+            for task in chores
+        )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE api_task, api_taskcomment")
+
+        with CaptureQueriesContext(connection) as context:
+            assert len(search(owner_client, "database")["results"]) == 2
+        sql = next(
+            query["sql"]
+            for query in context.captured_queries
+            if "to_tsquery" in query["sql"]
+        )
+        # Tables this small are still cheaper to scan sequentially.
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute(f"EXPLAIN {sql}")
+            plan = "\n".join(row[0] for row in cursor.fetchall())
+
+        # The explicit tenant predicate reaches an index under RLS.
+        assert plan.count(f"(tenant_id = '{project.tenant_id}'::uuid)") == 2
+        assert "Seq Scan" not in plan
+
+    def test_vectors_are_not_loaded_by_other_reads(self, owner_client, tasks):
+        with CaptureQueriesContext(connection) as context:
+            owner_client.get("/api/projects/")
+
+        assert not any(
+            "search_vector" in query["sql"] for query in context.captured_queries
+        )
+
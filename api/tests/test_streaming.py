@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+from api.models import Project, Task, Tenant
+from api.tenancy import tenant_context
+
+pytestmark = pytest.mark.django_db
+
+
+def read_stream(response):
+    assert response.streaming
+    return b"".join(response.streaming_content).decode()
+
+
+@pytestmark
+class TestStreamingListViews:
+    @pytest.fixture
+    def tasks(self, default_tenant, another_user):
+        other_tenant = Tenant(name="Other Tenant")
+        other_tenant.save(owner=another_user)
+        with tenant_context(other_tenant.id):
+            other_project = Project.objects.create(tenant=other_tenant, name="Other")
+            Task.objects.create(tenant=other_tenant, project=other_project, name="No")
+
+        with tenant_context(default_tenant.id):
+            project = Project.objects.create(tenant=default_tenant, name="Dump")
+            return Task.objects.bulk_create(
+                Task(tenant=default_tenant, project=project, name=f"Task {index}")
+                for index in range(5)
+            )
+
+    def test_tasks_stream_as_json_array(self, owner_client, tasks):
+        response = owner_client.get("/api/tasks/?stream=1")
+
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/json"
+        rows = json.loads(read_stream(response))
+        assert [row["id"] for row in rows] == [task.id for task in tasks]
+        assert rows[0]["comments"] == []
+
+    def test_tasks_stream_as_ndjson(self, owner_client, tasks):
+        response = owner_client.get("/api/tasks/?stream=ndjson")
+
+        assert response["Content-Type"] == "application/x-ndjson"
+        lines = read_stream(response).splitlines()
+        assert [json.loads(line)["name"] for line in lines] == [
+            task.name for task in tasks
+        ]
+
+    def test_projects_stream_nested_tasks(self, owner_client, tasks):
+        response = owner_client.get("/api/projects/?stream=true")
+
+        rows = json.loads(read_stream(response))
+        assert len(rows) == 1
+        assert len(rows[0]["tasks"]) == len(tasks)
+
+    def test_empty_stream_is_an_empty_array(self, owner_client, default_tenant):
+        response = owner_client.get("/api/tasks/?stream=json")
+
+        assert json.loads(read_stream(response)) == []
@@ -1,8 +1,12 @@
 # tests.py
+import re
+
 import pytest
 from django.db import connection, transaction, utils
+from django.test.utils import CaptureQueriesContext
 
-from api.models import Project, Tenant
+from api.models import Project, Task, Tenant
+from api.tenancy import get_current_tenant_id, set_tenant, tenant_scope
 
 pytestmark = pytest.mark.django_db
 
@@ -60,3 +64,77 @@ class TestTenantIsolation:
         assert projects_no_ctx.count() == 0, (
             "RLS not working - projects are visible without context after transaction!"
         )
+
+    def test_policies_compare_the_native_uuid_column(self):
+        with connection.cursor() as cursor:
+            cursor.execute("""
+                SELECT qual, with_check
+                FROM pg_policies
+                WHERE tablename IN ('api_project', 'api_task', 'api_taskcomment')
+            """)
+            expressions = [expr for row in cursor.fetchall() for expr in row if expr]
+
+        assert expressions
+        assert all("tenant_id)::text" not in expr for expr in expressions)
+
+    def test_tenant_scans_use_the_tenant_index(self):
+        tenants = Tenant.objects.bulk_create(
+            Tenant(name=f"Tenant {index}") for index in range(50)
+        )
+        for tenant in tenants:
+            with transaction.atomic():
+                set_tenant(tenant.id)
+                project = Project.objects.create(tenant=tenant, name="Scaled")
+                Task.objects.bulk_create(
+                    Task(tenant=tenant, project=project, name=f"Task {index}")
+                    for index in range(100)
+                )
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE api_task")
+
+        with transaction.atomic():
+            set_tenant(tenants[0].id)
+            plan = Task.objects.all().explain()
+            count = Task.objects.count()
+
+        assert count == 100
+        assert "Seq Scan" not in plan
+        assert re.search(r"Index Scan on \w*tenant\w*", plan)
+
+
+@pytestmark
+class TestTenantScopedManagers:
+    def test_scope_adds_an_explicit_tenant_predicate(self, default_tenant):
+        with tenant_scope(default_tenant.id):
+            scoped_sql = str(Task.objects.all().query)
+        unscoped_sql = str(Task.objects.all().query)
+
+        assert f'"api_task"."tenant_id" = {default_tenant.id}' in scoped_sql
+        assert "WHERE" not in unscoped_sql
+
+    def test_related_and_prefetched_querysets_are_scoped(
+        self, default_tenant, tenant_context
+    ):
+        project = Project.objects.create(tenant=default_tenant, name="Scoped")
+
+        with tenant_scope(default_tenant.id):
+            related_sql = str(project.tasks.all().query)
+
+        assert '"api_task"."tenant_id"' in related_sql
+
+    def test_requests_query_with_tenant_predicates(self, owner_client, tenant_context):
+        project = Project.objects.create(tenant=tenant_context, name="Predicates")
+        Task.objects.create(tenant=tenant_context, project=project, name="Task")
+
+        with CaptureQueriesContext(connection) as context:
+            response = owner_client.get("/api/tasks/")
+
+        assert response.status_code == 200
+        task_queries = [
+            query["sql"]
+            for query in context.captured_queries
+            if 'FROM "api_task"' in query["sql"]
+        ]
+        assert task_queries
+        assert all('"api_task"."tenant_id" =' in sql for sql in task_queries)
+        assert get_current_tenant_id() is None
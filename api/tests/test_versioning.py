@@ -0,0 +1,151 @@
+import json
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api.ingestion import ingest_comments
+from api.models import Project, Task, TaskComment, Tenant
+
+pytestmark = pytest.mark.django_db
+
+
+def versions(project):
+    tenant = Tenant.objects.get(pk=project.tenant_id)
+    project = Project.objects.get(pk=project.pk)
+    return tenant.data_version, project.data_version
+
+
+@pytest.fixture
+def project(tenant_context):
+    return Project.objects.create(tenant=tenant_context, name="Polled")
+
+
+@pytest.fixture
+def task(project):
+    return Task.objects.create(tenant=project.tenant, project=project, name="Poll")
+
+
+@pytestmark
+class TestDataVersions:
+    def test_writes_bump_tenant_and_project(self, project, task, owner_user):
+        before = versions(project)
+
+        comment = TaskComment.objects.create(
+            tenant=project.tenant, task=task, author=owner_user, content="Hi"
+        )
+        assert versions(project) == (before[0] + 1, before[1] + 1)
+
+        comment.delete()
+        task.delete()
+        assert versions(project) == (before[0] + 3, before[1] + 3)
+
+    def test_saving_a_loaded_instance_never_lowers_the_version(
+        self, project, task, owner_user
+    ):
+        tenant = Tenant.objects.get(pk=project.tenant_id)
+        Task.objects.create(tenant=project.tenant, project=project, name="Bump")
+        before = versions(project)
+
+        # Both instances were loaded before the bumps above.
+        project.name = "Renamed"
+        project.save()
+        tenant.name = "Renamed"
+        tenant.save(owner=owner_user)
+
+        assert versions(project) == (before[0] + 1, before[1] + 1)
+        assert Project.objects.get(pk=project.pk).name == "Renamed"
+
+    def test_other_projects_are_untouched(self, project, task):
+        other = Project.objects.create(tenant=project.tenant, name="Quiet")
+        before = versions(other)
+
+        Task.objects.create(tenant=project.tenant, project=project, name="Noise")
+
+        assert versions(other)[1] == before[1]
+        assert versions(other)[0] == before[0] + 1
+
+    def test_bulk_task_creation_bumps_once(self, owner_client, project):
+        before = versions(project)
+
+        response = owner_client.post(
+            "/api/tasks/",
+            [{"name": f"Bulk {n}", "project_id": project.id} for n in range(3)],
+            format="json",
+        )
+
+        assert response.status_code == 201
+        assert versions(project) == (before[0] + 1, before[1] + 1)
+
+    def test_ingestion_bumps_the_projects_of_inserted_comments(self, project, task):
+        other = Project.objects.create(tenant=project.tenant, name="Quiet")
+        before, other_before = versions(project), versions(other)
+
+        ingest_comments(
+            [json.dumps({"task_id": task.id, "content": "Imported"}) + "\n"],
+            project.tenant_id,
+        )
+
+        assert versions(project) == (before[0] + 1, before[1] + 1)
+        assert versions(other)[1] == other_before[1]
+
+
+@pytestmark
+class TestConditionalReads:
+    def test_unchanged_list_is_not_modified(self, owner_client, task):
+        response = owner_client.get("/api/projects/")
+        etag = response["ETag"]
+        assert response.status_code == 200
+
+        with CaptureQueriesContext(connection) as context:
+            response = owner_client.get("/api/projects/", HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 304
+        assert response["ETag"] == etag
+        sql = " ".join(query["sql"] for query in context.captured_queries)
+        for table in ("api_project", "api_task", "api_taskcomment"):
+            assert f'"{table}"' not in sql
+
+    def test_writes_change_the_etag(self, owner_client, owner_user, task):
+        list_etag = owner_client.get("/api/projects/")["ETag"]
+        detail_etag = owner_client.get(f"/api/projects/{task.project_id}/")["ETag"]
+
+        TaskComment.objects.create(
+            tenant=task.tenant, task=task, author=owner_user, content="New"
+        )
+
+        response = owner_client.get("/api/projects/", HTTP_IF_NONE_MATCH=list_etag)
+        assert response.status_code == 200
+        assert response["ETag"] != list_etag
+        response = owner_client.get(
+            f"/api/projects/{task.project_id}/", HTTP_IF_NONE_MATCH=detail_etag
+        )
+        assert response.status_code == 200
+
+    def test_detail_ignores_writes_to_other_projects(self, owner_client, project, task):
+        path = f"/api/projects/{project.id}/"
+        etag = owner_client.get(path)["ETag"]
+
+        other = Project.objects.create(tenant=project.tenant, name="Elsewhere")
+        Task.objects.create(tenant=project.tenant, project=other, name="Elsewhere")
+
+        with CaptureQueriesContext(connection) as context:
+            response = owner_client.get(path, HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 304
+        sql = " ".join(query["sql"] for query in context.captured_queries)
+        assert '"api_task"' not in sql
+
+    def test_query_string_is_part_of_the_etag(self, owner_client, task):
+        etag = owner_client.get("/api/tasks/")["ETag"]
+
+        response = owner_client.get("/api/tasks/?page_size=1", HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+
+    def test_missing_project_has_no_etag(self, owner_client, default_tenant):
+        response = owner_client.get("/api/projects/999999/")
+
+        assert response.status_code == 404
+        assert not response.has_header("ETag")
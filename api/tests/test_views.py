@@ -1,12 +1,37 @@
 import pytest
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 
+from api.models import Project, Task, TaskComment, Tenant, User
+from api.tenancy import set_tenant
 from api.views import ObtainRefreshTokenView, ObtainTokenPairView, RegisterUserView
 
 pytestmark = pytest.mark.django_db
 
 
+def create_project_tree(tenant, author, projects=1, tasks=1, comments=1):
+    for p in range(projects):
+        project = Project.objects.create(
+            tenant=tenant, name=f"Project {Project.objects.count()}"
+        )
+        for t in range(tasks):
+            task = Task.objects.create(tenant=tenant, project=project, name=f"Task {t}")
+            for c in range(comments):
+                TaskComment.objects.create(
+                    tenant=tenant, task=task, author=author, content=f"Comment {c}"
+                )
+
+
+def count_queries(client, path):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(path)
+    assert response.status_code == 200
+    return len(context.captured_queries)
+
+
 @pytestmark
 class TestRegisterUserView(TestCase):
     def test_register_new_user(self):
@@ -114,6 +139,82 @@ class TestRefreshTokenView:
         )
 
 
+@pytestmark
+class TestTenantTokenClaims:
+    @pytest.fixture(autouse=True)
+    def enable_token_claims(self, settings):
+        settings.TENANT_TOKEN_CLAIMS = True
+
+    def obtain_tokens(self, username, password):
+        request = APIRequestFactory().post(
+            "/api/token/",
+            {"username": username, "password": password},
+            content_type="application/json",
+        )
+        return ObtainTokenPairView.as_view()(request).data
+
+    def refresh(self, refresh_token):
+        request = APIRequestFactory().post(
+            "/api/token/refresh/",
+            {"refresh": refresh_token},
+            content_type="application/json",
+        )
+        return ObtainRefreshTokenView.as_view()(request)
+
+    def test_tokens_carry_tenant_claims(self, owner_user, default_tenant):
+        tokens = self.obtain_tokens(owner_user.username, "ownerpass123")
+
+        access = AccessToken(tokens["access"])
+        assert access["tenant_id"] == str(default_tenant.id)
+        assert access["role"] == "owner"
+        assert access["auth_version"] == owner_user.auth_version
+        assert RefreshToken(tokens["refresh"])["tenant_id"] == str(default_tenant.id)
+
+    def test_refresh_is_rejected_after_role_change(self, owner_user, admin_user):
+        tokens = self.obtain_tokens(admin_user.username, "adminpass123")
+        assert self.refresh(tokens["refresh"]).status_code == 200
+
+        admin_user.change_role("user", changed_by=owner_user)
+
+        response = self.refresh(tokens["refresh"])
+        assert response.status_code == 401
+        assert response.data["code"] == "stale_token"
+
+    def test_refresh_is_rejected_after_joining_a_tenant(self, default_user):
+        tokens = self.obtain_tokens(default_user.username, "testpass123")
+        assert AccessToken(tokens["access"])["tenant_id"] is None
+
+        tenant = Tenant(name="Later Tenant")
+        tenant.save(owner=default_user)
+
+        assert self.refresh(tokens["refresh"]).data["code"] == "stale_token"
+        tokens = self.obtain_tokens(default_user.username, "testpass123")
+        response = self.refresh(tokens["refresh"])
+        assert AccessToken(response.data["access"])["tenant_id"] == str(tenant.id)
+
+    @pytest.mark.parametrize("update_fields", [None, ["is_active"]])
+    def test_refresh_is_rejected_after_deactivation(self, admin_user, update_fields):
+        tokens = self.obtain_tokens(admin_user.username, "adminpass123")
+        user = User.objects.get(pk=admin_user.pk)
+
+        user.is_active = False
+        user.save(update_fields=update_fields)
+
+        user.refresh_from_db()
+        assert user.auth_version == admin_user.auth_version + 1
+        response = self.refresh(tokens["refresh"])
+        assert response.status_code == 401
+        assert response.data["code"] == "stale_token"
+
+    def test_unchanged_users_keep_their_auth_version(self, admin_user):
+        user = User.objects.get(pk=admin_user.pk)
+
+        user.email = "admin@example.com"
+        user.save()
+
+        assert user.auth_version == admin_user.auth_version
+
+
 @pytestmark
 class TestProjectView:
     def test_project_list_and_post_view(self, owner_user):
@@ -145,12 +246,37 @@ class TestProjectView:
             content_type="application/json",
             headers={"Authorization": f"Bearer {access_token}"},
         )
-        assert isinstance(response.data, list), "Expected response data to be a list"
-        assert len(response.data) == 1, "Expected one project in response"
-        assert response.data[0]["id"] is not None, "Expected project ID to be present"
-        assert response.data[0]["name"] == "Test Project", (
-            "Expected project name to match"
-        )
+        results = response.data["results"]
+        assert isinstance(results, list), "Expected results to be a list"
+        assert len(results) == 1, "Expected one project in response"
+        assert results[0]["id"] is not None, "Expected project ID to be present"
+        assert results[0]["name"] == "Test Project", "Expected project name to match"
+        assert response.data["next"] is None, "Expected a single page"
+
+    def test_project_list_query_count_is_constant(
+        self, owner_client, owner_user, tenant_context
+    ):
+        create_project_tree(tenant_context, owner_user)
+        baseline = count_queries(owner_client, "/api/projects/")
+
+        create_project_tree(tenant_context, owner_user, projects=3, tasks=4, comments=5)
+        assert count_queries(owner_client, "/api/projects/") == baseline
+
+    def test_project_detail_query_count_is_constant(
+        self, owner_client, owner_user, tenant_context
+    ):
+        create_project_tree(tenant_context, owner_user)
+        project = Project.objects.get()
+        baseline = count_queries(owner_client, f"/api/projects/{project.id}/")
+
+        for index in range(5):
+            task = Task.objects.create(
+                tenant=tenant_context, project=project, name=f"Extra {index}"
+            )
+            TaskComment.objects.create(
+                tenant=tenant_context, task=task, author=owner_user, content="More"
+            )
+        assert count_queries(owner_client, f"/api/projects/{project.id}/") == baseline
 
 
 @pytestmark
@@ -190,6 +316,150 @@ class TestTaskView:
         )
         assert response.data["id"] is not None, "Expected task ID to be present"
 
+    def test_task_of_unknown_project_is_rejected(
+        self, owner_client, another_user, tenant_context
+    ):
+        other = Tenant(name="Other")
+        other.save(owner=another_user)
+        set_tenant(other.id)
+        foreign = Project.objects.create(tenant=other, name="Foreign")
+        set_tenant(tenant_context.id)
+
+        for project_id in (foreign.id, 999999):
+            response = owner_client.post(
+                "/api/tasks/",
+                data={"name": "Task", "project_id": project_id},
+                format="json",
+            )
+
+            assert response.status_code == 400
+            assert response.data["detail"]["project_id"] == [
+                f"Project {project_id} does not exist."
+            ]
+        assert not Task.objects.exists()
+
+    def test_task_list_query_count_is_constant(
+        self, owner_client, owner_user, tenant_context
+    ):
+        create_project_tree(tenant_context, owner_user)
+        baseline = count_queries(owner_client, "/api/tasks/")
+
+        create_project_tree(tenant_context, owner_user, projects=2, tasks=5, comments=3)
+        assert count_queries(owner_client, "/api/tasks/") == baseline
+
+
+@pytestmark
+class TestBulkTaskCreation:
+    def post_tasks(self, client, tasks):
+        with CaptureQueriesContext(connection) as context:
+            response = client.post("/api/tasks/", data=tasks, format="json")
+        return response, context
+
+    def inserts(self, context):
+        return [
+            query["sql"]
+            for query in context.captured_queries
+            if query["sql"].startswith('INSERT INTO "api_task"')
+        ]
+
+    def test_bulk_tasks_are_created_with_constant_queries(
+        self, owner_client, tenant_context
+    ):
+        first = Project.objects.create(tenant=tenant_context, name="First")
+        second = Project.objects.create(tenant=tenant_context, name="Second")
+
+        response, small = self.post_tasks(
+            owner_client, [{"name": "Task", "project_id": first.id}]
+        )
+        assert response.status_code == 201
+        tasks = [
+            {"name": f"Task {number}", "project_id": project.id}
+            for number in range(50)
+            for project in (first, second)
+        ]
+        response, large = self.post_tasks(owner_client, tasks)
+
+        assert response.status_code == 201
+        assert response.data["message"] == "100 tasks created"
+        assert len(large.captured_queries) == len(small.captured_queries)
+        assert list(
+            Task.objects.filter(id__in=response.data["ids"])
+            .order_by("id")
+            .values_list("name", "project_id")
+        ) == [(task["name"], task["project_id"]) for task in tasks]
+
+    def test_bulk_tasks_are_inserted_in_batches(
+        self, settings, owner_client, tenant_context
+    ):
+        settings.BULK_CREATE_BATCH_SIZE = 2
+        project = Project.objects.create(tenant=tenant_context, name="Batched")
+
+        response, context = self.post_tasks(
+            owner_client,
+            [{"name": f"Task {number}", "project_id": project.id} for number in range(5)],
+        )
+
+        assert len(response.data["ids"]) == 5
+        assert len(self.inserts(context)) == 3
+
+    def test_unknown_projects_reject_the_whole_batch(
+        self, owner_client, tenant_context
+    ):
+        project = Project.objects.create(tenant=tenant_context, name="Known")
+
+        response, context = self.post_tasks(
+            owner_client,
+            [
+                {"name": "Valid", "project_id": project.id},
+                {"name": "Orphan", "project_id": project.id + 1000},
+            ],
+        )
+
+        assert response.status_code == 400
+        assert response.data["detail"]["project_id"] == [
+            f"Project {project.id + 1000} does not exist."
+        ]
+        assert self.inserts(context) == []
+        assert Task.objects.count() == 0
+
+    def test_other_tenants_projects_are_unknown(
+        self, owner_client, default_tenant, another_user
+    ):
+        other = Tenant(name="Other")
+        other.save(owner=another_user)
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL app.current_tenant_id = %s", [str(other.id)])
+        foreign = Project.objects.create(tenant=other, name="Foreign")
+
+        response, _ = self.post_tasks(
+            owner_client, [{"name": "Sneaky", "project_id": foreign.id}]
+        )
+
+        assert response.status_code == 400
+
+    def test_empty_and_oversized_batches_are_rejected(
+        self, settings, owner_client, tenant_context
+    ):
+        settings.BULK_CREATE_MAX_ITEMS = 2
+        project = Project.objects.create(tenant=tenant_context, name="Limits")
+
+        assert self.post_tasks(owner_client, [])[0].status_code == 400
+        response, _ = self.post_tasks(
+            owner_client, [{"name": "Task", "project_id": project.id}] * 3
+        )
+        assert response.status_code == 400
+
+    def test_invalid_items_are_reported_per_item(self, owner_client, tenant_context):
+        project = Project.objects.create(tenant=tenant_context, name="Items")
+
+        response, _ = self.post_tasks(
+            owner_client, [{"name": "Task", "project_id": project.id}, {"name": ""}]
+        )
+
+        assert response.status_code == 400
+        assert list(response.data["detail"]) == [1]
+        assert set(response.data["detail"][1]) == {"name", "project_id"}
+
 
 @pytestmark
 class TestTaskCommentView:
@@ -236,3 +506,134 @@ class TestTaskCommentView:
             "Expected comment author to match"
         )
         # Future implementation will go here
+
+
+def data_queries(context):
+    return [
+        query["sql"]
+        for query in context.captured_queries
+        if 'FROM "api_project"' in query["sql"]
+        or 'FROM "api_task"' in query["sql"]
+        or 'FROM "api_taskcomment"' in query["sql"]
+    ]
+
+
+@pytestmark
+class TestSparseFieldsets:
+    def test_project_picker_is_one_narrow_query(
+        self, owner_client, owner_user, tenant_context
+    ):
+        create_project_tree(tenant_context, owner_user, projects=2, tasks=2)
+
+        with CaptureQueriesContext(connection) as context:
+            response = owner_client.get("/api/projects/?fields=id,name")
+
+        assert response.status_code == 200
+        assert response.json()["results"] == [
+            {"id": project.id, "name": project.name}
+            for project in Project.objects.order_by("id")
+        ]
+        (query,) = data_queries(context)
+        assert query.startswith(
+            'SELECT "api_project"."id", "api_project"."name" FROM "api_project"'
+        )
+
+    def test_expand_prefetches_only_expanded_relations(
+        self, owner_client, owner_user, tenant_context
+    ):
+        create_project_tree(tenant_context, owner_user, projects=2, tasks=2)
+
+        with CaptureQueriesContext(connection) as context:
+            response = owner_client.get("/api/projects/?expand=tasks")
+
+        project = response.json()["results"][0]
+        assert set(project) == {"id", "name", "tenant_id", "task_count", "tasks"}
+        assert project["tasks"][0] == {
+            "id": project["tasks"][0]["id"],
+            "name": "Task 0",
+            "project_id": project["id"],
+            "comment_count": 1,
+        }
+        assert len(data_queries(context)) == 2
+        assert not any('"api_taskcomment"' in sql for sql in data_queries(context))
+
+    def test_dotted_paths_reach_into_nested_serializers(
+        self, owner_client, owner_user, tenant_context
+    ):
+        create_project_tree(tenant_context, owner_user, tasks=1, comments=2)
+
+        with CaptureQueriesContext(connection) as context:
+            response = owner_client.get(
+                "/api/projects/?fields=name,tasks.name,tasks.comments.content"
+            )
+
+        assert response.json()["results"] == [
+            {
+                "name": "Project 0",
+                "tasks": [
+                    {
+                        "name": "Task 0",
+                        "comments": [
+                            {"content": "Comment 0"},
+                            {"content": "Comment 1"},
+                        ],
+                    }
+                ],
+            }
+        ]
+        comment_query = data_queries(context)[-1]
+        assert '"api_taskcomment"."content"' in comment_query
+        assert '"api_taskcomment"."author_id"' not in comment_query
+
+    def test_without_parameters_the_full_tree_is_rendered(
+        self, owner_client, owner_user, tenant_context
+    ):
+        create_project_tree(tenant_context, owner_user)
+
+        project = owner_client.get("/api/projects/").json()["results"][0]
+
+        assert set(project["tasks"][0]) == {
+            "id",
+            "name",
+            "project_id",
+            "comment_count",
+            "comments",
+        }
+        assert set(project["tasks"][0]["comments"][0]) == {
+            "id",
+            "content",
+            "author_id",
+            "task_id",
+            "created_at",
+        }
+
+    def test_tasks_and_comments_support_fields(
+        self, owner_client, owner_user, tenant_context
+    ):
+        create_project_tree(tenant_context, owner_user, comments=3)
+        task = Task.objects.get()
+
+        tasks = owner_client.get("/api/tasks/?fields=id&expand=comments").json()
+        assert set(tasks["results"][0]) == {"id", "comments"}
+        assert set(tasks["results"][0]["comments"][0]) == {
+            "id",
+            "content",
+            "author_id",
+            "task_id",
+            "created_at",
+        }
+
+        with CaptureQueriesContext(connection) as context:
+            comments = owner_client.get(
+                f"/api/tasks/{task.id}/comments/?fields=content&page_size=2"
+            ).json()
+        assert comments["results"] == [{"content": "Comment 0"}, {"content": "Comment 1"}]
+        assert comments["next"]
+        # The keyset columns are loaded along with the rendered ones.
+        assert len(data_queries(context)) == 2
+
+    def test_unknown_fields_are_rejected(self, owner_client, tenant_context):
+        response = owner_client.get("/api/projects/?fields=id,secret&expand=tasks.x")
+
+        assert response.status_code == 400
+        assert response.json() == {"fields": ["Unknown field: secret."]}
@@ -1,10 +1,15 @@
 from django.urls import path
 
 from .views import (
+    AsyncProjectView,
+    AsyncTaskCommentView,
+    AsyncTaskView,
     ObtainRefreshTokenView,
     ObtainTokenPairView,
     ProjectView,
     RegisterUserView,
+    SearchView,
+    TaskCommentIngestView,
     TaskCommentView,
     TaskView,
     TenantView,
@@ -22,6 +27,24 @@ urlpatterns = [
     path(
         "tasks/<int:task_id>/comments/", TaskCommentView.as_view(), name="task_comments"
     ),
+    path(
+        "comments/ingest/", TaskCommentIngestView.as_view(), name="comment_ingest"
+    ),
     path("tasks/<int:task_id>/", TaskView.as_view(), name="task_detail"),
     path("tasks/", TaskView.as_view(), name="task_list_create"),
+    path("search/", SearchView.as_view(), name="search"),
+    # Async read endpoints, for serving many concurrent clients under ASGI.
+    path(
+        "async/projects/<int:project_id>/",
+        AsyncProjectView.as_view(),
+        name="async_project_detail",
+    ),
+    path("async/projects/", AsyncProjectView.as_view(), name="async_project_list"),
+    path(
+        "async/tasks/<int:task_id>/comments/",
+        AsyncTaskCommentView.as_view(),
+        name="async_task_comments",
+    ),
+    path("async/tasks/<int:task_id>/", AsyncTaskView.as_view(), name="async_task_detail"),
+    path("async/tasks/", AsyncTaskView.as_view(), name="async_task_list"),
 ]
@@ -0,0 +1,67 @@
+import hashlib
+
+from django.db.models import F
+
+from api.models import Project, Tenant
+
+
+def bump_data_versions(tenant_id, project_ids=(), **changes):
+    """
+    Bump the data version of a tenant and of the given projects, which may
+    be a list of ids or a queryset of them. `changes` are further updates of
+    the projects, made in the same statement.
+
+    The tenant row is always updated first, which orders the row locks of
+    concurrent writes to the tenant and keeps them from deadlocking.
+    """
+    Tenant.objects.filter(pk=tenant_id).update(data_version=F("data_version") + 1)
+    if project_ids:
+        Project.objects.filter(pk__in=project_ids).update(
+            data_version=F("data_version") + 1, **changes
+        )
+
+
+def data_etag(request, tenant_id, version):
+    """
+    A strong ETag for the representation of `request` at `version`. Clients
+    may vary the URL and Accept header, and pagination links include the
+    host, so all of them are part of it.
+    """
+    if version is None:
+        return None
+    representation = "|".join(
+        [
+            str(tenant_id),
+            request.build_absolute_uri(),
+            request.headers.get("Accept", ""),
+        ]
+    )
+    digest = hashlib.sha256(representation.encode()).hexdigest()[:32]
+    # Kept on the request for the response cache, which is keyed by it.
+    request.data_etag = f'"{version}-{digest}"'
+    return request.data_etag
+
+
+def tenant_etag(request, *args, **kwargs):
+    """ETag of a tenant-wide read, from one lookup of the tenant row."""
+    tenant_id = request.user.tenant_id if request.user else None
+    if tenant_id is None:
+        return None
+    version = (
+        Tenant.objects.filter(pk=tenant_id)
+        .values_list("data_version", flat=True)
+        .first()
+    )
+    return data_etag(request, tenant_id, version)
+
+
+def project_etag(request, project_id=None, *args, **kwargs):
+    """ETag of a project read, from one lookup of the project row."""
+    if project_id is None:
+        return tenant_etag(request)
+    version = (
+        Project.objects.filter(pk=project_id)
+        .values_list("data_version", flat=True)
+        .first()
+    )
+    return data_etag(request, request.user.tenant_id, version)
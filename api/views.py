@@ -1,19 +1,67 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.http import condition
+from rest_framework.exceptions import (
+    APIException,
+    NotAuthenticated,
+    NotFound,
+    ParseError,
+    PermissionDenied,
+    UnsupportedMediaType,
+    ValidationError,
+)
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
-from api.models import Project, Task, Tenant, User
-
+from .asyncdb import aexists, afetch
+from .authentication import TenantJWTAuthentication
+from .ingestion import INGEST_CONTENT_TYPES, ingest_comments
+from .models import Project, Task, TaskComment, Tenant
+from .pagination import KeysetPagination
+from .responsecache import response_cache
+from .search import SEARCH_ORDERING, is_valid_position, search
 from .serializers import (
     ProjectSerializer,
     TaskCommentSerializer,
     TaskSerializer,
     UserSerializer,
+    parse_field_paths,
 )
+from .streaming import astream_queryset, get_stream_format, stream_queryset
+from .tenancy import tenant_context_exempt
+from .versioning import project_etag, tenant_etag
 
 
+def get_sparse_serializer(request, serializer_class, queryset, ordering=("id",)):
+    """
+    Apply `?fields=` and `?expand=` to a serializer class and its queryset,
+    which then loads only the rendered columns (and the `ordering` ones) and
+    prefetches only the expanded relations. Without either parameter the
+    full tree is rendered from the eager-loaded queryset.
+    """
+    fields = parse_field_paths(request.query_params.get("fields"))
+    expand = parse_field_paths(request.query_params.get("expand"))
+    if fields is None and expand is None:
+        return serializer_class, serializer_class.setup_eager_loading(queryset)
+    serializer = serializer_class(fields=fields, expand=expand)
+    columns = [field.lstrip("-") for field in ordering]
+    return (
+        partial(serializer_class, fields=fields, expand=expand),
+        serializer.get_sparse_queryset(queryset, columns),
+    )
+
+
+@tenant_context_exempt
 class RegisterUserView(APIView):
     permission_classes = [AllowAny]
     authentication_classes = []
@@ -29,22 +77,34 @@ class RegisterUserView(APIView):
 class TaskView(APIView):
     permission_classes = [IsAuthenticated]
 
+    @method_decorator(condition(etag_func=tenant_etag))
     def get(self, request, task_id=None, *args, **kwargs):
+        serializer_class, tasks = get_sparse_serializer(
+            request, TaskSerializer, Task.objects.all()
+        )
         if task_id is not None:
-            task = get_object_or_404(Task, id=task_id)
-            serializer = TaskSerializer(task)
+            task = get_object_or_404(tasks, id=task_id)
+            serializer = serializer_class(task)
             return Response(serializer.data)
-        tasks = Task.objects.all()
-        serializer = TaskSerializer(tasks, many=True)
-        return Response(serializer.data)
+        stream_format = get_stream_format(request)
+        if stream_format:
+            return stream_queryset(
+                tasks.order_by("id"),
+                serializer_class,
+                request.user.tenant_id,
+                stream_format,
+            )
+        paginator = KeysetPagination(ordering=("id",))
+        page = paginator.paginate_queryset(tasks, request, view=self)
+        serializer = serializer_class(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
 
     def post(self, request, *args, **kwargs):
+        if isinstance(request.data, list):
+            return self.bulk_create(request)
         serializer = TaskSerializer(data=request.data)
         if serializer.is_valid():
-            new_task = serializer.save(
-                tenant=request.user.tenant,
-                project=Project.objects.get(id=request.data.get("project_id")),
-            )
+            new_task = serializer.save(tenant=request.user.tenant)
             return Response(
                 {
                     "message": f"Task created in project {new_task.project.name}",
@@ -54,12 +114,46 @@ class TaskView(APIView):
             )
         return Response({"detail": serializer.errors}, status=400)
 
+    def bulk_create(self, request):
+        serializer = TaskSerializer(
+            data=request.data,
+            many=True,
+            allow_empty=False,
+            max_length=settings.BULK_CREATE_MAX_ITEMS,
+        )
+        if serializer.is_valid():
+            tasks = serializer.save(tenant_id=request.user.tenant_id)
+            return Response(
+                {
+                    "message": f"{len(tasks)} tasks created",
+                    "ids": [task.id for task in tasks],
+                },
+                status=201,
+            )
+        return Response({"detail": serializer.errors}, status=400)
+
+
+# Comment timelines, oldest first by default. Both directions walk the
+# comment_task_timeline_idx index.
+COMMENT_ORDERINGS = {
+    "created_at": ("created_at", "id"),
+    "-created_at": ("-created_at", "-id"),
+}
+
+
+def get_comment_ordering(request):
+    ordering = request.query_params.get("ordering", "created_at")
+    if ordering not in COMMENT_ORDERINGS:
+        raise ValidationError(
+            {"ordering": [f"Choose one of: {', '.join(COMMENT_ORDERINGS)}."]}
+        )
+    return COMMENT_ORDERINGS[ordering]
+
 
 class TaskCommentView(APIView):
     permission_classes = [IsAuthenticated]
 
     def post(self, request, task_id, *args, **kwargs):
-        # Placeholder for comment creation logic
         task = get_object_or_404(Task, id=task_id)
         serializer = TaskCommentSerializer(data=request.data)
         if serializer.is_valid():
@@ -80,22 +174,124 @@ class TaskCommentView(APIView):
             )
         return Response({"detail": serializer.errors}, status=400)
 
+    @method_decorator(condition(etag_func=tenant_etag))
+    def get(self, request, task_id, *args, **kwargs):
+        task = get_object_or_404(Task, id=task_id)
+        ordering = get_comment_ordering(request)
+        serializer_class, comments = get_sparse_serializer(
+            request, TaskCommentSerializer, task.comments.all(), ordering
+        )
+        paginator = KeysetPagination(ordering=ordering)
+        page = paginator.paginate_queryset(comments, request, view=self)
+        serializer = serializer_class(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class TaskCommentIngestView(APIView):
+    """
+    Bulk comment ingestion. The body is NDJSON or CSV (with a header row) and
+    is streamed into the database with COPY, never parsed as a whole. The
+    response reports throughput and the rejected rows.
+    """
+
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        content_type = request.content_type.split(";")[0].strip()
+        input_format = INGEST_CONTENT_TYPES.get(content_type)
+        if input_format is None:
+            raise UnsupportedMediaType(content_type)
+        if request.user.tenant_id is None:
+            raise PermissionDenied("Comments can only be ingested into a tenant.")
+        stream = request.stream
+        lines = iter(stream.readline, b"") if stream is not None else iter(())
+        # Either the whole upload is ingested, or none of it.
+        with transaction.atomic():
+            report = ingest_comments(
+                self.decode(lines), request.user.tenant_id, input_format
+            )
+        return Response(report.as_dict())
+
+    def decode(self, lines):
+        for line in lines:
+            try:
+                yield line.decode("utf-8")
+            except UnicodeDecodeError:
+                raise ParseError("Input must be UTF-8 encoded.")
+
+
+class SearchView(APIView):
+    """
+    Ranked full-text and trigram search over the task names and comment
+    contents of the tenant with `?q=`, paginated like the list endpoints.
+    """
+
+    permission_classes = [IsAuthenticated]
+    max_query_length = 200
+
+    @method_decorator(condition(etag_func=tenant_etag))
     def get(self, request, *args, **kwargs):
-        # Placeholder for comment retrieval logic
-        return Response({"comments": []}, status=200)
+        q = request.query_params.get("q", "").strip()
+        if not q or len(q) > self.max_query_length:
+            raise ValidationError(
+                {"q": [f"Enter 1 to {self.max_query_length} characters."]}
+            )
+        paginator = KeysetPagination(ordering=SEARCH_ORDERING)
+        position = paginator.get_position(request)
+        if position is not None and not is_valid_position(position):
+            raise NotFound(paginator.invalid_cursor_message)
+        results = search(q, request.user.tenant_id, position, paginator.page_size + 1)
+        paginator.set_page(results)
+        return paginator.get_paginated_response(
+            [result._asdict() for result in paginator.page]
+        )
 
 
 class ProjectView(APIView):
+    """
+    Reads carry a strong ETag derived from the data version of the project,
+    or of the tenant for the list, so polling clients that send it back in
+    If-None-Match get a 304 after a single lookup of that row. Other clients
+    get the serialized tree from the response cache while the version holds.
+    """
+
     permission_classes = [IsAuthenticated]
 
+    @method_decorator(condition(etag_func=project_etag))
     def get(self, request, project_id=None, *args, **kwargs):
+        serializer_class, projects = get_sparse_serializer(
+            request, ProjectSerializer, Project.objects.all()
+        )
+        stream_format = get_stream_format(request)
+        if project_id is None and stream_format:
+            return stream_queryset(
+                projects.order_by("id"),
+                serializer_class,
+                request.user.tenant_id,
+                stream_format,
+            )
+
+        # Other reads are cached under the ETag, which changes with the data
+        # version of the project (or of the tenant, for the list).
+        cache_key = (
+            request.user.tenant_id,
+            project_id,
+            getattr(request, "data_etag", None),
+        )
+        data = response_cache.get(*cache_key)
+        if data is not None:
+            return Response(data)
+
         if project_id is not None:
-            project = get_object_or_404(Project, id=project_id)
-            serializer = ProjectSerializer(project)
-            return Response(serializer.data)
-        projects = Project.objects.all()
-        serializer = ProjectSerializer(projects, many=True)
-        return Response(serializer.data)
+            project = get_object_or_404(projects, id=project_id)
+            response = Response(serializer_class(project).data)
+        else:
+            paginator = KeysetPagination(ordering=("id",))
+            page = paginator.paginate_queryset(projects, request, view=self)
+            serializer = serializer_class(page, many=True)
+            response = paginator.get_paginated_response(serializer.data)
+        response_cache.set(*cache_key, response.data)
+        return response
 
     def post(self, request, *args, **kwargs):
         serializer = ProjectSerializer(data=request.data)
@@ -108,6 +304,104 @@ class ProjectView(APIView):
         return Response({"detail": serializer.errors}, status=400)
 
 
+class AsyncReadView(View):
+    """
+    Base class of the async read endpoints under ASGI. They answer like the
+    DRF views they mirror, but query on the async connection of the tenant
+    middleware, so waiting on the database or on a slow client never holds a
+    thread.
+    """
+
+    http_method_names = ["get", "head", "options"]
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            if request.user is None:
+                raise getattr(request, "authentication_error", NotAuthenticated())
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as exc:
+            return self.render_exception(request, exc)
+
+    def render(self, data, status=200):
+        return HttpResponse(
+            JSONRenderer().render(data),
+            status=status,
+            content_type="application/json",
+        )
+
+    def render_exception(self, request, exc):
+        data = exc.detail if isinstance(exc.detail, dict) else {"detail": exc.detail}
+        response = self.render(data, status=exc.status_code)
+        if exc.status_code == 401:
+            response["WWW-Authenticate"] = TenantJWTAuthentication().authenticate_header(
+                request
+            )
+        return response
+
+    async def retrieve(self, queryset, serializer_class, **lookup):
+        plan = serializer_class().get_values_plan(queryset.model)
+        rows = await afetch(queryset.filter(**lookup), plan)
+        if not rows:
+            raise NotFound(
+                f"No {queryset.model._meta.object_name} matches the given query."
+            )
+        return self.render(serializer_class(rows[0]).data)
+
+    async def list(self, queryset, serializer_class, ordering=("id",)):
+        request = Request(self.request)
+        stream_format = get_stream_format(request)
+        if stream_format:
+            return astream_queryset(
+                queryset.order_by(*ordering),
+                serializer_class,
+                self.request.user.tenant_id,
+                stream_format,
+            )
+        paginator = KeysetPagination(ordering=ordering)
+        plan = serializer_class().get_values_plan(
+            queryset.model, [field.lstrip("-") for field in ordering]
+        )
+        page_queryset = paginator.get_page_queryset(queryset, request)
+        paginator.set_page(await afetch(page_queryset, plan))
+        serializer = serializer_class(paginator.page, many=True)
+        return self.render(paginator.get_paginated_data(serializer.data))
+
+
+class AsyncTaskView(AsyncReadView):
+    async def get(self, request, task_id=None, *args, **kwargs):
+        serializer_class, tasks = get_sparse_serializer(
+            Request(request), TaskSerializer, Task.objects.all()
+        )
+        if task_id is not None:
+            return await self.retrieve(tasks, serializer_class, id=task_id)
+        return await self.list(tasks, serializer_class)
+
+
+class AsyncTaskCommentView(AsyncReadView):
+    async def get(self, request, task_id, *args, **kwargs):
+        if not await aexists(Task.objects.filter(id=task_id)):
+            raise NotFound("No Task matches the given query.")
+        ordering = get_comment_ordering(Request(request))
+        serializer_class, comments = get_sparse_serializer(
+            Request(request),
+            TaskCommentSerializer,
+            TaskComment.objects.filter(task_id=task_id),
+            ordering,
+        )
+        return await self.list(comments, serializer_class, ordering=ordering)
+
+
+class AsyncProjectView(AsyncReadView):
+    async def get(self, request, project_id=None, *args, **kwargs):
+        serializer_class, projects = get_sparse_serializer(
+            Request(request), ProjectSerializer, Project.objects.all()
+        )
+        if project_id is not None:
+            return await self.retrieve(projects, serializer_class, id=project_id)
+        return await self.list(projects, serializer_class)
+
+
+@tenant_context_exempt
 class TenantView(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -121,15 +415,13 @@ class TenantView(APIView):
         tenant_name = request.data.get("tenant_name")
 
         new_tenant = Tenant(name=tenant_name)
-        payload = request.auth.payload
-        user_id = payload.get("user_id")
-        owner = User.objects.get(id=user_id)
-        new_tenant.save(owner=owner)
+        new_tenant.save(owner=request.user)
         return Response(
             {"message": f"Tenant '{tenant_name}' created successfully"}, status=201
         )
 
 
+@tenant_context_exempt
 class ObtainTokenPairView(TokenObtainPairView):
     """
     Custom view to obtain JWT token pair.
@@ -138,6 +430,7 @@ class ObtainTokenPairView(TokenObtainPairView):
     pass
 
 
+@tenant_context_exempt
 class ObtainRefreshTokenView(TokenRefreshView):
     """
     Custom view to obtain JWT refresh token.
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import copy
 import os
 from datetime import timedelta
 from pathlib import Path
@@ -28,6 +29,13 @@ DB_USER = os.getenv("DB_USER", "")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 DB_HOST = os.getenv("DB_HOST", "")
 DB_PORT = os.getenv("DB_PORT", "")
+DB_CONN_MAX_AGE = int(os.getenv("DB_CONN_MAX_AGE") or 60)
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE") or 2)
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE") or 0)
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT") or 10)
+DB_TRANSACTION_POOLER = os.getenv("DB_TRANSACTION_POOLER", "").lower() in ("1", "true")
+DB_REPLICA_HOST = os.getenv("DB_REPLICA_HOST", "")
+DB_REPLICA_PORT = os.getenv("DB_REPLICA_PORT", "")
 TIME_ZONE = os.getenv("TIME_ZONE", "")
 
 # SECURITY WARNING: don't run with debug turned on in production!
@@ -47,15 +55,18 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "api.apps.ApiConfig",
 ]
 
 MIDDLEWARE = [
+    "api.metrics.metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "api.profiling.profiling_middleware",
     "api.middleware.set_tenant_context_middleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
@@ -92,9 +103,56 @@ DATABASES = {
         "USER": DB_USER,
         "PASSWORD": DB_PASSWORD,
         "NAME": DB_NAME,
+        # Keep connections open between requests instead of paying the
+        # connection setup on every one of them, and check them before reuse.
+        "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {},
     }
 }
 
+# A DB_POOL_MAX_SIZE above zero uses psycopg's connection pool (requires
+# psycopg[pool]) instead of persistent connections. Connections returned to it
+# have their tenant context reset by api.pooling.reset_tenant_context. The
+# async views (/api/async/) take their connections from async pools of the
+# same size, and refuse to run without one.
+if DB_POOL_MAX_SIZE > 0:
+    DATABASES["default"]["CONN_MAX_AGE"] = 0
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": min(DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE),
+        "max_size": DB_POOL_MAX_SIZE,
+        "timeout": DB_POOL_TIMEOUT,
+    }
+
+# Behind a transaction-mode pooler (e.g. PgBouncer with pool_mode=transaction)
+# consecutive transactions may run on different server connections. The
+# tenant context is transaction-local, so it is unaffected; server-side
+# cursors that outlive a transaction are not, and must be disabled.
+if DB_TRANSACTION_POOLER:
+    DATABASES["default"]["DISABLE_SERVER_SIDE_CURSORS"] = True
+
+# Optional streaming replica. Safe requests are routed to it by
+# api.routers.TenantReplicaRouter, except for a short window after the same
+# client wrote, so that clients always read their own writes.
+READ_REPLICA_ALIAS = None
+if DB_REPLICA_HOST:
+    READ_REPLICA_ALIAS = "replica"
+    DATABASES[READ_REPLICA_ALIAS] = {
+        **copy.deepcopy(DATABASES["default"]),
+        "HOST": DB_REPLICA_HOST,
+        "PORT": DB_REPLICA_PORT or DB_PORT,
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["api.routers.TenantReplicaRouter"]
+
+# Seconds during which a client that wrote keeps reading from the primary.
+# The pins live in the entry of CACHES named by READ_YOUR_WRITES_CACHE, which
+# must be shared by all workers (e.g. Redis) when a replica is configured; a
+# system check refuses a per-process cache then.
+READ_YOUR_WRITES_WINDOW = float(os.getenv("READ_YOUR_WRITES_WINDOW") or 5)
+READ_YOUR_WRITES_CACHE = os.getenv("READ_YOUR_WRITES_CACHE") or "pins"
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -139,11 +197,135 @@ REST_FRAMEWORK = {
         "rest_framework.permissions.DjangoModelPermissionsOrAnonReadOnly"
     ],
     "DEFAULT_AUTHENTICATION_CLASSES": [
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "api.authentication.TenantJWTAuthentication",
         "rest_framework.authentication.SessionAuthentication",
     ],
 }
 
+# Default page size of the keyset-paginated list endpoints; clients can ask
+# for a different one with `?page_size=`. Kept out of REST_FRAMEWORK, which
+# expects a DEFAULT_PAGINATION_CLASS along with its PAGE_SIZE.
+PAGE_SIZE = int(os.getenv("PAGE_SIZE") or 50)
+
+# Rows fetched per server-side cursor round trip when list endpoints are
+# requested with `?stream=1` (JSON array) or `?stream=ndjson`.
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE") or 2000)
+
+# Bulk task creation (POST /api/tasks/ with a list) accepts up to
+# BULK_CREATE_MAX_ITEMS tasks per request and inserts them in batches of
+# BULK_CREATE_BATCH_SIZE rows per INSERT statement.
+BULK_CREATE_MAX_ITEMS = int(os.getenv("BULK_CREATE_MAX_ITEMS") or 10000)
+BULK_CREATE_BATCH_SIZE = int(os.getenv("BULK_CREATE_BATCH_SIZE") or 1000)
+
+# Rows COPYed per transaction by the comment ingestion endpoint and the
+# ingest_comments management command.
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE") or 50000)
+
+# GET /api/search/ ranks at most SEARCH_MAX_CANDIDATES matching tasks and as
+# many comments, which bounds the cost of very common terms. They are the first
+# matches found rather than the best ones, so raise it for better recall.
+SEARCH_MAX_CANDIDATES = int(os.getenv("SEARCH_MAX_CANDIDATES") or 1000)
+
+# In-process cache of user id -> (tenant, role, is_active) used to authenticate
+# JWT requests without loading the user. BACKEND optionally names an entry of
+# CACHES shared by all workers. A MAX_SIZE or TTL of 0 disables the cache.
+PRINCIPAL_CACHE = {
+    "MAX_SIZE": int(os.getenv("PRINCIPAL_CACHE_MAX_SIZE") or 10000),
+    "TTL": float(os.getenv("PRINCIPAL_CACHE_TTL") or 60),
+    "BACKEND": os.getenv("PRINCIPAL_CACHE_BACKEND") or None,
+}
+
+# Serialized ProjectView responses, keyed by tenant, project and data version.
+# BACKEND names an entry of CACHES; a TIMEOUT of 0 disables the cache.
+RESPONSE_CACHE = {
+    "BACKEND": os.getenv("RESPONSE_CACHE_BACKEND") or "responses",
+    "TIMEOUT": int(os.getenv("RESPONSE_CACHE_TIMEOUT") or 300),
+}
+
+# Per-tenant admission control of requests to tenant endpoints: a token bucket
+# refilled at RATE requests per second and holding up to BURST, and at most
+# MAX_CONCURRENT requests of a tenant in flight. Requests over either limit get
+# a 429 with Retry-After. BACKEND names the entry of CACHES holding the state;
+# it must be a cache shared by all workers (e.g. Redis) for the limits to apply
+# across them. A RATE or MAX_CONCURRENT of 0 disables that limit.
+ADMISSION = {
+    "RATE": float(os.getenv("ADMISSION_RATE") or 50),
+    "BURST": int(os.getenv("ADMISSION_BURST") or 100),
+    "MAX_CONCURRENT": int(os.getenv("ADMISSION_MAX_CONCURRENT") or 16),
+    "BACKEND": os.getenv("ADMISSION_BACKEND") or "admission",
+}
+
+# Opt-in request profiling: each response gets a Server-Timing header with the
+# time spent authenticating, setting the tenant context, in admission control,
+# in the view, serializing and in the database, and the "api.profiling" logger
+# logs the same timings as one JSON line per request, with the SLOWEST_QUERIES
+# slowest statements.
+PROFILING = {
+    "ENABLED": os.getenv("PROFILING", "").lower() in ("1", "true"),
+    "SLOWEST_QUERIES": int(os.getenv("PROFILING_SLOWEST_QUERIES") or 3),
+}
+
+# Opt-in metrics, exposed in the Prometheus text format at /metrics: request
+# latency by URL name and status, queries per request, tenant context time,
+# cache hit ratios, pool connections and open transactions. With several
+# worker processes, set DIRECTORY to a local directory they share (emptied
+# when the server starts); each one writes its metrics there every
+# FLUSH_INTERVAL seconds and a scrape sums them all. Only clients in
+# ALLOWED_IPS (addresses or networks, loopback by default) or sending
+# "Authorization: Bearer <TOKEN>" may scrape.
+METRICS = {
+    "ENABLED": os.getenv("METRICS", "").lower() in ("1", "true"),
+    "DIRECTORY": os.getenv("METRICS_DIRECTORY") or None,
+    "FLUSH_INTERVAL": float(os.getenv("METRICS_FLUSH_INTERVAL") or 1),
+    "TOKEN": os.getenv("METRICS_TOKEN") or None,
+    "ALLOWED_IPS": [
+        network.strip()
+        for network in (os.getenv("METRICS_ALLOWED_IPS") or "127.0.0.1,::1").split(",")
+        if network.strip()
+    ],
+}
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {"console": {"class": "logging.StreamHandler"}},
+    "loggers": {
+        "api": {"handlers": ["console"], "level": os.getenv("LOG_LEVEL") or "INFO"},
+    },
+}
+
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    # Per-process and culled to MAX_ENTRIES. To share responses between
+    # workers, add a shared cache that evicts by itself (e.g. Redis with an
+    # allkeys-lru maxmemory-policy) and name it in RESPONSE_CACHE_BACKEND.
+    "responses": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "gosync-responses",
+        "OPTIONS": {
+            "MAX_ENTRIES": int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES") or 1000),
+        },
+    },
+    # Per-process: limits apply to each worker on its own.
+    "admission": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "gosync-admission",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+    # Per-process: only suits a single worker. With a read replica, add a
+    # shared cache and name it in READ_YOUR_WRITES_CACHE.
+    "pins": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "gosync-pins",
+    },
+}
+
+# When enabled, issued tokens carry tenant_id, role and auth_version claims and
+# requests presenting them are authenticated without reading the user table.
+# Access tokens are then trusted until they expire, even once the user is
+# deactivated or leaves the tenant; only their refresh is refused.
+TENANT_TOKEN_CLAIMS = os.getenv("TENANT_TOKEN_CLAIMS", "").lower() in ("1", "true")
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=60),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
@@ -172,8 +354,8 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_EXP_CLAIM": "refresh_exp",
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
-    "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_OBTAIN_SERIALIZER": "api.serializers.TenantTokenObtainPairSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "api.serializers.TenantTokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",